@@ -10,77 +10,676 @@ Original file is located at
 # Commented out IPython magic to ensure Python compatibility.
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import GradientBoostingClassifier
-from sklearn.impute import KNNImputer
-from sklearn.preprocessing import RobustScaler, OrdinalEncoder, StandardScaler
-from sklearn.manifold import TSNE
-from sklearn.cluster import AgglomerativeClustering, KMeans
-from sklearn.decomposition import PCA
-from sklearn.discriminant_analysis import LinearDiscriminantAnalysis as LDA
-from sklearn.ensemble import RandomForestClassifier, VotingClassifier
-from sklearn.naive_bayes import GaussianNB
-from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import silhouette_score, accuracy_score, precision_recall_fscore_support, classification_report, confusion_matrix
-from sklearn.model_selection import train_test_split
-from sklearn.feature_selection import SelectKBest, f_classif
-from sklearn.model_selection import GridSearchCV
-from sklearn.svm import SVC
-from xgboost import XGBClassifier
-from xgboost import XGBClassifier as SGBClassifier
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.model_selection import GridSearchCV, cross_val_score
-from sklearn.metrics import accuracy_score, precision_recall_fscore_support, mean_squared_error
-from sklearn.model_selection import cross_val_score
-from sklearn.metrics import r2_score
-from google.colab import drive
-drive.mount('/content/drive')
-# %matplotlib inline
-
-file_path = '/content/drive/MyDrive/Thesis_De_Identified.xlsx'
-
-def tune_hyperparameters(model, param_grid, X_train, y_train):
-    """
-    Tunes hyperparameters using GridSearchCV.
+from sklearn.preprocessing import RobustScaler, OrdinalEncoder
+from sklearn.metrics import silhouette_score, calinski_harabasz_score, pairwise_distances, accuracy_score, precision_recall_fscore_support
+from sklearn.metrics import mean_squared_error, r2_score, get_scorer, f1_score
+from sklearn.model_selection import GridSearchCV, cross_validate, cross_val_predict
+from sklearn.model_selection import ParameterGrid, ParameterSampler, check_cv
+from scipy.stats import rankdata
+# Estimators (sklearn.cluster, .decomposition, .ensemble, ...) are imported where they are used,
+# so importing the module for inference does not load them
+import argparse
+import collections
+import contextlib
+import functools
+import hashlib
+import http.server
+import importlib.util
+import inspect
+import io
+import itertools
+import json
+import os
+import pickle
+import platform
+import queue
+import re
+import socketserver
+import sqlite3
+import sys
+import threading
+import time
+import tracemalloc
+import joblib
+from joblib import Parallel, delayed, effective_n_jobs
+from sklearn.base import BaseEstimator, ClassifierMixin, TransformerMixin, clone
+from sklearn.utils.metaestimators import available_if
+
+# Thesis workbook on Google Drive (Colab); main() mounts the drive when reading from there
+DEFAULT_WORKBOOK_PATH = '/content/drive/MyDrive/Thesis_De_Identified.xlsx'
+
+# Value used in the workbook to mark a missing measurement (e.g. no second visit)
+MISSING_SENTINEL = -99
+
+# Columns that can hold a missing measurement, by name prefix, and the values that mark it
+# there (NaN always does). Other columns (ID, demographics except body mass) are never missing.
+MISSING_VALUE_SCHEMA = {
+    'MassD': (MISSING_SENTINEL,),
+    'Pre': (MISSING_SENTINEL,),
+    'Post': (MISSING_SENTINEL,),
+    'WB': (MISSING_SENTINEL,),
+}
+
+# How impute_missing handles subjects with missing measurements
+IMPUTATION_STRATEGIES = ['drop', 'knn', 'iterative', 'column_mean']
+
+# Above this many complete subjects, KNN imputation searches neighbours in a PCA projection
+KNN_IMPUTE_EXACT_MAX_ROWS = 5000
+KNN_IMPUTE_PCA_COMPONENTS = 6
+
+# Element type of the feature matrix in compact mode (see compact_matrix)
+COMPACT_DTYPE = np.float32
+
+# Per-session intake files picked up by the streaming loader
+SESSION_FILE_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+
+# Where parsed workbooks and preprocessed feature matrices are cached (set to None to disable)
+CACHE_DIR = '.pipeline_cache'
+
+# Part of the preprocessed-matrix cache key: bump it whenever preprocessing output changes
+# without a change to the schemas below (those are hashed into the key as well)
+PREPROCESSING_VERSION = 2
+
+# Stages that emit profiling spans; run_pipeline adds a '<stage>_wall_s' column for each
+PROFILED_STAGES = ['load', 'missing', 'rom_differences', 'reduction', 'clustering', 'silhouette', 'selection',
+                   'tuning', 'cv', 'final_fit', 'fusion']
+
+class InMemorySink:
+    """Profiling sink that keeps every span dict in self.spans."""
+
+    def __init__(self):
+        self.spans = []
+
+    def emit(self, record):
+        self.spans.append(record)
+
+    def close(self):
+        pass
+
+class JSONLinesSink:
+    """Profiling sink that appends one JSON object per span to a file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        line = json.dumps(record, default=str)
+        with self._lock, open(self.path, 'a') as f:
+            f.write(line + '\n')
+
+    def close(self):
+        pass
+
+class ChromeTraceSink:
+    """Profiling sink that writes spans as a Chrome trace (chrome://tracing, Perfetto) on close()."""
+
+    def __init__(self, path):
+        self.path = path
+        self.events = []
+
+    def emit(self, record):
+        args = {key: value for key, value in record.items() if key not in ('name', 'start', 'wall_s', 'pid', 'tid')}
+        self.events.append({'name': record['name'], 'ph': 'X', 'ts': record['start'] * 1e6,
+                            'dur': record['wall_s'] * 1e6, 'pid': record['pid'], 'tid': record['tid'], 'args': args})
+
+    def close(self):
+        with open(self.path, 'w') as f:
+            json.dump({'traceEvents': self.events}, f, default=str)
+
+_PROFILING_SINKS = []
+_SPAN_STACK = threading.local()
+
+@contextlib.contextmanager
+def profiling(*sinks, isolated=False):
+    """
+    Sends the spans of everything run inside the block to sinks (closed on exit).
+    With isolated=True the already registered sinks do not see them.
+    """
+    global _PROFILING_SINKS
+    previous = _PROFILING_SINKS
+    _PROFILING_SINKS = list(sinks) if isolated else previous + list(sinks)
+    try:
+        yield sinks[0] if len(sinks) == 1 else sinks
+    finally:
+        _PROFILING_SINKS = previous
+        for sink in sinks:
+            sink.close()
+
+def _rss_mb():
+    """Current resident set size of this process (None outside Linux, which has /proc/self/statm)."""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / 1e6
+
+def _peak_rss_mb():
+    """Peak resident set size of this process so far (None where the resource module is missing)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if platform.system() == 'Darwin' else peak / 1e3  # bytes on macOS, KB on Linux
+
+def _shape_of(value):
+    shape = getattr(value, 'shape', None)
+    return list(shape) if shape is not None else None
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """
+    Records one pipeline stage: wall and CPU time, memory, the parent span, and attributes
+    (parameters, shapes). Yields the record so the stage can add fields. Without registered
+    sinks it only costs the clock reads and two small /proc reads.
+
+    Memory fields: 'rss_delta_mb' is the change of the resident set size over the span (memory
+    the stage kept, or freed if negative); 'process_peak_rss_mb' is the process's lifetime peak
+    when the span ended, so every span after the largest stage reports the same value.
+    """
+    stack = _SPAN_STACK.__dict__.setdefault('names', [])
+    record = {'name': name, 'start': time.time(), 'parent': stack[-1] if stack else None,
+              'pid': os.getpid(), 'tid': threading.get_ident(), **attributes}
+    stack.append(name)
+    rss_start = _rss_mb()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        stack.pop()
+        record['wall_s'] = time.perf_counter() - wall_start
+        record['cpu_s'] = time.process_time() - cpu_start
+        rss_end = _rss_mb()
+        record['rss_delta_mb'] = rss_end - rss_start if rss_start is not None and rss_end is not None else None
+        record['process_peak_rss_mb'] = _peak_rss_mb()
+        for sink in _PROFILING_SINKS:
+            sink.emit(record)
+
+def profiled_stage(name, params=()):
+    """Decorator: runs the function inside span(name) with its first argument's shape and the given parameters."""
+    def decorate(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            attributes = {param: bound.arguments[param] for param in params}
+            with span(name, input_shape=_shape_of(args[0] if args else None), **attributes) as record:
+                result = func(*args, **kwargs)
+                record['output_shape'] = _shape_of(result[0] if isinstance(result, tuple) else result)
+            return result
+        return wrapper
+    return decorate
+
+def stage_timings(spans):
+    """Sums the wall time of each PROFILED_STAGES span into {'<stage>_wall_s': seconds}."""
+    timings = {f"{stage}_wall_s": 0.0 for stage in PROFILED_STAGES}
+    for record in spans:
+        if record['name'] in PROFILED_STAGES:
+            timings[f"{record['name']}_wall_s"] += record['wall_s']
+    return timings
+
+SEARCH_STRATEGIES = ['grid', 'halving', 'random', 'bayes']
+
+# Size limit of the fold cache under CACHE_DIR/folds (least recently used entries are evicted first)
+FOLD_CACHE_MAX_BYTES = 1 << 30
+
+# Metrics the fold engine computes from the fold's one predict() call, instead of letting each
+# scorer call predict() again (other scoring names fall back to their sklearn scorer)
+PREDICTION_METRICS = {
+    'accuracy': accuracy_score,
+    'f1_weighted': functools.partial(f1_score, average='weighted'),
+    'f1_macro': functools.partial(f1_score, average='macro'),
+}
+
+def _fold_cache_paths(cache_dir, key):
+    """Returns the (scores, model) file paths of a fold cache entry."""
+    folder = os.path.join(cache_dir, 'folds', key[:2])
+    return os.path.join(folder, f"{key}.scores.joblib"), os.path.join(folder, f"{key}.model.joblib")
+
+def _fold_cache_load(path):
+    """Loads a fold cache file and marks it as recently used, or returns None if it is missing/unreadable."""
+    try:
+        value = joblib.load(path)
+        os.utime(path)  # mtime doubles as the LRU timestamp
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+        return None
+    return value
+
+def _fold_cache_store(path, value):
+    """Writes a fold cache file atomically (workers may race on the same key)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(value, tmp_path)
+    os.replace(tmp_path, path)
+
+def evict_fold_cache(cache_dir=CACHE_DIR, max_bytes=FOLD_CACHE_MAX_BYTES):
+    """Deletes least-recently-used fold cache files until the cache fits in max_bytes."""
+    if cache_dir is None:
+        return
+    entries = []
+    for folder, _, names in os.walk(os.path.join(cache_dir, 'folds')):
+        for name in names:
+            path = os.path.join(folder, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+def _fit_and_score_fold(model, params, X, y, train_idx, test_idx, scorers, cache_key=None, cache_dir=None):
+    """
+    Fits one candidate on one fold and returns ({metric: score}, test-fold predictions).
+    A failed fit scores NaN on every metric. With cache_dir, results already on disk are reused
+    and new ones (plus the fitted fold model) are stored.
+    """
+    scores_path = model_path = None
+    if cache_dir is not None and cache_key is not None:
+        scores_path, model_path = _fold_cache_paths(cache_dir, cache_key)
+        cached = _fold_cache_load(scores_path)
+        if cached is not None and set(scorers) <= set(cached[0]):
+            return cached
+
+    X_train, X_test = (X.iloc[train_idx], X.iloc[test_idx]) if hasattr(X, 'iloc') else (X[train_idx], X[test_idx])
+    y = np.asarray(y)
+    try:
+        estimator = clone(model).set_params(**params).fit(X_train, y[train_idx])
+        y_pred = estimator.predict(X_test)
+        result = ({name: PREDICTION_METRICS[name](y[test_idx], y_pred) if name in PREDICTION_METRICS
+                   else scorer(estimator, X_test, y[test_idx]) for name, scorer in scorers.items()}, y_pred)
+    except Exception:
+        return {name: np.nan for name in scorers}, None
+
+    if scores_path is not None:
+        _fold_cache_store(scores_path, result)
+        _fold_cache_store(model_path, estimator)
+    return result
+
+def _fit_full(model, params, X, y, cache_key=None, cache_dir=None):
+    """Fits a candidate on all data, reusing a cached fit of the same estimator, params and data."""
+    model_path = None
+    if cache_dir is not None and cache_key is not None:
+        model_path = _fold_cache_paths(cache_dir, cache_key)[1]
+        cached = _fold_cache_load(model_path)
+        if cached is not None:
+            return cached
+    estimator = clone(model).set_params(**params).fit(X, y)
+    if model_path is not None:
+        _fold_cache_store(model_path, estimator)
+    return estimator
+
+def _data_hash(*arrays):
+    """
+    Content hash of DataFrames/Series/arrays for the fold cache: column names and values only,
+    so equal data hashes alike however pandas lays it out in memory (joblib.hash of a frame
+    differs between a frame, its copy and its cached feather copy).
+    """
+    def canonical(a):
+        if isinstance(a, pd.DataFrame):
+            return list(a.columns), np.ascontiguousarray(a.to_numpy())
+        return np.ascontiguousarray(np.asarray(a))
+    return joblib.hash(tuple(canonical(a) for a in arrays))
+
+def _fold_cache_key(model, params, data_hash, fold_hash):
+    """Content address of one fit: estimator class + effective params, training data hash, fold indices hash."""
+    model_id = f"{type(model).__module__}.{type(model).__qualname__}"
+    return joblib.hash((model_id, {**model.get_params(), **params}, data_hash, fold_hash))
+
+def search_hyperparameters(model, param_grid, X, y, strategy='halving', cv=5, scoring=('f1_weighted', 'accuracy'),
+                           max_fits=None, max_seconds=None, n_candidates=None, patience=None, eta=3,
+                           n_jobs=-1, random_state=42, cache_dir=CACHE_DIR):
+    """
+    Cross-validated hyperparameter search over a GridSearchCV-style param_grid.
+
+    Strategies share one fold-level engine, where one "fit" is one candidate on one CV fold:
+    - 'grid': every candidate on every fold, same folds, scores and choice as GridSearchCV.
+    - 'halving': successive halving over CV folds. Every candidate is scored on the first
+      fold(s), the best 1/eta get more folds, and so on, until the survivors have all cv folds.
+    - 'random': random candidates from the grid, each scored on all folds.
+    - 'bayes': TPE (optuna, optional dependency). Repeated suggestions are answered from
+      earlier results without refitting but still count as trials, so at most n_candidates
+      suggestions are made; the search stops after patience trials without improvement.
+
+    Every fit is content-addressed by (estimator class + params, hash of X, hash of y, fold
+    indices), so with cache_dir set, fits already done in an earlier run or session are
+    loaded from disk instead of retrained (see evict_fold_cache for the size limit).
+
+    Parameters:
+    - model: sklearn estimator.
+    - param_grid: dict, parameter lists (as for GridSearchCV). {} evaluates model as is.
+    - X, y: training data.
+    - strategy: str, 'grid', 'halving', 'random' or 'bayes'.
+    - cv: int, cross-validation folds.
+    - scoring: tuple of str, metrics to record. The first ranks candidates.
+    - max_fits: int or None, maximum candidate-fold fits (cache hits count too).
+    - max_seconds: float or None, wall-clock budget (checked as fits finish; pending fits are cancelled).
+    - n_candidates: int or None, candidates to try for 'random'/'bayes' (default: half the grid).
+    - patience: int or None, 'random'/'bayes': stop after this many candidates without improvement.
+    - eta: int, 'halving' reduction factor.
+    - n_jobs: int, parallel fits.
+    - random_state: int, seed.
+    - cache_dir: str or None, fold cache root (None disables caching).
+
+    Returns:
+    - dict with 'best_estimator' (refit on all data), 'best_params', 'best_score', 'fold_scores'
+      ({metric: per-fold scores of the best candidate}), 'fold_predictions' (out-of-fold
+      predictions of the best candidate, or None if it was not scored on every fold),
+      'n_fits' and 'n_candidates'.
+    """
+    if strategy not in SEARCH_STRATEGIES:
+        raise ValueError(f"Unknown search strategy. Choose from {SEARCH_STRATEGIES}.")
+    scorers = {name: get_scorer(name) for name in scoring}
+    primary = scoring[0]
+    splits = list(check_cv(cv, y, classifier=True).split(X, y))
+    grid = list(ParameterGrid(param_grid))
+    n_candidates = min(n_candidates or max(1, int(np.ceil(len(grid) / 2))), len(grid))
+    start = time.perf_counter()
+    results = {}      # candidate key -> {fold index: {metric: score}}
+    predictions = {}  # candidate key -> {fold index: test-fold predictions}
+    n_fits = 0
+
+    # Content addresses: data and fold hashes are fixed for the whole search (skipped without a cache)
+    if cache_dir is not None:
+        data_hash = _data_hash(X, y)
+        fold_hashes = [joblib.hash((train_idx, test_idx)) for train_idx, test_idx in splits]
+    else:
+        fold_hashes = [None] * len(splits)
+
+    def key_of(params):
+        return tuple(sorted(params.items(), key=lambda item: item[0]))
+
+    def cache_key(params, fold_hash):
+        return _fold_cache_key(model, params, data_hash, fold_hash) if cache_dir is not None else None
+
+    def out_of_budget():
+        return ((max_fits is not None and n_fits >= max_fits)
+                or (max_seconds is not None and time.perf_counter() - start >= max_seconds))
+
+    def run(tasks):
+        """
+        Runs (params, fold) fits in one parallel call, so workers never wait on a batch barrier.
+        Respects the fit budget; once the time budget runs out the pending fits are cancelled.
+        """
+        nonlocal n_fits
+        if max_fits is not None:
+            tasks = tasks[:max(max_fits - n_fits, 0)]
+        with span('tuning' if len(grid) > 1 else 'cv', estimator=type(model).__name__, strategy=strategy,
+                  input_shape=_shape_of(X), n_fits=len(tasks)):
+            outputs = Parallel(n_jobs=n_jobs, return_as='generator')(
+                delayed(_fit_and_score_fold)(model, params, X, y, *splits[fold], scorers,
+                                             cache_key=cache_key(params, fold_hashes[fold]), cache_dir=cache_dir)
+                for params, fold in tasks)
+            try:
+                for (params, fold), (fold_scores, fold_predictions) in zip(tasks, outputs):
+                    results.setdefault(key_of(params), {})[fold] = fold_scores
+                    predictions.setdefault(key_of(params), {})[fold] = fold_predictions
+                    n_fits += 1
+                    if max_seconds is not None and time.perf_counter() - start >= max_seconds:
+                        break
+            finally:
+                outputs.close()  # Cancels the fits not yet started
+
+    def mean_score(key):
+        # Plain mean like GridSearchCV: a failed fold makes the candidate rank last
+        mean = np.mean([fold[primary] for fold in results[key].values()]) if results.get(key) else np.nan
+        return mean if np.isfinite(mean) else -np.inf
+
+    if strategy == 'grid':
+        run([(params, fold) for params in grid for fold in range(len(splits))])
+    elif strategy == 'halving':
+        survivors = grid
+        folds_done = 0
+        while survivors and folds_done < len(splits) and not out_of_budget():
+            # Each rung adds folds so that survivors end with all of them after log_eta(candidates) rungs
+            n_rungs_left = max(int(np.ceil(np.log(len(survivors)) / np.log(eta))), 0) + 1
+            new_folds = max(1, int(np.ceil((len(splits) - folds_done) / n_rungs_left)))
+            folds = range(folds_done, min(folds_done + new_folds, len(splits)))
+            run([(params, fold) for params in survivors for fold in folds])
+            folds_done = folds.stop
+            if folds_done < len(splits):
+                survivors = sorted(survivors, key=lambda params: mean_score(key_of(params)), reverse=True)
+                survivors = survivors[:max(1, len(survivors) // eta)]
+    elif strategy == 'random':
+        candidates = list(ParameterSampler(param_grid, n_iter=n_candidates, random_state=random_state))
+        # Without patience every candidate runs in one call; with it, one batch per round of workers
+        batch_size = max(effective_n_jobs(n_jobs), 1) if patience else len(candidates)
+        best, since_best = -np.inf, 0
+        for i in range(0, len(candidates), batch_size):
+            if out_of_budget() or (patience and since_best >= patience):
+                break
+            batch = candidates[i:i + batch_size]
+            run([(params, fold) for params in batch for fold in range(len(splits))])
+            for params in batch:
+                score = mean_score(key_of(params))
+                best, since_best = (score, 0) if score > best else (best, since_best + 1)
+    else:
+        import optuna
+        optuna.logging.set_verbosity(optuna.logging.WARNING)
+        study = optuna.create_study(direction='maximize', sampler=optuna.samplers.TPESampler(seed=random_state))
+        best, since_best, trials = -np.inf, 0, 0
+        while trials < n_candidates and not out_of_budget() and not (patience and since_best >= patience):
+            trial = study.ask()
+            params = {name: trial.suggest_categorical(name, values) for name, values in param_grid.items()}
+            trials += 1
+            if key_of(params) not in results:
+                run([(params, fold) for fold in range(len(splits))])
+            score = mean_score(key_of(params))
+            study.tell(trial, score if np.isfinite(score) else float('nan'))
+            best, since_best = (score, 0) if score > best else (best, since_best + 1)
+
+    if not results:
+        raise ValueError("Search budget too small to evaluate any candidate.")
+    # Prefer candidates scored on the most folds, then the highest mean primary score (first wins ties)
+    best_key = max(results, key=lambda key: (len(results[key]), mean_score(key)))
+    best_params = dict(best_key)
+    fold_scores = {name: np.array([results[best_key][fold][name] for fold in sorted(results[best_key])])
+                   for name in scoring}
+
+    fold_predictions = None
+    best_predictions = predictions[best_key]
+    if len(best_predictions) == len(splits) and all(pred is not None for pred in best_predictions.values()):
+        fold_predictions = np.empty(len(y), dtype=np.asarray(best_predictions[0]).dtype)
+        for fold, (_, test_idx) in enumerate(splits):
+            fold_predictions[test_idx] = best_predictions[fold]
+
+    with span('final_fit', estimator=type(model).__name__, params=best_params, input_shape=_shape_of(X)):
+        best_estimator = _fit_full(model, best_params, X, y, cache_key=cache_key(best_params, 'full'),
+                                   cache_dir=cache_dir)
+    if cache_dir is not None:
+        evict_fold_cache(cache_dir)
+    return {
+        'best_estimator': best_estimator,
+        'best_params': best_params,
+        'best_score': mean_score(best_key),
+        'fold_scores': fold_scores,
+        'fold_predictions': fold_predictions,
+        'n_fits': n_fits,
+        'n_candidates': len(results),
+    }
+
+def tune_hyperparameters(model, param_grid, X_train, y_train, strategy='grid', cv=5, **search_kwargs):
+    """
+    Tunes hyperparameters with search_hyperparameters (exhaustive grid by default, fold fits cached).
 
     Parameters:
     - model: sklearn estimator.
     - param_grid: dict, parameter grid for GridSearchCV.
     - X_train: pd.DataFrame, training features.
     - y_train: pd.Series or np.array, training labels.
+    - strategy: str, 'grid', 'halving', 'random' or 'bayes' (see search_hyperparameters).
+    - cv: int, number of cross-validation folds.
+    - search_kwargs: budget options for search_hyperparameters (max_fits, max_seconds, ...).
 
     Returns:
     - best_model: sklearn estimator, model with best parameters.
     """
-    grid_search = GridSearchCV(model, param_grid, cv=5, scoring='f1_weighted', n_jobs=-1)
-    grid_search.fit(X_train, y_train)
+    search = search_hyperparameters(model, param_grid, X_train, y_train, strategy=strategy, cv=cv,
+                                    scoring=('f1_weighted',), **search_kwargs)
+    best_model, best_params, best_score = search['best_estimator'], search['best_params'], search['best_score']
+    print(f"Search: {strategy}, {search['n_candidates']} candidates, {search['n_fits']} fold fits.")
 
-    best_model = grid_search.best_estimator_
     y_pred = best_model.predict(X_train)  # Get predictions on training data
     r2 = r2_score(y_train, y_pred)  # Calculate R-squared
 
-    print(f"Best parameters: {grid_search.best_params_}")
-    print(f"Best cross-validated score: {grid_search.best_score_:.3f}")
+    print(f"Best parameters: {best_params}")
+    print(f"Best cross-validated score: {best_score:.3f}")
     print(f"R-squared on training data: {r2:.3f}")  # Print R-squared
 
     return best_model
 
-def compute_rom_differences(df):
+# Demographic columns: (kind, visit). ID is kept with them until the feature matrix is built
+DEMOGRAPHIC_SCHEMA = {
+    'ID': ('id', None),
+    'Age': ('continuous', None),
+    'Gender': ('categorical', None),
+    'MassD1': ('continuous', '1'),
+    'MassD2': ('continuous', '2'),
+    'Height': ('continuous', None),
+    'ShoeSize': ('continuous', None),
+    'Tegner': ('continuous', None),
+    'LegD': ('categorical', None),
+    'ArmD': ('categorical', None),
+    'Play#': ('categorical', None),
+}
+
+# Measurement columns by role: the name encodes timepoint, visit, measure (motion + active/passive),
+# knee position (Extended/Flexed) and side, e.g. Pre1DAER, WB2PFL, Diff_1DAER (Post - Pre)
+COLUMN_PATTERNS = {
+    'goniometer': r'(?P<timepoint>Pre|Post\w*?)(?P<visit>[12])(?P<measure>[DP][AP])(?P<knee>[EF])(?P<side>[RL])',
+    'weight_bearing': r'WB(?P<visit>[12])(?P<measure>[DP])(?P<knee>F)(?P<side>[RL])',
+    'diff': r'Diff(?P<timepoint>\w*?)_(?P<visit>[12])(?P<measure>[DP][AP])(?P<knee>[EF])(?P<side>[RL])',
+}
+SCHEMA_FIELDS = ['role', 'kind', 'visit', 'timepoint', 'measure', 'knee', 'side']
+
+class ColumnSchema:
+    """
+    Role of every column of a frame, parsed once from the names (DEMOGRAPHIC_SCHEMA, COLUMN_PATTERNS).
+
+    table holds one row of SCHEMA_FIELDS per column. The groups every stage needs are integer
+    position arrays: id, demographic (including ID), continuous and categorical (demographics), diff, and
+    measurement (every non-demographic column, in name order; unrecognised columns have role
+    'other' and are scaled with the measurements). Get instances from column_schema().
+
+    Parameters:
+    - columns: sequence of str, the frame's column names.
+    """
+
+    _patterns = {role: re.compile(pattern) for role, pattern in COLUMN_PATTERNS.items()}
+
+    def __init__(self, columns):
+        self.columns = pd.Index(columns)
+        self.table = pd.DataFrame([self._parse(str(col)) for col in self.columns], index=self.columns,
+                                  columns=SCHEMA_FIELDS)
+        role, kind = self.table['role'].to_numpy(), self.table['kind'].to_numpy()
+        self.id = np.flatnonzero(role == 'id')
+        self.demographic = np.flatnonzero(np.isin(role, ['id', 'demographic']))
+        self.continuous = np.flatnonzero((role == 'demographic') & (kind == 'continuous'))
+        self.categorical = np.flatnonzero((role == 'demographic') & (kind == 'categorical'))
+        self.diff = np.flatnonzero(role == 'diff')
+        others = np.flatnonzero(~np.isin(role, ['id', 'demographic']))
+        self.measurement = others[np.argsort(self.columns[others].to_numpy(dtype=str), kind='stable')]
+
+    def _parse(self, col):
+        if col in DEMOGRAPHIC_SCHEMA:
+            kind, visit = DEMOGRAPHIC_SCHEMA[col]
+            return ('id' if kind == 'id' else 'demographic', kind, visit, None, None, None, None)
+        for role, pattern in self._patterns.items():
+            match = pattern.fullmatch(col)
+            if match:
+                fields = match.groupdict()
+                timepoint = fields.get('timepoint')
+                if role == 'diff':
+                    timepoint = timepoint or 'Post'
+                return (role, 'continuous', fields['visit'], timepoint, fields['measure'], fields['knee'], fields['side'])
+        return ('other', None, None, None, None, None, None)
+
+    def select(self, **criteria):
+        """Positions of the columns matching every field=value (or field=[values]) criterion."""
+        mask = np.ones(len(self.columns), dtype=bool)
+        for field, value in criteria.items():
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            mask &= self.table[field].isin(values).to_numpy()
+        return np.flatnonzero(mask)
+
+    def drop_visit(self, visit):
+        """Positions of the columns kept when one visit is dropped (its measurements and its body mass)."""
+        return np.flatnonzero((self.table['visit'] != visit).to_numpy())
+
+@functools.lru_cache(maxsize=64)
+def column_schema(columns):
+    """ColumnSchema of a tuple of column names, parsed once per distinct set of columns."""
+    return ColumnSchema(columns)
+
+@functools.lru_cache(maxsize=32)
+def _rom_pair_index(columns, timepoints):
+    """
+    Builds the column-position pairing used by compute_rom_differences, cached per schema.
+    Columns are paired through column_schema: same visit, measure, knee position and side.
+
+    Parameters:
+    - columns: tuple of str, the frame's column names.
+    - timepoints: tuple of str, baseline label first, then each follow-up label.
+
+    Returns:
+    - used_idx: np.array, positions of every ROM column involved in a delta.
+    - baseline_idx: np.array, position within used_idx of the baseline of every delta.
+    - followup_idx: np.array, position within used_idx of the follow-up of every delta.
+    - diff_names: list of str, output column names in the same order.
     """
-    Computes differences between 'Post' and 'Pre' ROM measurements.
-    Only considers columns that have both 'Pre' and 'Post' counterparts.
+    baseline, followups = timepoints[0], timepoints[1:]
+    schema = column_schema(columns)
+    goniometer = schema.select(role='goniometer')
+    timepoint_of = schema.table['timepoint'].to_numpy()[goniometer]
+    sites = list(zip(*(schema.table[field].to_numpy()[goniometer] for field in ['visit', 'measure', 'knee', 'side'])))
+    by_site = {(timepoint, site): pos for pos, timepoint, site in zip(goniometer, timepoint_of, sites)}
+
+    baseline_idx, followup_idx, diff_names = [], [], []
+    for followup in followups:
+        # 'Post' keeps the original Diff_ prefix; other timepoints are tagged, e.g. DiffPost24h_
+        prefix = 'Diff' if followup == 'Post' else f'Diff{followup}'
+        for pre_pos, timepoint, site in zip(goniometer, timepoint_of, sites):
+            post_pos = by_site.get((followup, site)) if timepoint == baseline else None
+            if post_pos is not None:
+                baseline_idx.append(pre_pos)
+                followup_idx.append(post_pos)
+                diff_names.append(f"{prefix}_{''.join(site)}")
+
+    used_idx = np.unique(np.array(baseline_idx + followup_idx, dtype=np.intp))
+    return (used_idx, np.searchsorted(used_idx, baseline_idx), np.searchsorted(used_idx, followup_idx), diff_names)
+
+@profiled_stage('rom_differences', params=('timepoints',))
+def compute_rom_differences(df, timepoints=('Pre', 'Post')):
     """
-    rom_cols = [col for col in df.columns if ('Pre' in col or 'Post' in col)]
-    pre_cols = [col for col in rom_cols if 'Pre' in col]
+    Computes differences between follow-up (e.g. 'Post') and baseline ('Pre') ROM measurements.
+    Only considers columns that have both baseline and follow-up counterparts.
 
-    differences = {}
-    for pre_col in pre_cols:
-        post_col = pre_col.replace('Pre', 'Post')
-        if post_col in df.columns:
-            diff_col = f"Diff_{pre_col.replace('Pre', '').strip('_')}"
-            differences[diff_col] = df[post_col] - df[pre_col]
-    diff_df = pd.DataFrame(differences)
-    return diff_df
+    Parameters:
+    - df: pd.DataFrame, data containing the ROM columns.
+    - timepoints: tuple of str, baseline label first, then every follow-up to diff against it,
+                  e.g. ('Pre', 'Post', 'Post24h'). All deltas are computed in one vectorized pass.
+
+    Returns:
+    - diff_df: pd.DataFrame, one column per matched pair, as a single contiguous block.
+    """
+    used_idx, baseline_idx, followup_idx, diff_names = _rom_pair_index(tuple(df.columns), tuple(timepoints))
+    if not diff_names:
+        return pd.DataFrame(index=df.index)
+
+    values = df.iloc[:, used_idx].to_numpy(dtype=np.float64)
+    differences = values[:, followup_idx] - values[:, baseline_idx]
+    return pd.DataFrame(differences, index=df.index, columns=diff_names)
 
 def calculate_rmse(y_true, y_pred):
     """Calculates the Root Mean Squared Error (RMSE)."""
@@ -88,26 +687,408 @@ def calculate_rmse(y_true, y_pred):
     rmse = np.sqrt(mse)
     return rmse
 
-def feature_selection(X, y, k=50):
+FEATURE_SCORES = ['anova', 'mutual_info', 'kruskal']
+
+_FEATURE_STATS_CACHE = collections.OrderedDict()
+_FEATURE_STATS_CACHE_SIZE = 8
+
+def _feature_values(X):
+    """
+    X as a NumPy array, without a copy where possible: a compact (COMPACT_DTYPE) matrix stays
+    in its own buffer, anything else becomes float64.
+    """
+    values = np.asarray(X)
+    return values if values.dtype == COMPACT_DTYPE else values.astype(np.float64, copy=False)
+
+def _feature_statistics(X):
+    """
+    Per-column sufficient statistics of X shared by every label vector scored against it,
+    cached per X (by content hash). Rank and bin statistics are added on first use.
+    """
+    key = _data_hash(X)
+    if key in _FEATURE_STATS_CACHE:
+        _FEATURE_STATS_CACHE.move_to_end(key)
+        return _FEATURE_STATS_CACHE[key]
+    values = _feature_values(X)
+    if values.dtype == np.float64:
+        stats = {'values': values, 'sum': values.sum(axis=0), 'sumsq': (values ** 2).sum(axis=0)}
+    else:  # Compact matrix: keep the float32 buffer, accumulate in float64
+        stats = {'values': values, 'sum': values.sum(axis=0, dtype=np.float64),
+                 'sumsq': np.einsum('ij,ij->j', values, values, dtype=np.float64)}
+    _FEATURE_STATS_CACHE[key] = stats
+    while len(_FEATURE_STATS_CACHE) > _FEATURE_STATS_CACHE_SIZE:
+        _FEATURE_STATS_CACHE.popitem(last=False)
+    return stats
+
+def _rank_statistics(stats):
+    """Adds column ranks (average ties) and the Kruskal-Wallis tie correction of every column."""
+    if 'ranks' not in stats:
+        values = stats['values']
+        n, p = values.shape
+        stats['ranks'] = rankdata(values, axis=0)
+        # Tie group sizes t per column, from run lengths of the sorted column: correction = 1 - sum(t^3 - t) / (n^3 - n)
+        sorted_values = np.sort(values, axis=0)
+        new_group = np.vstack([np.ones((1, p), dtype=bool), np.diff(sorted_values, axis=0) != 0])
+        group_index = np.cumsum(new_group, axis=0) - 1 + np.arange(p) * n
+        tie_sizes = np.bincount(group_index.ravel(), minlength=n * p).reshape(p, n).astype(np.float64)
+        stats['tie_correction'] = 1 - (tie_sizes ** 3 - tie_sizes).sum(axis=1) / (n ** 3 - n)
+    return stats
+
+def _bin_statistics(stats, n_bins):
+    """Adds per-column quantile bin codes (n_bins bins), used for the mutual information estimate."""
+    key = ('bins', n_bins)
+    if key not in stats:
+        values = stats['values']
+        edges = np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1], axis=0)
+        codes = np.zeros(values.shape, dtype=np.int64)
+        for edge in edges:
+            codes += values > edge
+        stats[key] = codes
+    return stats[key]
+
+def score_features(X, labels, method='anova', n_bins=10):
+    """
+    Scores every column of X against one or many label vectors in one batched pass.
+
+    Column statistics (sums, squares, ranks, bins) are computed once per X and cached, so
+    scoring further label vectors, e.g. from other clusterings of the same cohort, only
+    costs one matrix product with their one-hot group indicators.
+
+    Parameters:
+    - X: pd.DataFrame or np.array, feature matrix.
+    - labels: array (n_samples,) or list/array of label vectors (n_vectors, n_samples).
+    - method: str, 'anova' (F statistic, as f_classif), 'kruskal' (Kruskal-Wallis H, as
+              scipy.stats.kruskal) or 'mutual_info' (from per-column quantile bins, in nats).
+    - n_bins: int, bins per column for 'mutual_info'.
+
+    Returns:
+    - scores: np.array (n_features,) for one label vector, (n_vectors, n_features) for many.
+    """
+    if method not in FEATURE_SCORES:
+        raise ValueError(f"Unknown feature score. Choose from {FEATURE_SCORES}.")
+    single = np.ndim(labels) == 1
+    label_sets = [np.asarray(labels)] if single else [np.asarray(label_vector) for label_vector in labels]
+    stats = _feature_statistics(X)
+    n = stats['values'].shape[0]
+
+    encoded = [np.unique(label_vector, return_inverse=True)[1].ravel() for label_vector in label_sets]
+    n_groups = [codes.max() + 1 for codes in encoded]
+    offsets = np.concatenate([[0], np.cumsum(n_groups)])
+
+    if method == 'mutual_info':
+        codes = _bin_statistics(stats, n_bins)
+        p = codes.shape[1]
+        scores = []
+        for group_codes, g in zip(encoded, n_groups):
+            # Joint (bin, group) counts of every column from one bincount
+            cell = (np.arange(p) * n_bins * g + codes * g + group_codes[:, None]).ravel()
+            joint = np.bincount(cell, minlength=p * n_bins * g).reshape(p, n_bins, g) / n
+            expected = joint.sum(axis=2, keepdims=True) * joint.sum(axis=1, keepdims=True)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                scores.append(np.where(joint > 0, joint * np.log(joint / expected), 0).sum(axis=(1, 2)))
+        scores = np.array(scores)
+        return scores[0] if single else scores
+
+    # All label vectors' group indicators side by side: one product gives every group's column sums
+    indicators = np.zeros((n, offsets[-1]))
+    for codes, offset in zip(encoded, offsets):
+        indicators[np.arange(n), offset + codes] = 1
+    group_sizes = indicators.sum(axis=0)[:, None]
+    if method == 'anova':
+        group_sums = indicators.T @ stats['values']
+        square_of_sums = stats['sum'] ** 2 / n
+        ss_total = stats['sumsq'] - square_of_sums
+    else:
+        group_sums = indicators.T @ _rank_statistics(stats)['ranks']
+
+    scores = []
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for start, stop, g in zip(offsets[:-1], offsets[1:], n_groups):
+            between = (group_sums[start:stop] ** 2 / group_sizes[start:stop]).sum(axis=0)
+            if method == 'anova':
+                ss_between = between - square_of_sums
+                scores.append((ss_between / (g - 1)) / ((ss_total - ss_between) / (n - g)))
+            else:
+                h = 12 / (n * (n + 1)) * between - 3 * (n + 1)
+                scores.append(h / stats['tie_correction'])
+    scores = np.array(scores)
+    return scores[0] if single else scores
+
+def rank_features(scores):
+    """
+    Orders features from best to worst score (NaN last), for one (n_features,) or many
+    (n_vectors, n_features) score vectors. ranking[:k] is the top k for any k; ties are
+    broken like SelectKBest.
+    """
+    scores = np.array(scores, dtype=np.float64)
+    scores[np.isnan(scores)] = np.finfo(np.float64).min
+    return np.argsort(scores, axis=-1, kind='mergesort')[..., ::-1]
+
+def select_k_by_stability(X, y, k_values=None, method='anova', cv=5):
+    """
+    Chooses k as the size of the most stable top-k feature set across cross-validation folds.
+
+    Features are ranked on every training fold, and for each k the top-k sets of all fold
+    pairs are compared with Kuncheva's consistency index, which corrects the overlap of
+    two k-subsets of n_features for chance (unlike Jaccard, it does not favour large k).
+
+    Parameters:
+    - X: pd.DataFrame, feature matrix.
+    - y: pd.Series or np.array, target labels.
+    - k_values: iterable of int or None, candidate k (default: 1 .. n_features - 1).
+    - method: str, feature score (see score_features).
+    - cv: int, cross-validation folds.
+
+    Returns:
+    - best_k: int, candidate k with the highest mean consistency (smallest k on ties).
+    - stability: pd.Series, mean consistency per candidate k.
+    """
+    y = np.asarray(y)
+    p = X.shape[1]
+    k_values = np.arange(1, p) if k_values is None else np.asarray(list(k_values))
+    values = np.asarray(X)
+    positions = []
+    for train_idx, _ in check_cv(cv, y, classifier=True).split(X, y):
+        ranking = rank_features(score_features(values[train_idx], y[train_idx], method=method))
+        position = np.empty(p, dtype=np.int64)
+        position[ranking] = np.arange(p)
+        positions.append(position)
+
+    consistency = []
+    for a, b in itertools.combinations(positions, 2):
+        # A feature is in both top-k sets iff its worse position of the two is < k
+        overlap = np.cumsum(np.bincount(np.maximum(a, b), minlength=p))[k_values - 1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            consistency.append((overlap * p - k_values ** 2) / (k_values * (p - k_values)))
+    stability = pd.Series(np.mean(consistency, axis=0), index=k_values, name='stability')
+    return int(stability.idxmax()), stability
+
+@profiled_stage('selection', params=('k', 'method'))
+def feature_selection(X, y, k=50, method='anova', ranking=None):
     """
-    Selects the top k features based on the ANOVA F-test.
+    Selects the top k features based on the ANOVA F-test (or another univariate score).
 
     Parameters:
     - X: pd.DataFrame, feature matrix.
     - y: pd.Series or np.array, target labels.
-    - k: int, number of top features to select.
+    - k: int, number of top features to select, or 'stability' to choose k with select_k_by_stability.
+    - method: str, feature score (see score_features).
+    - ranking: np.array or None, precomputed rank_features output for X and y (skips scoring).
 
     Returns:
     - X_selected: pd.DataFrame, reduced feature matrix.
     - selected_features: list, names of selected features.
     """
-    selector = SelectKBest(score_func=f_classif, k=k)
-    X_selected = selector.fit_transform(X, y)
-    selected_features = X.columns[selector.get_support(indices=True)]
+    if k == 'stability':
+        k, _ = select_k_by_stability(X, y, method=method)
+    if ranking is None:
+        ranking = rank_features(score_features(X, y, method=method))
+    selected = np.sort(ranking[:k])
+    selected_features = X.columns[selected]
     print(f"Feature Selection: Selected top {k} features.")
-    return pd.DataFrame(X_selected, columns=selected_features), selected_features
+    return pd.DataFrame(X.to_numpy()[:, selected], columns=selected_features, copy=False), selected_features
+
+def file_hash(file_path, chunk_size=1 << 20):
+    """Returns the SHA-256 hex digest of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _read_cached_frame(path):
+    """Reads a Feather file memory-mapped, or returns None if it is not cached."""
+    if not os.path.exists(path):
+        return None
+    try:
+        from pyarrow import feather
+    except ImportError:
+        return None
+    return feather.read_table(path, memory_map=True).to_pandas()
+
+def _write_cached_frame(df, path):
+    """Writes a DataFrame to Feather (uncompressed so it can be memory-mapped)."""
+    try:
+        from pyarrow import feather
+    except ImportError:
+        print("Cache: pyarrow not installed, skipping cache write.")
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    feather.write_feather(df.reset_index(drop=True), tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)  # Atomic so a crash never leaves a half-written cache entry
+
+def read_workbook(file_path, cache_dir=CACHE_DIR, workbook_hash=None):
+    """
+    Reads the raw Excel workbook, reusing a columnar cache keyed on the file's content hash.
+
+    Parameters:
+    - file_path: str, path to the Excel data file.
+    - cache_dir: str or None, cache directory. None always parses the workbook.
+    - workbook_hash: str or None, precomputed file_hash(file_path), to avoid hashing twice.
+
+    Returns:
+    - df: pd.DataFrame, the raw (unprocessed) workbook contents.
+    """
+    if cache_dir is None:
+        return pd.read_excel(file_path)
+
+    workbook_hash = workbook_hash or file_hash(file_path)
+    raw_path = os.path.join(cache_dir, f"raw_{workbook_hash}.feather")
+    df = _read_cached_frame(raw_path)
+    if df is None:
+        df = pd.read_excel(file_path)
+        _write_cached_frame(df, raw_path)
+    return df
+
+@functools.lru_cache(maxsize=64)
+def _missing_value_columns(columns):
+    """
+    Resolves MISSING_VALUE_SCHEMA against a frame's columns, cached per schema.
+
+    Returns:
+    - positions: np.array, positions of the columns that can hold a missing measurement.
+    - sentinel_groups: list of (sentinels, positions within positions) sharing the same sentinels.
+    """
+    positions, groups = [], collections.defaultdict(list)
+    for i, col in enumerate(columns):
+        sentinels = next((sentinels for prefix, sentinels in MISSING_VALUE_SCHEMA.items()
+                          if str(col).startswith(prefix)), None)
+        if sentinels is not None:
+            groups[tuple(sentinels)].append(len(positions))
+            positions.append(i)
+    return np.array(positions, dtype=np.intp), [(np.array(sentinels, dtype=np.float64), np.array(group, dtype=np.intp))
+                                                for sentinels, group in groups.items()]
+
+def _missing_mask(df):
+    """
+    Returns (positions, values, mask): the positions of the schema columns, a float copy of
+    their values, and which of those values are missing (sentinel or NaN).
+    """
+    positions, sentinel_groups = _missing_value_columns(tuple(df.columns))
+    values = df.iloc[:, positions].to_numpy(dtype=np.float64, copy=True)
+    mask = np.isnan(values)
+    for sentinels, group in sentinel_groups:
+        mask[:, group] |= np.isin(values[:, group], sentinels)
+    return positions, values, mask
+
+_NEIGHBOR_INDEX_CACHE = collections.OrderedDict()
+_NEIGHBOR_INDEX_CACHE_SIZE = 16
+
+def _knn_impute(values, mask, n_neighbors):
+    """
+    Fills values[mask] in place with the mean of the n_neighbors nearest complete subjects.
+
+    Subjects are grouped by missing pattern (e.g. every subject without a second visit), and
+    each pattern gets one neighbour index over its observed columns, cached across calls, so a
+    whole group is answered by a single batched query. Large cohorts search a PCA projection
+    with a KD-tree, keeping the cost near-linear in the number of subjects.
+    """
+    from sklearn.decomposition import PCA
+    from sklearn.neighbors import NearestNeighbors
+    complete = ~mask.any(axis=1)
+    donors = values[complete]
+    if len(donors) == 0:
+        raise ValueError("KNN imputation needs at least one subject without missing values.")
+    k = min(n_neighbors, len(donors))
+    donors_hash = joblib.hash(donors)
+    receivers = np.flatnonzero(~complete)
+    patterns, inverse = np.unique(mask[receivers], axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+
+    for p, pattern in enumerate(patterns):
+        rows, observed = receivers[inverse == p], ~pattern
+        if not observed.any():  # Nothing to compare on: use the donors' mean
+            values[np.ix_(rows, pattern)] = donors[:, pattern].mean(axis=0)
+            continue
+        key = (donors_hash, pattern.tobytes(), k)
+        if key in _NEIGHBOR_INDEX_CACHE:
+            _NEIGHBOR_INDEX_CACHE.move_to_end(key)
+            projection, index = _NEIGHBOR_INDEX_CACHE[key]
+        else:
+            search_space = donors[:, observed]
+            projection = None
+            if len(donors) > KNN_IMPUTE_EXACT_MAX_ROWS and observed.sum() > KNN_IMPUTE_PCA_COMPONENTS:
+                projection = PCA(n_components=KNN_IMPUTE_PCA_COMPONENTS, random_state=42).fit(search_space)
+                search_space = projection.transform(search_space)
+            index = NearestNeighbors(n_neighbors=k, algorithm='kd_tree' if projection is not None else 'auto')
+            index.fit(search_space)
+            _NEIGHBOR_INDEX_CACHE[key] = (projection, index)
+            if len(_NEIGHBOR_INDEX_CACHE) > _NEIGHBOR_INDEX_CACHE_SIZE:
+                _NEIGHBOR_INDEX_CACHE.popitem(last=False)
+        queries = values[np.ix_(rows, observed)]
+        if projection is not None:
+            queries = projection.transform(queries)
+        _, neighbors = index.kneighbors(queries)
+        values[np.ix_(rows, pattern)] = donors[:, pattern][neighbors].mean(axis=1)
+
+@profiled_stage('missing', params=('strategy',))
+def impute_missing(df, strategy='drop', n_neighbors=5, random_state=42):
+    """
+    Detects missing measurements (MISSING_VALUE_SCHEMA sentinels, or NaN) and drops or imputes them.
+
+    Parameters:
+    - df: pd.DataFrame, raw data.
+    - strategy: str, one of IMPUTATION_STRATEGIES.
+                'drop': drops every subject with a missing measurement.
+                'knn': mean of the n_neighbors nearest complete subjects, on the observed columns.
+                'iterative': sklearn's IterativeImputer (each column modelled from the others).
+                'column_mean': mean of the column (one measurement at one visit and timepoint)
+                               over the subjects who have it.
+    - n_neighbors: int, neighbours for 'knn'.
+    - random_state: int, seed for 'iterative'.
+
+    Returns:
+    - df: pd.DataFrame, without sentinels or NaN in the schema columns (index reset).
+    - report: dict with 'strategy', 'missing_cells', 'affected_rows' (their index labels),
+              'dropped_rows' and 'missing_by_column' (columns with at least one missing value).
+    """
+    if strategy not in IMPUTATION_STRATEGIES:
+        raise ValueError(f"Invalid strategy '{strategy}'. Choose from {IMPUTATION_STRATEGIES}.")
+    positions, values, mask = _missing_mask(df)
+
+    affected = mask.any(axis=1)
+    per_column = mask.sum(axis=0)
+    report = {
+        'strategy': strategy,
+        'missing_cells': int(per_column.sum()),
+        'affected_rows': df.index[affected].tolist(),
+        'dropped_rows': int(affected.sum()) if strategy == 'drop' else 0,
+        'missing_by_column': {df.columns[positions[j]]: int(per_column[j]) for j in np.flatnonzero(per_column)},
+    }
+    print(f"Missing values: {report['missing_cells']} cells in {int(affected.sum())} subjects"
+          + (f" ({strategy}{', dropped' if strategy == 'drop' else ', imputed'})." if affected.any() else "."))
+
+    if not affected.any():
+        return df.reset_index(drop=True), report
+    if strategy == 'drop':
+        return df[~affected].reset_index(drop=True), report
+
+    values[mask] = np.nan
+    if strategy == 'knn':
+        _knn_impute(values, mask, n_neighbors)
+    elif strategy == 'iterative':
+        from sklearn.experimental import enable_iterative_imputer  # noqa: F401 (registers IterativeImputer)
+        from sklearn.impute import IterativeImputer
+        values = IterativeImputer(random_state=random_state, keep_empty_features=True).fit_transform(values)
+    else:
+        means = np.nanmean(np.where(mask, np.nan, values), axis=0)
+        values[mask] = np.take(means, np.nonzero(mask)[1])
+
+    imputed = df.copy()
+    imputed[df.columns[positions]] = values
+    return imputed.reset_index(drop=True), report
+
+def preprocessing_signature():
+    """
+    Short hash of PREPROCESSING_VERSION and the column and missing-value schemas, so a cached
+    matrix is never served after preprocessing changed.
+    """
+    return joblib.hash((PREPROCESSING_VERSION, DEMOGRAPHIC_SCHEMA, COLUMN_PATTERNS, MISSING_VALUE_SCHEMA))[:16]
 
-def load_and_preprocess_data(file_path, data_set='drop_rows', return_original=False):
+@profiled_stage('load', params=('file_path', 'data_set', 'missing', 'compact'))
+def load_and_preprocess_data(file_path, data_set='drop_rows', return_original=False, cache_dir=CACHE_DIR,
+                             missing='drop', compact=False):
     """
     Loads data from Excel, handles missing values, scales and encodes features,
     computes ROM differences, and returns a combined feature matrix.
@@ -115,13 +1096,40 @@ def load_and_preprocess_data(file_path, data_set='drop_rows', return_original=Fa
     Parameters:
     - file_path: str, path to the Excel data file.
     - data_set: str, which dataset to use ('drop_rows', 'drop_cols_1', 'drop_cols_2').
-                'drop_rows': Drops rows 8 and 17.
-                'drop_cols_1': Drops columns containing "1" in their name.
-                'drop_cols_2': Drops columns containing "2" in their name.
+                'drop_rows': Keeps both visits (subjects missing one are dropped by missing='drop').
+                'drop_cols_1': Drops the day-1 columns (measurements and MassD1).
+                'drop_cols_2': Drops the day-2 columns (measurements and MassD2).
+    - return_original: bool, return the unscaled workbook (minus ID) instead.
+    - cache_dir: str or None, directory for the on-disk cache. Both the raw workbook and the
+                 processed output are cached, keyed on the workbook's content hash (plus
+                 preprocessing_signature(), data_set, missing and return_original), so editing
+                 the workbook or the preprocessing invalidates them.
+                 None disables caching.
+    - missing: str, how subjects with missing measurements are handled (see impute_missing).
+    - compact: bool, return the scaled matrix in compact float32 form (see compact_matrix).
+    """
+    if cache_dir is None:
+        return preprocess_frame(pd.read_excel(file_path), data_set=data_set, return_original=return_original,
+                                missing=missing, compact=compact)
+
+    workbook_hash = file_hash(file_path)
+    cached_path = os.path.join(cache_dir, f"processed_{workbook_hash}_{preprocessing_signature()}_{data_set}_{missing}_"
+                                          f"{int(return_original)}.feather")
+    X = _read_cached_frame(cached_path)
+    if X is not None:
+        print(f"Cache: Loaded preprocessed data from {cached_path}.")
+        return compact_matrix(X) if compact and not return_original else X
+
+    df = read_workbook(file_path, cache_dir=cache_dir, workbook_hash=workbook_hash)
+    X = preprocess_frame(df, data_set=data_set, return_original=return_original, missing=missing)
+    _write_cached_frame(X, cached_path)
+    return compact_matrix(X) if compact and not return_original else X
+
+def preprocess_frame(df, data_set='drop_rows', return_original=False, missing='drop', compact=False):
+    """
+    Applies the row/column variant, missing-value, scaling and encoding steps of
+    load_and_preprocess_data to an already-loaded raw frame.
     """
-    # Load data
-    df = pd.read_excel(file_path)
-
     if return_original:  # Return original data if requested
         X = df.copy()
         # Remove ID if present, as it does not contribute to modeling
@@ -129,63 +1137,90 @@ def load_and_preprocess_data(file_path, data_set='drop_rows', return_original=Fa
             X = X.drop(columns=['ID'], errors='ignore')
         return X
 
-    #df = df.drop([8, 17])
-    #df.replace(-99, np.nan, inplace=True)
+    df_imputed = apply_data_set(df, data_set, missing=missing)
+    scalers = fit_scalers(df_imputed, data_set)
+    X = transform_frame(df_imputed, data_set, scalers)
+    return compact_matrix(X) if compact else X
+
+def apply_data_set(df, data_set, missing='drop', return_report=False):
+    """
+    Applies the column drop of a data_set variant (see load_and_preprocess_data), then handles
+    the missing measurements left in the remaining columns with impute_missing. A subject who
+    missed only the dropped visit is therefore kept whole.
 
+    Parameters:
+    - df: pd.DataFrame, raw data.
+    - data_set: str, 'drop_rows', 'drop_cols_1' or 'drop_cols_2'.
+    - missing: str, one of IMPUTATION_STRATEGIES.
+    - return_report: bool, also return impute_missing's report.
+    """
     if data_set == 'drop_rows':
-        # Drop rows 8 and 17
-        df = df.drop([8, 17], axis=0).reset_index(drop=True)
+        # Both visits; on the thesis workbook missing='drop' removes rows 8 and 17
+        pass
     elif data_set == 'drop_cols_1':
-        # Drop columns containing "1" in their name
-        cols_to_drop = [col for col in df.columns if '1' in col and col != 'MassD1']
-        df = df.drop(columns=cols_to_drop)
+        # Drop the day-1 columns (measurements and MassD1)
+        df = df.iloc[:, column_schema(tuple(df.columns)).drop_visit('1')]
     elif data_set == 'drop_cols_2':
-        # Drop columns containing "2" in their name
-        cols_to_drop = [col for col in df.columns if '2' in col and col not in ['MassD2', 'Play#']]
-        df = df.drop(columns=cols_to_drop)
+        # Drop the day-2 columns (measurements and MassD2)
+        df = df.iloc[:, column_schema(tuple(df.columns)).drop_visit('2')]
     else:
         raise ValueError("Invalid data_set value. Choose from ['drop_rows', 'drop_cols_1', 'drop_cols_2'].")
+    df, report = impute_missing(df, strategy=missing)
+    return (df, report) if return_report else df
+
+def feature_groups(df_imputed, data_set=None):
+    """
+    Splits the columns of a variant frame into demographic, goniometer, continuous and categorical
+    groups, by name through column_schema (so the same for every data_set variant).
+    """
+    columns = df_imputed.columns
+    schema = column_schema(tuple(columns))
+    # 'ID' is among the demographic columns and is dropped once the feature matrix is built
+    return (columns[schema.demographic], columns[schema.measurement],
+            columns[schema.continuous].tolist(), columns[schema.categorical].tolist())
 
-    df_imputed = df
+def fit_scalers(df_imputed, data_set):
+    """
+    Fits the demographic, ROM-difference and goniometer scalers/encoder on a variant frame.
 
-    # Dynamically determine demographic columns
-    demographic_columns = df_imputed.columns[:11] if data_set != 'drop_cols_1' else df_imputed.columns[:10] # MassD1 removed, so 10 instead of 11
-    demographic_columns = df_imputed.columns[:11] if data_set != 'drop_cols_2' else df_imputed.columns[:10] # MassD2 removed, so 10 instead of 11
+    Returns:
+    - scalers: dict with 'cont_scaler', 'cat_encoder', 'rom_scaler' (None without ROM pairs) and 'gonio_scaler'.
+    """
+    schema = column_schema(tuple(df_imputed.columns))
+    rom_differences = compute_rom_differences(df_imputed)
+    return {
+        'cont_scaler': RobustScaler().fit(df_imputed.iloc[:, schema.continuous]),
+        'cat_encoder': OrdinalEncoder().fit(df_imputed.iloc[:, schema.categorical]),
+        'rom_scaler': RobustScaler().fit(rom_differences) if not rom_differences.empty else None,
+        'gonio_scaler': RobustScaler().fit(df_imputed.iloc[:, schema.measurement]),
+    }
 
-    # Adjust goniometer columns based on demographic columns
-    goniometer_columns = df_imputed.columns.difference(demographic_columns) # All columns except demographic
+def transform_frame(df_imputed, data_set, scalers):
+    """
+    Scales and encodes a variant frame with already-fitted scalers and builds the feature matrix.
+    """
+    _, _, continuous_features, categorical_features = feature_groups(df_imputed)
+    schema = column_schema(tuple(df_imputed.columns))
 
-    # Split using column names
-    demographic_data = df_imputed[demographic_columns].copy()
-    goniometer_data = df_imputed[goniometer_columns].copy()
+    # Split using the schema's column positions
+    demographic_data = df_imputed.iloc[:, schema.demographic].copy()
+    goniometer_data = df_imputed.iloc[:, schema.measurement]
 
     # Compute ROM differences
     rom_differences = compute_rom_differences(df_imputed)
 
-    # Define continuous and categorical features in demographics
-    continuous_features = ['Age', 'MassD1', 'MassD2', 'Height', 'ShoeSize', 'Tegner']
-    categorical_features = ['Gender', 'LegD', 'ArmD', 'Play#']
-    # 'ID' is at index 0 and typically not used as a feature
-
-    # Filter categorical_features to include only those present in demographic_data
-    categorical_features = [feature for feature in categorical_features if feature in demographic_data.columns]
-
     # Scale continuous demographic features
-    cont_scaler = RobustScaler()
-    demographic_data[continuous_features] = cont_scaler.fit_transform(demographic_data[continuous_features])
+    demographic_data[continuous_features] = scalers['cont_scaler'].transform(df_imputed.iloc[:, schema.continuous])
 
     # Encode categorical demographic features
-    cat_encoder = OrdinalEncoder()
-    demographic_data[categorical_features] = cat_encoder.fit_transform(demographic_data[categorical_features])
+    demographic_data[categorical_features] = scalers['cat_encoder'].transform(df_imputed.iloc[:, schema.categorical])
 
     # Scale ROM differences if available
     if not rom_differences.empty:
-        rom_scaler = RobustScaler()
-        rom_differences = pd.DataFrame(rom_scaler.fit_transform(rom_differences), columns=rom_differences.columns)
+        rom_differences = pd.DataFrame(scalers['rom_scaler'].transform(rom_differences), columns=rom_differences.columns)
 
     # Scale goniometer data
-    gonio_scaler = RobustScaler()
-    goniometer_data_scaled = pd.DataFrame(gonio_scaler.fit_transform(goniometer_data), columns=goniometer_data.columns)
+    goniometer_data_scaled = pd.DataFrame(scalers['gonio_scaler'].transform(goniometer_data), columns=goniometer_data.columns)
 
     # Combine all features
     if not rom_differences.empty:
@@ -201,26 +1236,389 @@ def load_and_preprocess_data(file_path, data_set='drop_rows', return_original=Fa
 
     return X
 
-# Use this to look at pre processed scaled data that contain two days
-X = load_and_preprocess_data(file_path, data_set='drop_rows', return_original=False)
-#X = X[[col for col in X.columns if not col.startswith('Diff')]]
-#X = X[[col for col in X.columns if not col.startswith(('Pre', 'Post'))]]
+def compact_matrix(X):
+    """
+    Compact mode: converts a scaled feature matrix once into a single C-contiguous COMPACT_DTYPE
+    buffer, half the memory of float64 and faster for the distance-heavy stages (t-SNE, silhouette,
+    KNN). The result is still a DataFrame, with the column names as metadata beside the buffer;
+    np.asarray() on it returns the buffer itself, so stages work on views, not copies.
+    """
+    values = np.ascontiguousarray(X.to_numpy(dtype=COMPACT_DTYPE))
+    return pd.DataFrame(values, columns=X.columns, index=X.index, copy=False)
+
+# Analysis variants compared in the thesis: a data_set plus the feature roles/columns left out
+# of its scaled matrix (roles as in column_schema)
+DATA_VARIANTS = {
+    'both_days': {'data_set': 'drop_rows'},
+    'no_diff': {'data_set': 'drop_rows', 'exclude_roles': ['diff']},
+    'diff_only': {'data_set': 'drop_rows', 'exclude_roles': ['goniometer']},
+    'day2_only': {'data_set': 'drop_cols_1', 'exclude_roles': ['diff']},
+    'day1_only': {'data_set': 'drop_cols_2', 'exclude_roles': ['diff']},
+}
+
+def _variant_columns(schema, spec):
+    """Positions of a variant's columns in a full-width matrix (raw workbook or scaled features)."""
+    role, visit = schema.table['role'].to_numpy(), schema.table['visit'].to_numpy()
+    keep = np.ones(len(schema.columns), dtype=bool)
+    if spec['data_set'] in ('drop_cols_1', 'drop_cols_2'):
+        keep &= visit != spec['data_set'][-1]
+    elif spec['data_set'] != 'drop_rows':
+        raise ValueError("Invalid data_set value. Choose from ['drop_rows', 'drop_cols_1', 'drop_cols_2'].")
+    keep &= ~np.isin(role, spec.get('exclude_roles', []))
+    keep &= ~schema.columns.isin(spec.get('exclude_columns', []))
+    return np.flatnonzero(keep)
+
+def data_variants(df, variants=None, missing='drop', compact=False):
+    """
+    Builds the feature matrix of several analysis variants from one load and scaling pass.
+
+    The raw frame is scaled once per distinct set of subjects, and each variant is then its
+    columns of that shared matrix (a NumPy view when they are contiguous, one gather otherwise).
+    Scaling, encoding and ROM deltas are per column, so with missing='drop' a variant equals
+    load_and_preprocess_data(data_set=...) minus its excluded columns. A subject is only dropped
+    from the variants that use one of its missing values. Imputing strategies impute the full
+    frame once, so every variant draws on all observed measurements.
+
+    Parameters:
+    - df: pd.DataFrame, raw data (read_workbook).
+    - variants: dict of name -> spec like DATA_VARIANTS (or a list of DATA_VARIANTS names); None uses all.
+    - missing: str, one of IMPUTATION_STRATEGIES.
+    - compact: bool, keep each shared matrix as one float32 buffer (see compact_matrix).
+
+    Returns:
+    - X_variants: dict of name -> pd.DataFrame, ready for run_sweep.
+    """
+    if variants is None:
+        variants = DATA_VARIANTS
+    elif not isinstance(variants, dict):
+        variants = {name: DATA_VARIANTS[name] for name in variants}
+
+    if missing == 'drop':
+        raw_schema = column_schema(tuple(df.columns))
+        positions, values, mask = _missing_mask(df)
+        full_mask = np.zeros((len(df), len(df.columns)), dtype=bool)
+        full_mask[:, positions] = mask
+        groups = collections.defaultdict(list)  # kept-subject mask -> variants sharing it
+        for name, spec in variants.items():
+            kept = ~full_mask[:, _variant_columns(raw_schema, spec)].any(axis=1)
+            groups[kept.tobytes()].append(name)
+        values[mask] = np.nan  # Missing values outside a variant's columns are ignored by the scalers
+        df = df.copy()
+        df[df.columns[positions]] = values
+        subject_sets = [(np.frombuffer(kept, dtype=bool), names) for kept, names in groups.items()]
+        print(f"Variants: {len(variants)} variants over {len(subject_sets)} subject sets.")
+    else:
+        df, _ = impute_missing(df, strategy=missing)
+        subject_sets = [(np.ones(len(df), dtype=bool), list(variants))]
+
+    X_variants = {}
+    for kept, names in subject_sets:
+        base_frame = df[kept].reset_index(drop=True)
+        X_base = transform_frame(base_frame, 'drop_rows', fit_scalers(base_frame, 'drop_rows'))
+        base_values = np.ascontiguousarray(X_base.to_numpy(dtype=COMPACT_DTYPE if compact else np.float64))
+        schema = column_schema(tuple(X_base.columns))
+        for name in names:
+            columns = _variant_columns(schema, variants[name])
+            if len(columns) and np.array_equal(columns, np.arange(columns[0], columns[-1] + 1)):
+                values = base_values[:, columns[0]:columns[-1] + 1]
+            else:
+                values = base_values[:, columns]
+            X_variants[name] = pd.DataFrame(values, columns=X_base.columns[columns], copy=False)
+    return X_variants
+
+def list_session_files(directory):
+    """Returns the CSV/Excel session files in a directory, sorted by name."""
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.lower().endswith(SESSION_FILE_EXTENSIONS))
+
+def iter_session_chunks(paths, chunksize=5000):
+    """
+    Yields raw frames of chunksize rows (the last one may be shorter) from a list of session files.
+    CSVs are read incrementally; Excel files are read whole (one lab session each). Small files
+    are packed together, so a stream of at most chunksize subjects is a single chunk.
+    """
+    buffered, n_buffered = [], 0
+    for path in paths:
+        frames = pd.read_csv(path, chunksize=chunksize) if path.lower().endswith('.csv') else [pd.read_excel(path)]
+        for frame in frames:
+            buffered.append(frame)
+            n_buffered += len(frame)
+            while n_buffered >= chunksize:
+                combined = pd.concat(buffered, ignore_index=True)
+                yield combined.iloc[:chunksize].reset_index(drop=True)
+                buffered, n_buffered = [combined.iloc[chunksize:]], n_buffered - chunksize
+    if n_buffered:
+        yield pd.concat(buffered, ignore_index=True)
+
+def _iter_variant_chunks(paths, data_set, chunksize, missing):
+    """
+    Yields (variant frame, impute_missing report) per session chunk, without the per-chunk report print.
+    Imputing strategies learn from the other subjects, so they are refused on more than one chunk
+    (the result would depend on the chunking and differ from the in-memory loader).
+    """
+    for index, chunk in enumerate(iter_session_chunks(paths, chunksize=chunksize)):
+        if index and missing != 'drop':
+            raise ValueError(f"missing='{missing}' imputes from the whole cohort, so the sessions must fit in one "
+                             f"chunk of {chunksize} rows. Raise chunksize or use missing='drop'.")
+        with contextlib.redirect_stdout(io.StringIO()):
+            frame, report = apply_data_set(chunk, data_set, missing=missing, return_report=True)
+        yield frame, report
+
+def _update_value_counts(counts, frame):
+    """Merges a chunk's per-column value counts into counts (dict of column -> pd.Series)."""
+    for col in frame.columns:
+        chunk_counts = frame[col].value_counts()
+        counts[col] = chunk_counts if col not in counts else counts[col].add(chunk_counts, fill_value=0)
+
+def _percentiles_from_counts(value_counts, q):
+    """
+    Exact percentiles (numpy's default 'linear' method) from a value -> count summary.
+    """
+    if value_counts.empty:
+        return np.full(len(q), np.nan)
+    value_counts = value_counts.sort_index()
+    values = value_counts.index.to_numpy(dtype=np.float64)
+    cumulative = np.cumsum(value_counts.to_numpy())
+    ranks = np.asarray(q, dtype=np.float64) / 100 * (cumulative[-1] - 1)
+    lower = np.floor(ranks)
+    lower_values = values[np.searchsorted(cumulative, lower, side='right')]
+    upper_values = values[np.searchsorted(cumulative, np.minimum(lower + 1, cumulative[-1] - 1), side='right')]
+    return lower_values + (ranks - lower) * (upper_values - lower_values)
+
+def _robust_scaler_from_counts(counts, columns):
+    """Builds a fitted RobustScaler (median / IQR) from exact per-column value counts."""
+    scaler = RobustScaler()
+    stats = np.array([_percentiles_from_counts(counts.get(col, pd.Series(dtype=np.float64)), [25, 50, 75])
+                      for col in columns]).reshape(len(columns), 3)
+    scale = stats[:, 2] - stats[:, 0]
+    scale[np.abs(scale) < 10 * np.finfo(np.float64).eps] = 1.0  # Same zero-IQR handling as RobustScaler.fit
+    scaler.center_ = stats[:, 1]
+    scaler.scale_ = scale
+    scaler.n_features_in_ = len(columns)
+    scaler.feature_names_in_ = np.asarray(columns, dtype=object)
+    return scaler
+
+def _ordinal_encoder_from_counts(counts, columns):
+    """Builds a fitted OrdinalEncoder whose categories are every value seen in the stream."""
+    categories = [sorted(counts[col].index) for col in columns]
+    encoder = OrdinalEncoder(categories=categories)
+    n_rows = max((len(cats) for cats in categories), default=0)
+    return encoder.fit(pd.DataFrame({col: np.resize(cats, n_rows) for col, cats in zip(columns, categories)}))
+
+def _update_scaler_counts(counts, frame, groups):
+    """Merges a variant frame's values into the per-scaler value counts ('cont', 'cat', 'rom', 'gonio')."""
+    _, goniometer_columns, continuous_features, categorical_features = groups
+    _update_value_counts(counts['cont'], frame[continuous_features])
+    _update_value_counts(counts['cat'], frame[categorical_features])
+    _update_value_counts(counts['gonio'], frame[goniometer_columns])
+    _update_value_counts(counts['rom'], compute_rom_differences(frame))
+
+def _scalers_from_counts(counts, groups):
+    """Builds the fit_scalers dict from value counts gathered with _update_scaler_counts."""
+    _, goniometer_columns, continuous_features, categorical_features = groups
+    return {
+        'cont_scaler': _robust_scaler_from_counts(counts['cont'], continuous_features),
+        'cat_encoder': _ordinal_encoder_from_counts(counts['cat'], categorical_features),
+        'rom_scaler': _robust_scaler_from_counts(counts['rom'], list(counts['rom'])) if counts['rom'] else None,
+        'gonio_scaler': _robust_scaler_from_counts(counts['gonio'], list(goniometer_columns)),
+    }
+
+def fit_streaming_scalers(paths, data_set='drop_rows', chunksize=5000, missing='drop'):
+    """
+    Fits the preprocessing scalers over many session files without holding them in memory at once.
+
+    RobustScaler needs exact medians and quartiles, so a first pass keeps per-column value
+    counts (exact quantile summaries). Goniometer angles are recorded at a fixed resolution,
+    so memory grows with the number of distinct values per column, not with the number of subjects.
+
+    Parameters:
+    - paths: list of str, session files (see list_session_files).
+    - data_set: str, data_set variant.
+    - chunksize: int, maximum rows held in memory at a time.
+    - missing: str, one of IMPUTATION_STRATEGIES. 'drop' works on any number of chunks; the
+               imputing strategies need every subject in one chunk (ValueError otherwise) and
+               then match the in-memory loader. One summary line reports the missing values.
+
+    Returns:
+    - scalers: dict, same layout as fit_scalers, usable with transform_frame.
+    """
+    counts = {'cont': {}, 'cat': {}, 'rom': {}, 'gonio': {}}
+    groups = None
+    missing_cells, affected_rows = 0, 0
+    for chunk, report in _iter_variant_chunks(paths, data_set, chunksize, missing):
+        groups = feature_groups(chunk, data_set)
+        _update_scaler_counts(counts, chunk, groups)
+        missing_cells += report['missing_cells']
+        affected_rows += len(report['affected_rows'])
+
+    if groups is None:
+        raise ValueError("No session data found to fit the scalers.")
+    print(f"Missing values: {missing_cells} cells in {affected_rows} subjects"
+          + (f" ({missing}{', dropped' if missing == 'drop' else ', imputed'})." if affected_rows else "."))
+    return _scalers_from_counts(counts, groups)
+
+def stream_preprocessed_chunks(directory, data_set='drop_rows', chunksize=5000, scalers=None, missing='drop'):
+    """
+    Streams the scaled feature matrix from a directory of session files, one chunk at a time.
+
+    Makes two passes over the files: one to fit the scalers (skipped when scalers are given)
+    and one to transform. Peak memory is bounded by chunksize, not by the number of subjects.
+    Use pd.concat(stream_preprocessed_chunks(...)) when the full matrix does fit in memory.
+
+    Parameters:
+    - directory: str, folder of per-session CSV/Excel files with the workbook's columns.
+    - data_set: str, data_set variant (see fit_streaming_scalers).
+    - chunksize: int, maximum rows per emitted chunk.
+    - scalers: dict or None, previously fitted scalers to reuse.
+    - missing: str, one of IMPUTATION_STRATEGIES (see fit_streaming_scalers).
+
+    Yields:
+    - X_chunk: pd.DataFrame, scaled features for up to chunksize subjects.
+    """
+    paths = list_session_files(directory)
+    if scalers is None:
+        scalers = fit_streaming_scalers(paths, data_set=data_set, chunksize=chunksize, missing=missing)
+    for chunk, _ in _iter_variant_chunks(paths, data_set, chunksize, missing):
+        if not chunk.empty:
+            yield transform_frame(chunk, data_set, scalers)
+
+class PreprocessingTransformer(BaseEstimator, TransformerMixin):
+    """
+    Fitted, serializable version of the load_and_preprocess_data scaling/encoding steps.
 
-# Use this to obtain original data set that also drops missing values
-#X = load_and_preprocess_data(file_path, data_set='drop_rows', return_original=True)
-#X = X.drop([8, 17])
+    fit() learns the scalers on the raw workbook once; transform() and transform_records()
+    then score new subjects against them without refitting, and save()/load() persist the
+    fitted object. A compiled index plan turns every output feature into a NumPy gather,
+    so scoring one subject costs microseconds.
 
-# Use this to look at either day 1 or day 2 alone
-#X = load_and_preprocess_data(file_path, data_set='drop_cols_1', return_original=False)
-#X = X.drop(columns=['MassD1'])
-#X = X[[col for col in X.columns if not col.startswith('Diff')]]
+    Parameters:
+    - data_set: str, data_set variant ('drop_rows', 'drop_cols_1', 'drop_cols_2').
+    - missing: str, how subjects with missing measurements are handled when fitting
+               (see impute_missing); the report is kept in missing_report_.
+    """
 
-#X = load_and_preprocess_data(file_path, data_set='drop_cols_2', return_original=False)
-#X = X.drop(columns=['MassD2'])
-#X = X[[col for col in X.columns if not col.startswith('Diff')]]
+    def __init__(self, data_set='drop_rows', missing='drop'):
+        self.data_set = data_set
+        self.missing = missing
+
+    def fit(self, df, y=None):
+        """
+        Fits the scalers and encoder on a raw frame (as returned by read_workbook).
+        Row drops and imputation are applied here only, never at transform time.
+        """
+        df_imputed, self.missing_report_ = apply_data_set(df, self.data_set, missing=self.missing, return_report=True)
+        self.scalers_ = fit_scalers(df_imputed, self.data_set)
+        self._compile(df_imputed)
+        return self
+
+    def _compile(self, df_imputed):
+        """Builds the per-feature index plan used by transform_records."""
+        _, goniometer_columns, continuous_features, categorical_features = feature_groups(df_imputed)
+        columns = tuple(df_imputed.columns)
+        used_idx, baseline_idx, followup_idx, diff_names = _rom_pair_index(columns, ('Pre', 'Post'))
+        diff_pairs = {name: (columns[used_idx[post]], columns[used_idx[pre]])
+                      for name, pre, post in zip(diff_names, baseline_idx, followup_idx)}
+
+        def scaler_stats(scaler, col):
+            i = list(scaler.feature_names_in_).index(col)
+            return scaler.center_[i], scaler.scale_[i]
+
+        self.feature_names_out_ = transform_frame(df_imputed.head(1), self.data_set, self.scalers_).columns.to_numpy(dtype=object)
+        input_columns = {}
+        direct, diffs, categorical = [], [], []
+        for out_pos, name in enumerate(self.feature_names_out_):
+            if name in categorical_features:
+                i = categorical_features.index(name)
+                categorical.append((out_pos, input_columns.setdefault(name, len(input_columns)),
+                                    self.scalers_['cat_encoder'].categories_[i]))
+            elif name in diff_pairs:
+                post_col, pre_col = diff_pairs[name]
+                center, scale = scaler_stats(self.scalers_['rom_scaler'], name)
+                diffs.append((out_pos, input_columns.setdefault(post_col, len(input_columns)),
+                              input_columns.setdefault(pre_col, len(input_columns)), center, scale))
+            else:
+                if name in goniometer_columns:
+                    center, scale = scaler_stats(self.scalers_['gonio_scaler'], name)
+                elif name in continuous_features:
+                    center, scale = scaler_stats(self.scalers_['cont_scaler'], name)
+                else:
+                    center, scale = 0.0, 1.0  # Demographic column passed through unscaled
+                direct.append((out_pos, input_columns.setdefault(name, len(input_columns)), center, scale))
+
+        self.input_columns_ = list(input_columns)
+        self._direct_plan = tuple(np.array(v) for v in zip(*direct)) if direct else None
+        self._diff_plan = tuple(np.array(v) for v in zip(*diffs)) if diffs else None
+        self._categorical_plan = categorical
+
+    def transform_array(self, X_in):
+        """
+        Transforms a float array whose columns follow input_columns_ into the feature matrix.
+
+        Missing measurements (NaN, or a MISSING_VALUE_SCHEMA sentinel such as -99) raise a
+        ValueError: imputation is fitted on the cohort, not applied per subject at transform time.
+        """
+        X_in = np.asarray(X_in, dtype=np.float64)
+        missing = np.isnan(X_in)
+        positions, sentinel_groups = _missing_value_columns(tuple(self.input_columns_))
+        for sentinels, group in sentinel_groups:
+            missing[:, positions[group]] |= np.isin(X_in[:, positions[group]], sentinels)
+        if missing.any():
+            columns = [self.input_columns_[i] for i in np.flatnonzero(missing.any(axis=0))]
+            raise ValueError(f"Missing measurements in {int(missing.any(axis=1).sum())} subject(s), "
+                             f"columns {columns}; impute or drop them before transform.")
+        out = np.empty((X_in.shape[0], len(self.feature_names_out_)))
+        if self._direct_plan is not None:
+            out_pos, in_pos, center, scale = self._direct_plan
+            out[:, out_pos] = (X_in[:, in_pos] - center) / scale
+        if self._diff_plan is not None:
+            out_pos, post_pos, pre_pos, center, scale = self._diff_plan
+            out[:, out_pos] = (X_in[:, post_pos] - X_in[:, pre_pos] - center) / scale
+        for out_pos, in_pos, categories in self._categorical_plan:
+            values = X_in[:, in_pos]
+            codes = np.searchsorted(categories, values)
+            unknown = (codes >= len(categories)) | (categories[np.minimum(codes, len(categories) - 1)] != values)
+            if unknown.any():
+                raise ValueError(f"Found unknown categories {values[unknown].tolist()} in column "
+                                 f"'{self.feature_names_out_[out_pos]}' during transform.")
+            out[:, out_pos] = codes
+        return out
+
+    def transform_records(self, records):
+        """
+        Transforms one subject (dict) or many (list of dicts) keyed by raw column name.
+
+        Returns:
+        - np.array of shape (n_subjects, n_features), columns in get_feature_names_out() order.
+        """
+        if isinstance(records, dict):
+            records = [records]
+        return self.transform_array([[record[col] for col in self.input_columns_] for record in records])
+
+    def transform(self, df):
+        """
+        Transforms a raw frame (workbook columns, any number of subjects) into the feature matrix.
+        """
+        missing = [col for col in self.input_columns_ if col not in df.columns]
+        if missing:
+            raise ValueError(f"Missing columns required by the preprocessor: {missing}")
+        return pd.DataFrame(self.transform_array(df[self.input_columns_].to_numpy(dtype=np.float64)),
+                            columns=self.feature_names_out_, index=df.index)
+
+    def get_feature_names_out(self, input_features=None):
+        return self.feature_names_out_
+
+    def save(self, path):
+        """Serializes the fitted transformer to path with joblib."""
+        joblib.dump(self, path)
+
+    @classmethod
+    def load(cls, path):
+        """Loads a transformer saved with save()."""
+        transformer = joblib.load(path)
+        if not isinstance(transformer, cls):
+            raise TypeError(f"{path} does not contain a {cls.__name__}.")
+        return transformer
 
-# Make sure to uncomment this last one to check before running
-X.to_csv('exported_data.csv', index=False)
 
 """## Completed with CV of 5 and custer of 3
 Original Pipeline
@@ -239,49 +1637,282 @@ Running Ankle ROM only with demographics (bad stilhoutte score)
 - Diff_DFPR & WB2DFL
 """
 
-def dimensionality_reduction(X, method='tsne_pca', n_components=2, pca_components=10):
+def _sklearn_tsne(X, n_components, perplexity, random_state, method='barnes_hut'):
+    """scikit-learn t-SNE; Barnes-Hut is O(n log n) and is what the pipeline has always used."""
+    from sklearn.manifold import TSNE
+    tsne = TSNE(n_components=n_components, random_state=random_state, perplexity=perplexity, learning_rate='auto', method=method)
+    return tsne.fit_transform(X)
+
+def _opentsne_fft(X, n_components, perplexity, random_state):
+    """openTSNE with approximate nearest neighbours and FFT-interpolated gradients (optional dependency)."""
+    from openTSNE import TSNE as OpenTSNE
+    tsne = OpenTSNE(n_components=n_components, perplexity=perplexity, neighbors='approx',
+                    negative_gradient_method='fft', random_state=random_state, n_jobs=-1)
+    return np.asarray(tsne.fit(X))
+
+def _umap(X, n_components, perplexity, random_state):
+    """UMAP (optional dependency). n_neighbors is matched to t-SNE's effective neighbourhood of ~3x perplexity."""
+    import umap
+    reducer = umap.UMAP(n_components=n_components, n_neighbors=max(2, int(3 * perplexity)), random_state=random_state)
+    return reducer.fit_transform(X)
+
+# Embedding backends: name -> function(X, n_components, perplexity, random_state)
+EMBEDDING_BACKENDS = {
+    'tsne': _sklearn_tsne,
+    'tsne_exact': functools.partial(_sklearn_tsne, method='exact'),
+    'tsne_fft': _opentsne_fft,
+    'umap': _umap,
+}
+
+# Above these sizes 'auto' switches to approximate embeddings and the PCA pre-step goes incremental
+APPROXIMATE_EMBEDDING_MIN_ROWS = 5000
+INCREMENTAL_PCA_MIN_ROWS = 20000
+
+_EMBEDDING_CACHE = collections.OrderedDict()
+_EMBEDDING_CACHE_SIZE = 32
+
+def _resolve_embedding_backend(backend, n_rows):
+    """Maps 'auto' to a concrete backend: sklearn t-SNE for small cohorts, FFT t-SNE or UMAP beyond that."""
+    if backend != 'auto':
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown embedding backend. Choose from {['auto'] + list(EMBEDDING_BACKENDS)}.")
+        return backend
+    if n_rows < APPROXIMATE_EMBEDDING_MIN_ROWS:
+        return 'tsne'
+    for candidate, module in (('tsne_fft', 'openTSNE'), ('umap', 'umap')):
+        if importlib.util.find_spec(module) is not None:
+            return candidate
+    return 'tsne'
+
+def _pca_prestep(X, pca_components, random_state):
+    """PCA before t-SNE; IncrementalPCA in batches on large cohorts to bound memory."""
+    from sklearn.decomposition import PCA, IncrementalPCA
+    if len(X) >= INCREMENTAL_PCA_MIN_ROWS:
+        batch_size = max(5 * pca_components, 2000)
+        return IncrementalPCA(n_components=pca_components, batch_size=batch_size).fit_transform(X)
+    return PCA(n_components=pca_components, random_state=random_state).fit_transform(X)
+
+def embed(X, method='tsne_pca', n_components=2, pca_components=10, backend='tsne', perplexity=5, random_state=42, cache=True,
+          cache_dir=CACHE_DIR):
     """
-    Applies dimensionality reduction. If method is 'tsne_pca', applies PCA followed by t-SNE.
-    If method is 'tsne', applies t-SNE directly.
+    Computes (or reuses) a 2-D embedding with a pluggable backend.
+
+    Parameters:
+    - X: pd.DataFrame or np.array, feature matrix.
+    - method: str, 'tsne_pca' (PCA pre-step first) or 'tsne' (embed X directly).
+    - n_components: int, embedding dimensions.
+    - pca_components: int, PCA components for 'tsne_pca'.
+    - backend: str, 'tsne' (sklearn Barnes-Hut), 'tsne_exact', 'tsne_fft' (openTSNE), 'umap' or 'auto'.
+    - perplexity: float, t-SNE perplexity (UMAP derives n_neighbors from it).
+    - random_state: int, seed.
+    - cache: bool, reuse embeddings of identical inputs, in memory and under cache_dir.
+    - cache_dir: str or None, on-disk embedding cache root (None keeps the cache in memory only).
+
+    Returns:
+    - X_embedded: np.array, shape (n_samples, n_components).
+    - info: dict, backend used, pca_seconds, embedding_seconds and whether it came from the cache.
     """
+    if method not in ('tsne_pca', 'tsne'):
+        raise ValueError("Unknown dimensionality reduction method. Choose from ['tsne_pca', 'tsne'].")
+    X_values = np.ascontiguousarray(_feature_values(X))
+    backend = _resolve_embedding_backend(backend, len(X_values))
+    info = {'backend': backend, 'method': method, 'pca_seconds': 0.0, 'embedding_seconds': 0.0, 'cached': False}
+
+    key = None
+    if cache:
+        digest = hashlib.sha256(X_values.data)
+        digest.update(repr((X_values.shape, method, n_components, pca_components if method == 'tsne_pca' else None,
+                            backend, perplexity, random_state)).encode())
+        key = digest.hexdigest()
+        cached_path = os.path.join(cache_dir, 'embeddings', f"{key}.npy") if cache_dir else None
+        if key in _EMBEDDING_CACHE:
+            _EMBEDDING_CACHE.move_to_end(key)
+            return _EMBEDDING_CACHE[key], {**info, 'cached': True}
+        if cached_path and os.path.exists(cached_path):
+            X_embedded = np.load(cached_path)
+            _remember_embedding(key, X_embedded)
+            return X_embedded, {**info, 'cached': True}
+
+    start = time.perf_counter()
     if method == 'tsne_pca':
-        # First apply PCA
-        pca = PCA(n_components=pca_components, random_state=42)
-        X_pca = pca.fit_transform(X)
-        print(f"PCA: Reduced to {pca_components} components.")
-        # Then apply t-SNE
-        tsne = TSNE(n_components=n_components, random_state=42, perplexity=5, learning_rate='auto')
-        X_embedded = tsne.fit_transform(X_pca)
-        print("t-SNE: Dimensionality reduction completed after PCA.")
-        return X_embedded
-    elif method == 'tsne':
-        # Apply t-SNE directly
-        tsne = TSNE(n_components=n_components, random_state=42, perplexity=5, learning_rate='auto')
-        X_embedded = tsne.fit_transform(X)
-        print("t-SNE: Dimensionality reduction completed directly.")
-        return X_embedded
+        X_values = _pca_prestep(X_values, pca_components, random_state)
+        info['pca_seconds'] = time.perf_counter() - start
+    start = time.perf_counter()
+    X_embedded = EMBEDDING_BACKENDS[backend](X_values, n_components, perplexity, random_state)
+    info['embedding_seconds'] = time.perf_counter() - start
+
+    if cache:
+        _remember_embedding(key, X_embedded)
+        if cached_path:
+            # Atomic write: parallel sweep workers may embed the same input at once
+            os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+            tmp_path = f"{cached_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as file:
+                np.save(file, X_embedded)
+            os.replace(tmp_path, cached_path)
+    return X_embedded, info
+
+def _remember_embedding(key, X_embedded):
+    """Adds an embedding to the in-memory LRU cache."""
+    _EMBEDDING_CACHE[key] = X_embedded
+    _EMBEDDING_CACHE.move_to_end(key)
+    while len(_EMBEDDING_CACHE) > _EMBEDDING_CACHE_SIZE:
+        _EMBEDDING_CACHE.popitem(last=False)
+
+@profiled_stage('reduction', params=('method', 'pca_components', 'backend'))
+def dimensionality_reduction(X, method='tsne_pca', n_components=2, pca_components=10, backend='tsne', cache=True,
+                             cache_dir=CACHE_DIR):
+    """
+    Applies dimensionality reduction. If method is 'tsne_pca', applies PCA followed by t-SNE.
+    If method is 'tsne', applies t-SNE directly. backend selects the embedding engine (see embed);
+    identical inputs reuse their cached embedding.
+    """
+    X_embedded, info = embed(X, method=method, n_components=n_components, pca_components=pca_components,
+                             backend=backend, cache=cache, cache_dir=cache_dir)
+    if info['cached']:
+        print(f"{info['backend']}: Reused cached embedding.")
+    elif method == 'tsne_pca':
+        print(f"PCA: Reduced to {pca_components} components in {info['pca_seconds']:.2f}s.")
+        print(f"{info['backend']}: Dimensionality reduction completed after PCA in {info['embedding_seconds']:.2f}s.")
     else:
-        raise ValueError("Unknown dimensionality reduction method. Choose from ['tsne_pca', 'tsne'].")
+        print(f"{info['backend']}: Dimensionality reduction completed directly in {info['embedding_seconds']:.2f}s.")
+    return X_embedded
+
+# Above this many rows the silhouette is estimated on a sample instead of a full n x n distance matrix
+SILHOUETTE_EXACT_MAX_ROWS = 5000
+SILHOUETTE_SAMPLE_SIZE = 2000
+K_SEARCH_CRITERIA = ['silhouette', 'calinski_harabasz', 'elbow', 'gap']
+
+def _fit_k(X, k, distances, silhouette, sample_size, random_state):
+    """Fits KMeans for one k and scores it. distances is a shared precomputed matrix (or None)."""
+    from sklearn.cluster import KMeans
+    kmeans = KMeans(n_clusters=k, random_state=random_state).fit(X)
+    labels = kmeans.labels_
+    scores = {'inertia': kmeans.inertia_, 'calinski_harabasz': calinski_harabasz_score(X, labels)}
+    if silhouette:
+        if distances is not None:
+            scores['silhouette'] = silhouette_score(distances, labels, metric='precomputed')
+        else:
+            scores['silhouette'] = silhouette_score(X, labels, sample_size=sample_size, random_state=random_state)
+    return scores
+
+def _reference_log_inertia(X, k, n_references, random_state):
+    """Mean and std of log(inertia) for KMeans on uniform reference data in X's bounding box (gap statistic)."""
+    from sklearn.cluster import KMeans
+    rng = np.random.default_rng(random_state)
+    low, high = X.min(axis=0), X.max(axis=0)
+    log_inertia = [np.log(KMeans(n_clusters=k, random_state=random_state).fit(rng.uniform(low, high, X.shape)).inertia_)
+                   for _ in range(n_references)]
+    return np.mean(log_inertia), np.std(log_inertia) * np.sqrt(1 + 1 / n_references)
+
+def _elbow_k(k_values, inertia):
+    """Knee of the inertia curve: the point farthest below the line joining its normalized endpoints."""
+    k = np.asarray(k_values, dtype=np.float64)
+    y = np.asarray(inertia, dtype=np.float64)
+    if len(k) < 3:
+        return int(k_values[0])
+    k_norm = (k - k[0]) / (k[-1] - k[0])
+    y_norm = (y - y.min()) / (y.max() - y.min()) if y.max() > y.min() else np.zeros_like(y)
+    return int(k_values[int(np.argmax((1 - k_norm) - y_norm))])
+
+def search_k(X, k_range=range(2, 11), criterion='silhouette', n_jobs=-1, sample_size=None, patience=None,
+             n_references=10, random_state=42):
+    """
+    Searches for the number of KMeans clusters without plotting or other side effects.
 
-# becuase small sample size
-def find_optimal_k(X):
-    silhouette_scores = []
-    for k in range(2, 11):  # Try k from 2 to 10
-        cluster_labels = KMeans(n_clusters=k, random_state=42).fit_predict(X)
-        score = silhouette_score(X, cluster_labels)
-        silhouette_scores.append(score)
-
-    plt.plot(range(2, 11), silhouette_scores, marker='o')
-    plt.title('Silhouette Analysis for Optimal k')
+    Candidate k are fitted in parallel threads. For silhouette, one pairwise-distance matrix
+    is computed up front and shared by every k; above SILHOUETTE_EXACT_MAX_ROWS rows (or when
+    sample_size is given) a sampled silhouette is used instead.
+
+    Parameters:
+    - X: pd.DataFrame or np.array, data to cluster.
+    - k_range: iterable of int, candidate numbers of clusters.
+    - criterion: str, 'silhouette' (max), 'calinski_harabasz' (max), 'elbow' (knee of inertia)
+                 or 'gap' (Tibshirani gap statistic, smallest k with gap(k) >= gap(k+1) - s(k+1)).
+    - n_jobs: int, parallel workers (-1 uses all cores).
+    - sample_size: int or None, silhouette sample size. None means exact up to SILHOUETTE_EXACT_MAX_ROWS.
+    - patience: int or None, silhouette/calinski_harabasz only: stop once this many consecutive
+                k fail to improve the best score. k is evaluated in parallel batches, so a
+                few extra k past the stopping point may be scored.
+    - n_references: int, reference datasets per k for 'gap'.
+    - random_state: int, seed.
+
+    Returns:
+    - result: dict with 'optimal_k', 'criterion', 'k_values' and 'scores' (one list per metric,
+              aligned with k_values: inertia, calinski_harabasz, plus silhouette or gap/gap_std).
+    """
+    if criterion not in K_SEARCH_CRITERIA:
+        raise ValueError(f"Unknown criterion. Choose from {K_SEARCH_CRITERIA}.")
+    X = np.ascontiguousarray(_feature_values(X))
+    k_candidates = [k for k in k_range if 2 <= k < len(X)]
+    silhouette = criterion == 'silhouette'
+
+    distances = None
+    if silhouette and sample_size is None:
+        if len(X) <= SILHOUETTE_EXACT_MAX_ROWS:
+            distances = pairwise_distances(X, n_jobs=n_jobs)
+        else:
+            sample_size = SILHOUETTE_SAMPLE_SIZE
+
+    batch_size = effective_n_jobs(n_jobs) if patience else len(k_candidates)
+    k_values, per_k = [], []
+    best, since_best = -np.inf, 0
+    with Parallel(n_jobs=n_jobs, prefer='threads') as parallel:
+        for start in range(0, len(k_candidates), max(batch_size, 1)):
+            batch = k_candidates[start:start + batch_size]
+            per_k.extend(parallel(delayed(_fit_k)(X, k, distances, silhouette, sample_size, random_state) for k in batch))
+            k_values.extend(batch)
+            if patience and criterion in ('silhouette', 'calinski_harabasz'):
+                for scores in per_k[-len(batch):]:
+                    if scores[criterion] > best:
+                        best, since_best = scores[criterion], 0
+                    else:
+                        since_best += 1
+                if since_best >= patience:
+                    break
+
+        scores = {metric: [entry[metric] for entry in per_k] for metric in per_k[0]} if per_k else {}
+        if criterion == 'gap':
+            references = parallel(delayed(_reference_log_inertia)(X, k, n_references, random_state) for k in k_values)
+            scores['gap'] = [ref_mean - np.log(inertia) for (ref_mean, _), inertia in zip(references, scores['inertia'])]
+            scores['gap_std'] = [ref_std for _, ref_std in references]
+
+    if not k_values:
+        raise ValueError("No valid k: k_range must contain values between 2 and n_samples - 1.")
+    if criterion in ('silhouette', 'calinski_harabasz'):
+        optimal_k = k_values[int(np.argmax(scores[criterion]))]
+    elif criterion == 'elbow':
+        optimal_k = _elbow_k(k_values, scores['inertia'])
+    else:
+        gap, gap_std = scores['gap'], scores['gap_std']
+        optimal_k = next((k_values[i] for i in range(len(k_values) - 1) if gap[i] >= gap[i + 1] - gap_std[i + 1]),
+                         k_values[int(np.argmax(gap))])
+    return {'optimal_k': int(optimal_k), 'criterion': criterion, 'k_values': k_values, 'scores': scores}
+
+def plot_k_search(result):
+    """Plots the score curve of a search_k result."""
+    import matplotlib.pyplot as plt
+    metric = {'elbow': 'inertia'}.get(result['criterion'], result['criterion'])
+    plt.plot(result['k_values'], result['scores'][metric], marker='o')
+    plt.axvline(result['optimal_k'], linestyle='--', color='r')
+    plt.title(f"{metric.replace('_', ' ').title()} Analysis for Optimal k")
     plt.xlabel('Number of Clusters (k)')
-    plt.ylabel('Silhouette Score')
+    plt.ylabel(metric.replace('_', ' ').title())
     plt.show()
 
-    optimal_k = range(2, 11)[silhouette_scores.index(max(silhouette_scores))]
+# becuase small sample size
+def find_optimal_k(X, criterion='silhouette', plot=True, **search_kwargs):
+    """
+    Estimates the number of clusters with search_k (k from 2 to 10 by default) and optionally plots the curve.
+    """
+    result = search_k(X, criterion=criterion, **search_kwargs)
+    if plot:
+        plot_k_search(result)
+
+    optimal_k = result['optimal_k']
     print(f"Estimated optimal number of clusters: {optimal_k}")
     return optimal_k
 
-optimal_k = find_optimal_k(X)
 
 # Define how many clusters are needed
 #(will affect cv = _ becuase can't be bigger than members in cluster)
@@ -327,39 +1958,397 @@ optimal_k = find_optimal_k(X)
 #optimal_k = find_optimal_k(X_embedded)
 #print(f"Estimated optimal number of clusters: {optimal_k}")
 
-def clustering(X, method='kmeans', n_clusters= 3): #optimal_k
+def _timed_call(func, *args, **kwargs):
+    """Runs func once and returns (result, wall seconds, CPU seconds), without memory tracing."""
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+def _traced_call(func, *args, **kwargs):
+    """
+    Runs func once and returns (result, wall seconds, CPU seconds, peak traced MB above the starting level).
+    Inside an already running trace (e.g. a benchmark stage) it resets the peak instead of restarting tracing.
+    """
+    nested = tracemalloc.is_tracing()
+    if nested:
+        start_memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.start()
+        start_memory = 0
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+        _, peak = tracemalloc.get_traced_memory()
+        if not nested:
+            tracemalloc.stop()
+    return result, wall, cpu, (peak - start_memory) / 1e6
+
+def _kmeans(X, n_clusters, random_state):
+    """KMeans, what the pipeline has always used (O(n k) memory)."""
+    from sklearn.cluster import KMeans
+    print("Clustering: Using KMeans.")
+    return KMeans(n_clusters=n_clusters, random_state=random_state).fit_predict(X)
+
+def _agg(X, n_clusters, random_state):
+    """Ward agglomerative clustering without connectivity: O(n^2) memory, fine for the cohort, not for 100k."""
+    from sklearn.cluster import AgglomerativeClustering
+    print("Clustering: Using Agglomerative Clustering.")
+    return AgglomerativeClustering(n_clusters=n_clusters).fit_predict(X)
+
+def _minibatch_kmeans(X, n_clusters, random_state):
+    """MiniBatchKMeans: KMeans on random mini-batches, for cohorts far beyond memory-bound full passes."""
+    from sklearn.cluster import MiniBatchKMeans
+    print("Clustering: Using MiniBatch KMeans.")
+    return MiniBatchKMeans(n_clusters=n_clusters, batch_size=1024, n_init=3, random_state=random_state).fit_predict(X)
+
+def _hdbscan(X, n_clusters, random_state):
+    """
+    HDBSCAN (density based): finds its own number of clusters, labels outliers -1; n_clusters is ignored.
+    Memory grows quickly with n (about 3 GB at 100k 2-D points).
+    """
+    from sklearn.cluster import HDBSCAN
+    print("Clustering: Using HDBSCAN.")
+    return HDBSCAN(min_cluster_size=max(5, len(X) // 100)).fit_predict(X)
+
+def _gmm(X, n_clusters, random_state):
+    """Gaussian mixture (full covariances), hard assignment to the most likely component."""
+    from sklearn.mixture import GaussianMixture
+    print("Clustering: Using Gaussian Mixture.")
+    return GaussianMixture(n_components=n_clusters, random_state=random_state).fit_predict(X)
+
+def _agg_knn(X, n_clusters, random_state, n_neighbors=10):
+    """Ward agglomerative clustering restricted to a k-nearest-neighbour graph: sparse, O(n k) memory."""
+    from sklearn.cluster import AgglomerativeClustering
+    from sklearn.neighbors import kneighbors_graph
+    print("Clustering: Using Agglomerative Clustering (kNN connectivity).")
+    connectivity = kneighbors_graph(X, n_neighbors=min(n_neighbors, len(X) - 1), include_self=False)
+    return AgglomerativeClustering(n_clusters=n_clusters, connectivity=connectivity).fit_predict(X)
+
+# Workers for a stage's own parallelism (consensus resampling). Sweep pool workers set it to 1
+# while they run a task: the pool already uses the cores, and a pool per worker would oversubscribe them
+_STAGE_N_JOBS = -1
+
+def _consensus(X, n_clusters, random_state, method):
+    """consensus_clustering labels of a base method."""
+    consensus = consensus_clustering(X, method=method, n_clusters=n_clusters, random_state=random_state,
+                                     n_jobs=_STAGE_N_JOBS)
+    print(f"Clustering: Consensus of {consensus['n_resamples']} {method} resamples, "
+          f"mean subject stability {consensus['stability'].mean():.3f}.")
+    return consensus['labels']
+
+# Clustering backends: name -> function(X, n_clusters, random_state) returning labels (-1 = noise)
+CLUSTERING_BACKENDS = {
+    'kmeans': _kmeans,
+    'agg': _agg,
+    'minibatch_kmeans': _minibatch_kmeans,
+    'hdbscan': _hdbscan,
+    'gmm': _gmm,
+    'agg_knn': _agg_knn,
+    'consensus_kmeans': functools.partial(_consensus, method='kmeans'),
+    'consensus_agg': functools.partial(_consensus, method='agg'),
+}
+
+@profiled_stage('clustering', params=('method', 'n_clusters'))
+def clustering(X, method='kmeans', n_clusters= 3, random_state=42, return_info=False, trace_memory=False): #optimal_k
     """
-    Applies clustering algorithm on reduced data.
+    Applies clustering algorithm on reduced data (or any feature matrix).
+
+    Parameters:
+    - X: np.array or pd.DataFrame, data to cluster.
+    - method: str, a CLUSTERING_BACKENDS name.
+    - n_clusters: int, number of clusters (ignored by 'hdbscan').
+    - random_state: int, seed.
+    - return_info: bool, also return timing (and, with trace_memory, memory) of the fit.
+    - trace_memory: bool, measure the fit's peak memory with tracemalloc. Tracing slows
+                    allocation-heavy fits several times over, so it is off unless asked for.
+
+    Returns:
+    - labels: np.array, cluster per row (-1 marks noise for density-based backends).
+    - info (with return_info=True): dict with 'method', 'n_clusters_found', 'n_noise', 'wall_s',
+      'cpu_s' and 'peak_mb' (peak traced memory of the fit in this process, None without
+      trace_memory; parallel consensus resamples run in worker processes and are not included).
     """
-    if method == 'kmeans':
-        clusterer = KMeans(n_clusters=n_clusters, random_state=42)
-        print("Clustering: Using KMeans.")
-    elif method == 'agg':
-        clusterer = AgglomerativeClustering(n_clusters=n_clusters)
-        print("Clustering: Using Agglomerative Clustering.")
+    if method not in CLUSTERING_BACKENDS:
+        raise ValueError(f"Unknown clustering method. Choose from {list(CLUSTERING_BACKENDS)}.")
+    if trace_memory:
+        labels, wall, cpu, peak_mb = _traced_call(CLUSTERING_BACKENDS[method], X, n_clusters, random_state)
     else:
+        (labels, wall, cpu), peak_mb = _timed_call(CLUSTERING_BACKENDS[method], X, n_clusters, random_state), None
+    if not return_info:
+        return labels
+    return labels, {
+        'method': method,
+        'n_clusters_found': len(set(labels) - {-1}),
+        'n_noise': int(np.sum(labels == -1)),
+        'wall_s': wall,
+        'cpu_s': cpu,
+        'peak_mb': peak_mb,
+    }
+
+def _add_condensed(buffer, indicators, block_size=256):
+    """
+    Adds the upper triangle of indicators @ indicators.T to a condensed (scipy squareform
+    order) buffer, one block of rows at a time so the n x n product is never materialised.
+    """
+    n = len(indicators)
+    start = 0
+    for block_start in range(0, n, block_size):
+        block = indicators[block_start:block_start + block_size] @ indicators.T
+        for offset, row in enumerate(block):
+            i = block_start + offset
+            buffer[start:start + n - i - 1] += row[i + 1:]
+            start += n - i - 1
+
+def _resample_clusterings(X, method, n_clusters, seeds, resample, subsample_fraction, chunk_size=32):
+    """
+    Clusters one resample per seed and returns the condensed (co-clustered, co-sampled) pair counts
+    of the whole batch as float32 buffers.
+    """
+    from sklearn.cluster import AgglomerativeClustering, KMeans
+    X = np.asarray(X)
+    n = len(X)
+    n_pairs = n * (n - 1) // 2
+    together = np.zeros(n_pairs, dtype=np.float32)
+    sampled = np.zeros(n_pairs, dtype=np.float32)
+    for chunk in range(0, len(seeds), chunk_size):
+        chunk_seeds = seeds[chunk:chunk + chunk_size]
+        # One-hot cluster membership (and sampling) per resample; pair counts are then matrix products
+        clustered = np.zeros((n, n_clusters * len(chunk_seeds)), dtype=np.float32)
+        present = np.zeros((n, len(chunk_seeds)), dtype=np.float32)
+        for r, seed in enumerate(chunk_seeds):
+            rng = np.random.RandomState(seed)
+            if resample == 'bootstrap':
+                rows = rng.randint(n, size=n)
+            else:
+                rows = np.sort(rng.choice(n, size=min(max(int(round(subsample_fraction * n)), n_clusters + 1), n), replace=False))
+            if method == 'kmeans':
+                clusterer = KMeans(n_clusters=n_clusters, n_init=1, random_state=seed)
+            else:
+                clusterer = AgglomerativeClustering(n_clusters=n_clusters)
+            labels = clusterer.fit_predict(X[rows])
+            # Duplicated bootstrap rows share a label, so each subject counts once per resample
+            clustered[rows, r * n_clusters + labels] = 1
+            present[rows, r] = 1
+        _add_condensed(together, clustered)
+        _add_condensed(sampled, present)
+    return together, sampled
+
+def consensus_clustering(X, method='kmeans', n_clusters=3, n_resamples=200, resample='subsample',
+                         subsample_fraction=0.8, n_jobs=-1, random_state=42):
+    """
+    Consensus clustering (Monti et al.): clusters many resamples of the subjects and groups
+    subjects that keep landing in the same cluster.
+
+    Resamples run in parallel batches. Each batch returns its pair counts, which are summed into
+    a compact co-association matrix: the upper triangle only, in float32 (scipy's condensed
+    layout), so memory is n(n-1)/2 floats instead of n^2.
+
+    Parameters:
+    - X: np.array or pd.DataFrame, data to cluster (e.g. the embedding).
+    - method: str, base clusterer ('kmeans' or 'agg').
+    - n_clusters: int, number of clusters.
+    - n_resamples: int, number of resampled clusterings.
+    - resample: str, 'subsample' (without replacement) or 'bootstrap'.
+    - subsample_fraction: float in (0, 1], fraction of subjects per subsample (at least n_clusters + 1).
+    - n_jobs: int, parallel workers.
+    - random_state: int, seed.
+
+    Returns:
+    - dict with 'labels' (consensus labels, 0..n_clusters-1), 'stability' (per subject: mean
+      co-association with the rest of its consensus cluster, 1 = always together),
+      'cluster_stability' (mean within-cluster co-association per cluster), 'coassociation'
+      (condensed float32 matrix) and 'n_resamples'.
+    """
+    from scipy.cluster.hierarchy import fcluster, linkage
+    if method not in ('kmeans', 'agg'):
         raise ValueError("Unknown clustering method. Choose from ['kmeans', 'agg'].")
-    labels = clusterer.fit_predict(X)
-    return labels
+    if resample not in ('subsample', 'bootstrap'):
+        raise ValueError("Unknown resampling scheme. Choose from ['subsample', 'bootstrap'].")
+    if not 0 < subsample_fraction <= 1:
+        raise ValueError(f"subsample_fraction must be in (0, 1], got {subsample_fraction}.")
+    n = len(X)
+    if n <= n_clusters:
+        raise ValueError(f"Consensus clustering needs more subjects than clusters, got {n} subjects "
+                         f"for n_clusters={n_clusters}.")
+    seeds = np.random.RandomState(random_state).randint(np.iinfo(np.int32).max, size=n_resamples)
+    n_batches = max(1, min(effective_n_jobs(n_jobs), n_resamples))
+    batches = Parallel(n_jobs=n_jobs)(
+        delayed(_resample_clusterings)(X, method, n_clusters, batch_seeds, resample, subsample_fraction)
+        for batch_seeds in np.array_split(seeds, n_batches))
+    together, sampled = batches[0]
+    for batch_together, batch_sampled in batches[1:]:
+        together += batch_together
+        sampled += batch_sampled
+    # Co-association: share of resamples containing both subjects in which they were clustered together
+    coassociation = np.divide(together, sampled, out=np.zeros_like(together), where=sampled > 0)
+
+    linkage_matrix = linkage(1 - coassociation, method='average')
+    labels = fcluster(linkage_matrix, n_clusters, criterion='maxclust') - 1
+
+    # Item consensus, one condensed row segment at a time: row i holds pairs (i, j > i)
+    within_sum = np.zeros(n)
+    start = 0
+    for i in range(n - 1):
+        row = coassociation[start:start + n - i - 1]
+        same = labels[i + 1:] == labels[i]
+        within_sum[i] += row[same].sum()
+        within_sum[i + 1:][same] += row[same]
+        start += n - i - 1
+    cluster_sizes = np.bincount(labels, minlength=n_clusters)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stability = np.where(cluster_sizes[labels] > 1, within_sum / (cluster_sizes[labels] - 1), 1.0)
+        cluster_stability = np.bincount(labels, weights=within_sum, minlength=n_clusters) / \
+            (cluster_sizes * (cluster_sizes - 1))
+    return {
+        'labels': labels,
+        'stability': stability,
+        'cluster_stability': cluster_stability,
+        'coassociation': coassociation,
+        'n_resamples': n_resamples,
+    }
+
+class EmbeddingProjector(BaseEstimator, TransformerMixin):
+    """
+    Freezes a t-SNE/UMAP embedding and its clusters so new subjects can be placed without refitting.
 
-def train_classifier(X, y, method='logistic', tune=False, cv=5):
+    t-SNE has no transform, so new points are mapped from the PCA space (the raw feature space
+    for method='tsne') into the frozen embedding, either by distance-weighted interpolation of
+    their nearest training subjects ('knn') or by a small regression network trained on the
+    training embedding ('mlp'). KMeans clusters assign new points to the existing centroids;
+    agglomerative clusters (no centroids) use a vote of the nearest embedded subjects.
+    Existing subjects keep their embedding and cluster IDs.
+
+    Parameters:
+    - method: str, 'tsne_pca' or 'tsne' (as in dimensionality_reduction).
+    - pca_components: int, PCA components for 'tsne_pca'.
+    - backend: str, embedding backend (see embed).
+    - cluster_method: str, 'kmeans' or 'agg'.
+    - n_clusters: int, number of clusters.
+    - mapping: str, 'knn' or 'mlp'.
+    - n_neighbors: int, neighbours used by 'knn' mapping and by 'agg' label votes.
+    """
+
+    def __init__(self, method='tsne_pca', pca_components=10, backend='tsne', cluster_method='kmeans', n_clusters=3,
+                 mapping='knn', n_neighbors=5):
+        self.method = method
+        self.pca_components = pca_components
+        self.backend = backend
+        self.cluster_method = cluster_method
+        self.n_clusters = n_clusters
+        self.mapping = mapping
+        self.n_neighbors = n_neighbors
+
+    def fit(self, X, y=None):
+        """Embeds and clusters the training cohort exactly as run_pipeline does, then learns the mapping."""
+        from sklearn.cluster import KMeans
+        from sklearn.decomposition import PCA
+        from sklearn.neighbors import NearestNeighbors
+        from sklearn.neural_network import MLPRegressor
+        if self.mapping not in ('knn', 'mlp'):
+            raise ValueError("Unknown mapping. Choose from ['knn', 'mlp'].")
+        self.feature_names_in_ = np.asarray(X.columns, dtype=object) if hasattr(X, 'columns') else None
+        X_values = np.ascontiguousarray(X, dtype=np.float64)
+        self.embedding_ = dimensionality_reduction(X, method=self.method, n_components=2,
+                                                   pca_components=self.pca_components, backend=self.backend)
+        self.pca_ = PCA(n_components=self.pca_components, random_state=42).fit(X_values) if self.method == 'tsne_pca' else None
+        X_source = self._source_space(X_values)
+
+        if self.cluster_method == 'kmeans':
+            # Same estimator as clustering(), kept so new subjects go to the existing centroids
+            self.kmeans_ = KMeans(n_clusters=self.n_clusters, random_state=42).fit(self.embedding_)
+            self.labels_ = self.kmeans_.labels_
+        else:
+            self.kmeans_ = None
+            self.labels_ = clustering(self.embedding_, method=self.cluster_method, n_clusters=self.n_clusters)
+
+        n_neighbors = min(self.n_neighbors, len(X_values))
+        self.source_neighbors_ = NearestNeighbors(n_neighbors=n_neighbors).fit(X_source)
+        self.embedding_neighbors_ = NearestNeighbors(n_neighbors=n_neighbors).fit(self.embedding_)
+        if self.mapping == 'mlp':
+            self.regressor_ = MLPRegressor(hidden_layer_sizes=(64, 64), max_iter=2000, random_state=42)
+            self.regressor_.fit(X_source, self.embedding_)
+        return self
+
+    def _source_space(self, X_values):
+        return self.pca_.transform(X_values) if self.pca_ is not None else X_values
+
+    def transform(self, X_new):
+        """
+        Projects new subjects (same feature columns as the training X) into the frozen embedding.
+        """
+        if self.feature_names_in_ is not None and hasattr(X_new, 'columns'):
+            X_new = X_new[self.feature_names_in_]
+        X_source = self._source_space(np.ascontiguousarray(X_new, dtype=np.float64))
+        if self.mapping == 'mlp':
+            return self.regressor_.predict(X_source).astype(self.embedding_.dtype, copy=False)
+        distances, indices = self.source_neighbors_.kneighbors(X_source)
+        # Inverse-distance weights; a subject already in the training set maps onto its own point
+        weights = 1.0 / np.maximum(distances, 1e-12)
+        weights /= weights.sum(axis=1, keepdims=True)
+        return np.einsum('ij,ijk->ik', weights, self.embedding_[indices]).astype(self.embedding_.dtype, copy=False)
+
+    def predict(self, X_new):
+        """Assigns new subjects to the existing clusters without changing existing labels."""
+        X_embedded = self.transform(X_new)
+        if self.kmeans_ is not None:
+            return self.kmeans_.predict(X_embedded)
+        _, indices = self.embedding_neighbors_.kneighbors(X_embedded)
+        votes = self.labels_[indices]
+        return np.array([np.bincount(row, minlength=self.n_clusters).argmax() for row in votes])
+
+    def save(self, path):
+        """Serializes the fitted projector to path with joblib."""
+        joblib.dump(self, path)
+
+    @classmethod
+    def load(cls, path):
+        """Loads a projector saved with save()."""
+        projector = joblib.load(path)
+        if not isinstance(projector, cls):
+            raise TypeError(f"{path} does not contain a {cls.__name__}.")
+        return projector
+
+def train_classifier(X, y, method='logistic', tune=False, cv=5, nested_cv=False, fold_predictions=None,
+                     search_strategy='grid', max_fits=None, max_seconds=None, cache_dir=CACHE_DIR, params=None):
     """
     Trains a classifier on the data, optionally tunes hyperparameters,
     performs cross-validation, and evaluates it. Returns the trained model.
 
+    Every model is trained once per fold plus once on all data, and those fits are cached
+    on disk under CACHE_DIR (see search_hyperparameters), so repeating a configuration in a
+    later sweep or session reuses them. With tune=True the CV scores and out-of-fold
+    predictions are those the search recorded for the best parameters.
+
     Parameters:
     - X: pd.DataFrame, feature matrix.
     - y: pd.Series or np.array, target labels.
     - method: str, classifier method ('logistic', 'rf', 'nb').
     - tune: bool, whether to perform hyperparameter tuning.
     - cv: int, number of cross-validation folds.
+    - nested_cv: bool, with tune=True, score with an outer CV around the grid search
+                 (unbiased by tuning, but costs cv extra grid searches).
+    - fold_predictions: bool or None, return out-of-fold predictions (always free; None and
+                        True both return them, False drops them).
+    - search_strategy: str, 'grid' (exhaustive), 'halving', 'random' or 'bayes'
+                       (see search_hyperparameters).
+    - max_fits, max_seconds: search budget (fold fits / seconds).
+    - cache_dir: str or None, fold cache root (None disables caching).
+    - params: dict or None, hyperparameters set on the model before training (e.g. the
+              best_params of an earlier search); reported as best_params unless tune=True.
 
     Returns:
     - dict, performance metrics and the trained model.
     """
     # Choose model and define parameter grid
+    from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.naive_bayes import GaussianNB
+    from sklearn.svm import SVC
     if method == 'logistic':
-        model = LogisticRegression(multi_class='multinomial', solver='lbfgs', max_iter=1000, random_state=42)
+        model = LogisticRegression(solver='lbfgs', max_iter=1000, random_state=42)
         param_grid = {
             'C': [0.1, 1, 10],
             'solver': ['lbfgs', 'saga']
@@ -396,32 +2385,68 @@ def train_classifier(X, y, method='logistic', tune=False, cv=5):
     else:
         raise ValueError("Unknown classifier method. Choose from ['logistic', 'rf', 'nb'].")
 
-    # Before training the model, split the data into training and testing sets
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)  # Adjust test_size as needed
-
-    # Hyperparameter Tuning
-    if tune and param_grid:
-        print("Tuning hyperparameters...")
-        grid_search = GridSearchCV(model, param_grid, cv=cv, scoring='f1_weighted', n_jobs=-1)
-        grid_search.fit(X, y)
-        model = grid_search.best_estimator_
-        print(f"Best parameters: {grid_search.best_params_}")
-        print(f"Best cross-validated score: {grid_search.best_score_:.3f}")
-    elif tune and not param_grid:
-        print("No hyperparameters to tune for this classifier.")
-
-    # Perform Cross-Validation
+    # Cross-validated metric: weighted F1 for probabilistic models, accuracy otherwise
     if hasattr(model, "predict_proba"):
         scoring = 'f1_weighted'
     else:
         scoring = 'accuracy'
 
-    cv_scores = cross_val_score(model, X, y, cv=cv, scoring=scoring, n_jobs=-1)
+    if tune and not param_grid:
+        print("No hyperparameters to tune for this classifier.")
+    tune = tune and bool(param_grid)
+
+    best_params = None
+    if params:
+        model.set_params(**params)
+        best_params = dict(params)
+    oof_predictions = None
+    if search_strategy not in SEARCH_STRATEGIES:
+        raise ValueError(f"Unknown search strategy. Choose from {SEARCH_STRATEGIES}.")
+    if tune and nested_cv and search_strategy != 'grid':
+        raise ValueError("nested_cv is only supported with search_strategy='grid'.")
+
+    if tune and nested_cv:
+        # Nested CV: the outer folds score the whole tuning procedure
+        print("Tuning hyperparameters (nested cross-validation)...")
+        estimator = GridSearchCV(model, param_grid, cv=cv, scoring='f1_weighted', n_jobs=-1)
+        with span('tuning', estimator=type(model).__name__, strategy='nested_grid', input_shape=_shape_of(X)):
+            cv_results = cross_validate(estimator, X, y, cv=cv, scoring=scoring, n_jobs=-1,
+                                        return_estimator=True, return_indices=True)
+        cv_scores = cv_results['test_score']
+        if fold_predictions is not False:
+            # Reuse the fold models already fitted for scoring
+            oof_predictions = np.empty(len(y), dtype=np.asarray(y).dtype)
+            for fold_model, test_idx in zip(cv_results['estimator'], cv_results['indices']['test']):
+                oof_predictions[test_idx] = fold_model.predict(X.iloc[test_idx] if hasattr(X, 'iloc') else X[test_idx])
+
+        # Train on the entire dataset
+        with span('final_fit', estimator=type(model).__name__, input_shape=_shape_of(X)):
+            model = estimator.fit(X, y)
+        best_params = model.best_params_
+        print(f"Best parameters: {best_params}")
+        model = model.best_estimator_
+    else:
+        # One fold engine for plain CV and every search strategy: it keeps the fold scores and
+        # predictions of the chosen parameters, refits them once, and caches each fit on disk
+        if tune:
+            print(f"Tuning hyperparameters ({search_strategy} search)...")
+        search = search_hyperparameters(model, param_grid if tune else {}, X, y,
+                                        strategy=search_strategy if tune else 'grid', cv=cv,
+                                        scoring=('f1_weighted', 'accuracy'), max_fits=max_fits, max_seconds=max_seconds,
+                                        cache_dir=cache_dir)
+        model = search['best_estimator']
+        cv_scores = search['fold_scores'][scoring]
+        if fold_predictions is not False:
+            oof_predictions = search['fold_predictions']
+        if tune:
+            best_params = search['best_params']
+            print(f"Best parameters: {best_params}")
+            print(f"Best cross-validated score: {search['best_score']:.3f} "
+                  f"({search['n_candidates']} candidates, {search['n_fits']} fold fits)")
+
     print(f"Cross-Validated {scoring} Scores: {cv_scores}")
     print(f"Mean {scoring}: {cv_scores.mean():.3f}, Std: {cv_scores.std():.3f}")
 
-    # Train on the entire dataset
-    model.fit(X, y)
     y_pred = model.predict(X)
 
     accuracy = accuracy_score(y, y_pred)
@@ -441,6 +2466,9 @@ def train_classifier(X, y, method='logistic', tune=False, cv=5):
         'model': method,
         'cv_mean': cv_scores.mean(),
         'cv_std': cv_scores.std(),
+        'cv_scores': cv_scores,
+        'fold_predictions': oof_predictions,
+        'best_params': best_params,
         'trained_model': model,  # Include the trained model
         'accuracy': accuracy,
         'precision': precision,
@@ -450,68 +2478,151 @@ def train_classifier(X, y, method='logistic', tune=False, cv=5):
         'rmse': rmse
     }
 
-    # Hyperparameter Tuning
-    if tune and param_grid:
-        print("Tuning hyperparameters...")
-        grid_search = GridSearchCV(model, param_grid, cv=cv, scoring='f1_weighted', n_jobs=-1)
-        grid_search.fit(X, y)
-        model = grid_search.best_estimator_
-        print(f"Best parameters: {grid_search.best_params_}")
-        print(f"Best cross-validated score: {grid_search.best_score_:.3f}")
-    elif tune and not param_grid:
-        print("No hyperparameters to tune for this classifier.")
-
-    # Perform Cross-Validation
-    if hasattr(model, "predict_proba"):
-        scoring = 'f1_weighted'
-    else:
-        scoring = 'accuracy'
-
-    cv_scores = cross_val_score(model, X, y, cv=cv, scoring=scoring, n_jobs=-1)
-    print(f"Cross-Validated {scoring} Scores: {cv_scores}")
-    print(f"Mean {scoring}: {cv_scores.mean():.3f}, Std: {cv_scores.std():.3f}")
-
-    # Train on the entire dataset
-    model.fit(X, y)
-    y_pred = model.predict(X)
+FUSION_MODES = ['hard', 'soft', 'stacking']
 
-    accuracy = accuracy_score(y, y_pred)
-    precision, recall, f1, _ = precision_recall_fscore_support(y, y_pred, average='weighted')
+def _fit_fusion_member(model, X, y, train_idx, test_idx, method, cache_key=None, cache_dir=None):
+    """
+    Fits one fusion member on one CV fold and returns (classes, test-fold output of method),
+    or on all data when train_idx is None and returns the fitted estimator.
+    """
+    if train_idx is None:
+        return _fit_full(model, {}, X, y, cache_key=cache_key, cache_dir=cache_dir)
+    X_train, X_test = (X.iloc[train_idx], X.iloc[test_idx]) if hasattr(X, 'iloc') else (X[train_idx], X[test_idx])
+    estimator = _fit_full(model, {}, X_train, np.asarray(y)[train_idx], cache_key=cache_key, cache_dir=cache_dir)
+    return estimator.classes_, getattr(estimator, method)(X_test)
 
-    # Calculate R-squared (with caution for classification)
-    r2 = r2_score(y, y_pred)
-    print(f"R-squared: {r2:.3f}")
+class FusionEnsemble(BaseEstimator, ClassifierMixin):
+    """
+    Voting or stacking ensemble whose members are each fitted once per CV fold and once on all data.
 
-    print(f"Classifier Performance on Entire Dataset - Accuracy: {accuracy:.3f}, Precision: {precision:.3f}, Recall: {recall:.3f}, F1 Score: {f1:.3f}")
+    All member fits run in one parallel batch, so fitting costs about as much as the slowest
+    member. The fold fits give out-of-fold member outputs, from which the ensemble's own
+    out-of-fold predictions (oof_predictions_) and, for stacking, the meta-learner's training
+    set are built. Fits go through the fold cache (see search_hyperparameters): a member that
+    was already trained on the same data in this run, e.g. by train_classifier, is loaded
+    instead of refitted.
 
-    return {
-        'model': method,
-        'cv_mean': cv_scores.mean(),
-        'cv_std': cv_scores.std(),
-        'trained_model': model,  # Include the trained model
-        'accuracy': accuracy,
-        'precision': precision,
-        'recall': recall,
-        'f1': f1,
-        'r2': r2,
-        'rmse': rmse
-    }
+    Parameters:
+    - estimators: list of (name, estimator) tuples, as for VotingClassifier.
+    - voting: str, 'hard' (majority vote), 'soft' (mean predicted probability) or 'stacking'
+              (final_estimator trained on out-of-fold member probabilities).
+    - final_estimator: sklearn classifier or None, stacking meta-learner (default: LogisticRegression).
+    - cv: int, cross-validation folds.
+    - n_jobs: int, parallel member fits.
+    - cache_dir: str or None, fold cache root (None disables caching).
+    """
 
-def model_fusion(X, y, fusion_models):
+    def __init__(self, estimators, voting='hard', final_estimator=None, cv=5, n_jobs=-1, cache_dir=CACHE_DIR):
+        self.estimators = estimators
+        self.voting = voting
+        self.final_estimator = final_estimator
+        self.cv = cv
+        self.n_jobs = n_jobs
+        self.cache_dir = cache_dir
+
+    def _align(self, classes, proba):
+        """Spreads probability columns for classes onto self.classes_ (a fold may miss a rare class)."""
+        aligned = np.zeros((len(proba), len(self.classes_)))
+        aligned[:, np.searchsorted(self.classes_, classes)] = proba
+        return aligned
+
+    def _vote(self, member_predictions):
+        """Majority vote over (n_members, n_samples) labels; ties go to the first class, as in VotingClassifier."""
+        votes = np.zeros((member_predictions.shape[1], len(self.classes_)))
+        rows = np.arange(member_predictions.shape[1])
+        for predictions in member_predictions:
+            votes[rows, np.searchsorted(self.classes_, predictions)] += 1
+        return self.classes_[votes.argmax(axis=1)]
+
+    def _combine(self, member_outputs):
+        """Ensemble labels from stacked member outputs (labels for hard voting, aligned probabilities otherwise)."""
+        if self.voting == 'hard':
+            return self._vote(member_outputs)
+        return self.classes_[self._proba(member_outputs).argmax(axis=1)]
+
+    def _proba(self, member_proba):
+        if self.voting == 'soft':
+            return member_proba.mean(axis=0)
+        return self.final_estimator_.predict_proba(np.hstack(list(member_proba)))
+
+    def fit(self, X, y):
+        from sklearn.linear_model import LogisticRegression
+        if self.voting not in FUSION_MODES:
+            raise ValueError(f"Unknown voting mode. Choose from {FUSION_MODES}.")
+        y = np.asarray(y)
+        self.classes_ = np.unique(y)
+        splits = list(check_cv(self.cv, y, classifier=True).split(X, y))
+        method = 'predict' if self.voting == 'hard' else 'predict_proba'
+
+        data_hash = _data_hash(X, y)
+        fold_hashes = [joblib.hash((train_idx, test_idx)) for train_idx, test_idx in splits]
+        folds = [*range(len(splits)), None]  # None: fit on all data
+        outputs = Parallel(n_jobs=self.n_jobs)(
+            delayed(_fit_fusion_member)(model, X, y, *(splits[fold] if fold is not None else (None, None)), method,
+                                        cache_key=_fold_cache_key(model, {}, data_hash,
+                                                                  fold_hashes[fold] if fold is not None else 'full'),
+                                        cache_dir=self.cache_dir)
+            for _, model in self.estimators for fold in folds)
+
+        # Out-of-fold member outputs: labels (n_members, n) for hard voting, probabilities (n_members, n, n_classes) otherwise
+        member_oof = np.empty((len(self.estimators), len(y)), dtype=y.dtype) if self.voting == 'hard' \
+            else np.zeros((len(self.estimators), len(y), len(self.classes_)))
+        self.estimators_ = []
+        for m in range(len(self.estimators)):
+            member_outputs = outputs[m * len(folds):(m + 1) * len(folds)]
+            for (_, test_idx), (classes, output) in zip(splits, member_outputs[:-1]):
+                member_oof[m, test_idx] = output if self.voting == 'hard' else self._align(classes, output)
+            self.estimators_.append(member_outputs[-1])
+        self.named_estimators_ = dict(zip([name for name, _ in self.estimators], self.estimators_))
+
+        if self.voting == 'stacking':
+            meta_features = np.hstack(list(member_oof))
+            final_estimator = self.final_estimator if self.final_estimator is not None \
+                else LogisticRegression(max_iter=1000, random_state=42)
+            self.final_estimator_ = clone(final_estimator).fit(meta_features, y)
+            # Meta-learner scored on the same folds, so no subject is predicted by a model that saw it
+            self.oof_predictions_ = cross_val_predict(clone(final_estimator), meta_features, y, cv=splits)
+        else:
+            self.oof_predictions_ = self._combine(member_oof)
+        return self
+
+    def _member_outputs(self, X):
+        if self.voting == 'hard':
+            return np.array([estimator.predict(X) for estimator in self.estimators_])
+        return np.array([self._align(estimator.classes_, estimator.predict_proba(X)) for estimator in self.estimators_])
+
+    def predict(self, X):
+        return self._combine(self._member_outputs(X))
+
+    @available_if(lambda self: self.voting != 'hard')
+    def predict_proba(self, X):
+        return self._proba(self._member_outputs(X))
+
+@profiled_stage('fusion', params=('voting', 'cv'))
+def model_fusion(X, y, fusion_models, voting='hard', cv=5, final_estimator=None, n_jobs=-1, cache_dir=CACHE_DIR):
     """
-    Creates a Voting Classifier ensemble, trains it, and evaluates its performance.
+    Creates a fusion ensemble (FusionEnsemble), trains it, and evaluates its performance.
+
+    Members are fitted in parallel, once per fold and once on all data, reusing fits already
+    in the fold cache. The metrics are cross-validated, computed on the ensemble's
+    out-of-fold predictions, not on the training data.
 
     Parameters:
     - X: pd.DataFrame, feature matrix.
     - y: pd.Series or np.array, target labels.
     - fusion_models: list of tuples, models to include in the ensemble.
+    - voting: str, 'hard', 'soft' or 'stacking'.
+    - cv: int, cross-validation folds.
+    - final_estimator: sklearn classifier or None, stacking meta-learner.
+    - n_jobs: int, parallel member fits.
+    - cache_dir: str or None, fold cache root (None disables caching).
 
     Returns:
     - dict, performance metrics and the trained ensemble model.
     """
-    ensemble = VotingClassifier(estimators=fusion_models, voting='hard')
-    ensemble.fit(X, y)
-    y_pred = ensemble.predict(X)
+    ensemble = FusionEnsemble(fusion_models, voting=voting, final_estimator=final_estimator, cv=cv,
+                              n_jobs=n_jobs, cache_dir=cache_dir).fit(X, y)
+    y_pred = ensemble.oof_predictions_
 
     accuracy = accuracy_score(y, y_pred)
     precision, recall, f1, _ = precision_recall_fscore_support(y, y_pred, average='weighted')
@@ -520,7 +2631,7 @@ def model_fusion(X, y, fusion_models):
     r2 = r2_score(y, y_pred)
     print(f"Fusion Classifier R-squared: {r2:.3f}")  # Print R-squared
 
-    print(f"Fusion Classifier Performance - Accuracy: {accuracy:.3f}, Precision: {precision:.3f}, Recall: {recall:.3f}, F1 Score: {f1:.3f}")
+    print(f"Fusion Classifier ({voting}) Cross-Validated Performance - Accuracy: {accuracy:.3f}, Precision: {precision:.3f}, Recall: {recall:.3f}, F1 Score: {f1:.3f}")
 
     return {
         'accuracy': accuracy,
@@ -528,27 +2639,35 @@ def model_fusion(X, y, fusion_models):
         'recall': recall,
         'f1': f1,
         'trained_model': ensemble,  # Include the trained ensemble model
+        'fold_predictions': y_pred,
         'r2': r2
     }
 
 def run_pipeline(X, file_path, dim_method='tsne_pca', cluster_method='kmeans', classifier_method='logistic',
-                fusion_models=None, pca_components=10, feature_selection_k=None, tune=False, cv=5):
+                fusion_models=None, pca_components=10, feature_selection_k=None, tune=False, cv=5, embedding_backend='tsne',
+                search_strategy='grid', max_fits=None, max_seconds=None, fusion_voting='hard', cluster_space='embedded'):
     """
     Executes the entire pipeline with specified methods, including optional feature selection and hyperparameter tuning.
 
     Parameters:
     - file_path: str, path to the Excel data file.
     - dim_method: str, dimensionality reduction method ('tsne', 'tsne_pca').
-    - cluster_method: str, clustering algorithm ('kmeans', 'agg').
+    - cluster_method: str, clustering algorithm (a CLUSTERING_BACKENDS name, e.g. 'kmeans', 'agg').
     - classifier_method: str, classifier ('logistic', 'rf', 'nb').
     - fusion_models: list of tuples, models to include in fusion.
     - pca_components: int, number of PCA components.
     - feature_selection_k: int or None, number of top features to select.
     - tune: bool, whether to perform hyperparameter tuning.
     - cv: int, number of cross-validation folds.
+    - embedding_backend: str, embedding engine for dimensionality_reduction (see embed).
+    - search_strategy: str, hyperparameter search used when tune=True ('grid', 'halving', 'random', 'bayes').
+    - max_fits, max_seconds: search budget for the non-grid strategies.
+    - fusion_voting: str, fusion mode ('hard', 'soft', 'stacking'), see model_fusion.
+    - cluster_space: str, cluster the 2-D embedding ('embedded') or the full feature matrix ('features').
 
     Returns:
-    - results: dict, performance metrics and configuration details including the trained model(s).
+    - results: dict, performance metrics and configuration details including the trained model(s),
+               plus '<stage>_wall_s' for every PROFILED_STAGES stage.
     """
     print("\n=== Running Pipeline ===")
     print(f"Dimensionality Reduction Method: {dim_method}")
@@ -562,37 +2681,78 @@ def run_pipeline(X, file_path, dim_method='tsne_pca', cluster_method='kmeans', c
         print("Hyperparameter Tuning: Enabled")
     print("========================\n")
 
-    # Dimensionality Reduction
-    X_embedded = dimensionality_reduction(X, method=dim_method, n_components=2, pca_components=pca_components)
+    # Every stage emits a profiling span; their wall times become '<stage>_wall_s' result columns
+    with profiling(InMemorySink()) as collector:
+        # Dimensionality Reduction
+        X_embedded = dimensionality_reduction(X, method=dim_method, n_components=2, pca_components=pca_components,
+                                              backend=embedding_backend)
 
-    # Clustering
-    cluster_labels = clustering(X_embedded, method=cluster_method)
-    unique_clusters = set(cluster_labels)
+        # Clustering
+        cluster_labels, sil_score = cluster_stage(X_embedded, cluster_method, X_features=X, cluster_space=cluster_space)
 
-    results = {}
-    if len(unique_clusters) > 1:
+        # Feature Selection (Optional)
+        X_selected, selected_features = select_stage(X, cluster_labels, feature_selection_k)
+
+        # Treat cluster labels as pseudo labels for classification demonstration
+        class_results = train_classifier(X_selected, cluster_labels, method=classifier_method, tune=tune, cv=cv,
+                                         search_strategy=search_strategy, max_fits=max_fits, max_seconds=max_seconds)
+
+        # Fusion if provided
+        fusion_result = None
+        if fusion_models is not None:
+            fusion_result = model_fusion(X_selected, cluster_labels, fusion_models, voting=fusion_voting, cv=cv)
+
+    results = assemble_results(sil_score, class_results, fusion_result, selected_features, dim_method=dim_method,
+                               cluster_method=cluster_method, classifier_method=classifier_method,
+                               feature_selection_k=feature_selection_k, tune=tune, cv=cv)
+    results.update(stage_timings(collector.spans))
+    return results
+
+def cluster_stage(X_embedded, cluster_method, X_features=None, cluster_space='embedded'):
+    """
+    Clusters the embedding (or, with cluster_space='features', the full feature matrix X_features) and scores it.
+    Above SILHOUETTE_EXACT_MAX_ROWS rows the silhouette is estimated on a sample; noise points are left out.
+
+    Returns:
+    - cluster_labels: np.array, cluster assignment per subject.
+    - sil_score: float or None, silhouette score (None when only one cluster is found).
+    """
+    if cluster_space not in ('embedded', 'features'):
+        raise ValueError("Unknown cluster space. Choose from ['embedded', 'features'].")
+    X_cluster = np.asarray(X_features if cluster_space == 'features' else X_embedded)
+    cluster_labels, info = clustering(X_cluster, method=cluster_method, return_info=True)
+    print(f"Clustering ({cluster_space} space): {info['n_clusters_found']} clusters, {info['n_noise']} noise points, "
+          f"{info['wall_s']:.2f}s.")
+    return cluster_labels, _cluster_silhouette(X_cluster, cluster_labels)
+
+def _cluster_silhouette(X_cluster, cluster_labels):
+    """Silhouette score of cluster_stage (None when only one cluster is found)."""
+    clustered = cluster_labels != -1
+    if len(set(cluster_labels[clustered])) > 1:
         # Compute silhouette score if >1 cluster
-        sil_score = silhouette_score(X_embedded, cluster_labels)
+        sample_size = SILHOUETTE_SAMPLE_SIZE if clustered.sum() > SILHOUETTE_EXACT_MAX_ROWS else None
+        with span('silhouette', input_shape=_shape_of(X_cluster), sample_size=sample_size):
+            sil_score = silhouette_score(X_cluster[clustered], cluster_labels[clustered], sample_size=sample_size,
+                                         random_state=42)
         print(f"Silhouette Score: {sil_score:.3f}")
-        results['silhouette_score'] = sil_score
     else:
         print("Only one cluster found, Silhouette Score not applicable.")
-        results['silhouette_score'] = None
+        sil_score = None
+    return sil_score
 
-    # Feature Selection (Optional)
+def select_stage(X, cluster_labels, feature_selection_k, ranking=None):
+    """Runs feature_selection when feature_selection_k is set, otherwise passes X through."""
     if feature_selection_k:
-        X_selected, selected_features = feature_selection(X, cluster_labels, k=feature_selection_k)
-    else:
-        X_selected = X
-        selected_features = X.columns.tolist()
+        return feature_selection(X, cluster_labels, k=feature_selection_k, ranking=ranking)
+    return X, X.columns.tolist()
 
-    # Treat cluster labels as pseudo labels for classification demonstration
-    class_results = train_classifier(X_selected, cluster_labels, method=classifier_method, tune=tune, cv=cv)
+def assemble_results(sil_score, class_results, fusion_result, selected_features, dim_method, cluster_method,
+                     classifier_method, feature_selection_k, tune, cv):
+    """Builds the per-run results dict shared by run_pipeline and run_sweep."""
+    results = {'silhouette_score': sil_score}
     results.update(class_results)
 
-    # Fusion if provided
-    if fusion_models is not None:
-        fusion_result = model_fusion(X_selected, cluster_labels, fusion_models)
+    if fusion_result is not None:
         results.update({
             'fusion_accuracy': fusion_result['accuracy'],
             'fusion_precision': fusion_result['precision'],
@@ -611,180 +2771,984 @@ def run_pipeline(X, file_path, dim_method='tsne_pca', cluster_method='kmeans', c
     results['rmse'] = class_results['rmse']
     return results
 
-# Cell9: Running Multiple Pipeline Configurations with Feature Selection and Trained Models
-
-all_results = []
-
-# 1. t-SNE Only + Agglomerative Clustering + Random Forest + Feature Selection
-res_1_fs = run_pipeline(
-    X,
-    file_path,
-    dim_method='tsne',
-    cluster_method='agg',
-    classifier_method='rf',
-    feature_selection_k=10,    # Select top 10 features
-    tune=True,                 # Enable hyperparameter tuning
-    cv=5                        # 10-fold cross-validation
-)
-all_results.append(res_1_fs)
-
-# 2. PCA + t-SNE + KMeans + Logistic Regression + Feature Selection
-res_2_fs = run_pipeline(
-    X,
-    file_path,
-    dim_method='tsne_pca',
-    cluster_method='kmeans',
-    classifier_method='logistic',
-    pca_components=10,         # Adjust based on dataset size
-    feature_selection_k=10,    # Select top 10 features
-    tune=True,                  # Enable hyperparameter tuning
-    cv=5                        # 10-fold cross-validation
-)
-all_results.append(res_2_fs)
-
-# 3. PCA + t-SNE + KMeans + Naive Bayes + Feature Selection
-res_3_fs = run_pipeline(
-    X,
-    file_path,
-    dim_method='tsne_pca',
-    cluster_method='kmeans',
-    classifier_method='nb',
-    pca_components=10,
-    feature_selection_k=10,    # Select top 10 features
-    tune=False,                 # Hyperparameter tuning not applicable for Naive Bayes
-    cv=5                        # 10-fold cross-validation
-)
-all_results.append(res_3_fs)
-
-# 4. PCA + t-SNE + Agglomerative Clustering + Logistic Regression + Feature Selection
-res_4_fs = run_pipeline(
-    X,
-    file_path,
-    dim_method='tsne_pca',
-    cluster_method='agg',
-    classifier_method='logistic',
-    pca_components=10,
-    feature_selection_k=10,    # Select top 10 features
-    tune=True,                  # Enable hyperparameter tuning
-    cv=5                        # 10-fold cross-validation
-)
-all_results.append(res_4_fs)
-
-# 5. Fusion: PCA + t-SNE + KMeans + Voting Classifier (RF, NB, Logistic) + Feature Selection
-fusion_models = [
-    ('rf', RandomForestClassifier(n_estimators=100, random_state=42)),
-    ('nb', GaussianNB()),
-    ('lr', LogisticRegression(multi_class='multinomial', solver='lbfgs', max_iter=1000, random_state=42))
-]
-res_5_fs = run_pipeline(
-    X,
-    file_path,
-    dim_method='tsne_pca',
-    cluster_method='kmeans',
-    classifier_method='rf',  # Base classifier for pseudo-labels
-    fusion_models=fusion_models,
-    pca_components=10,
-    feature_selection_k=10,    # Select top 10 features
-    tune=True,                  # Enable hyperparameter tuning for base classifier
-    cv=5                        # 10-fold cross-validation
-)
-all_results.append(res_5_fs)
-
-# 6. t-SNE Only + KMeans + Random Forest + Feature Selection
-res_6_fs = run_pipeline(
-    X,
-    file_path,
-    dim_method='tsne',
-    cluster_method='kmeans',
-    classifier_method='rf',
-    feature_selection_k=10,    # Select top 10 features
-    tune=True,                  # Enable hyperparameter tuning
-    cv=5                        # 10-fold cross-validation
-)
-all_results.append(res_6_fs)
-
-# 7. t-SNE Only + Agglomerative Clustering + Logistic Regression + Feature Selection
-res_7_fs = run_pipeline(
-    X,
-    file_path,
-    dim_method='tsne',
-    cluster_method='agg',
-    classifier_method='logistic',
-    feature_selection_k=10,    # Select top 10 features
-    tune=True,                  # Enable hyperparameter tuning
-    cv=5                        # 10-fold cross-validation
-)
-all_results.append(res_7_fs)
-
-# 8. t-SNE Only + KMeans + Naive Bayes + Feature Selection
-res_8_fs = run_pipeline(
-    X,
-    file_path,
-    dim_method='tsne',
-    cluster_method='kmeans',
-    classifier_method='nb',
-    feature_selection_k=10,    # Select top 10 features
-    tune=False,                 # Hyperparameter tuning not applicable for Naive Bayes
-    cv=5                        # 10-fold cross-validation
-)
-all_results.append(res_8_fs)
-
-# 9. t-SNE + PCA + KMeans + SVM + Feature Selection
-res_svm = run_pipeline(
-    X,
-    file_path,
-    dim_method='tsne_pca',  # Choose your preferred dimensionality reduction method
-    cluster_method='kmeans', # Choose your preferred clustering method
-    classifier_method='svm',
-    pca_components=10,
-    feature_selection_k=10,
-    tune=True,
-    cv=5
-)
-all_results.append(res_svm)
-
-# 10. t-SNE + PCA + KMeans + GBDT + Feature Selection
-res_gbdt = run_pipeline(
-    X,
-    file_path,
-    dim_method='tsne_pca',
-    cluster_method='kmeans',
-    classifier_method='gbdt',
-    pca_components=10,
-    feature_selection_k=10,
-    tune=True,
-    cv=5
-   )
-all_results.append(res_gbdt)
-
-# Convert to DataFrame for comparison
-results_df = pd.DataFrame(all_results)
-print("=== Pipeline Results ===")
-display(results_df)
-
-"""Below is visualization for the above processes"""
-
-# If you only need the labels and counts for a specific configuration (e.g., the best one):
-best_config_index = results_df['cv_mean'].idxmax()  # Assuming 'cv_mean' is the metric for comparison
-best_trained_model = results_df.loc[best_config_index, 'trained_model']
-
-# Get X_selected from the best run
-# Assuming all_results is a list containing the results of each run
-best_run = all_results[best_config_index]
-
-# Instead of reloading and preprocessing the data, use the selected features from the best run:
-X_selected = load_and_preprocess_data(file_path)  # Load and preprocess entire data
-# Ensure X_selected uses only the features the best model was trained on
-if isinstance(best_run['selected_features'], list):  # Check if feature selection was applied
-    X_selected = X_selected[best_run['selected_features']]  # Use the selected features for prediction
-
-# Before prediction, make sure X_selected has the same columns as during training
-training_features = best_trained_model.feature_names_in_  # Get feature names from the trained model
-X_selected = X_selected.reindex(columns=training_features, fill_value=0)  # Reindex and fill missing values if any
-
-best_cluster_labels = best_trained_model.predict(X_selected)
-best_class_counts = pd.Series(best_cluster_labels).value_counts()
-print("Class Counts for Best Configuration:\n", best_class_counts)
+# Default run_pipeline arguments, used to fill in partial sweep configurations
+SWEEP_DEFAULTS = {
+    'dim_method': 'tsne_pca',
+    'cluster_method': 'kmeans',
+    'classifier_method': 'logistic',
+    'fusion_models': None,
+    'pca_components': 10,
+    'feature_selection_k': None,
+    'tune': False,
+    'cv': 5,
+    'embedding_backend': 'tsne',
+    'search_strategy': 'grid',
+    'max_fits': None,
+    'max_seconds': None,
+    'fusion_voting': 'hard',
+    'cluster_space': 'embedded',
+    'variant': None,
+}
+
+def sweep_grid(**param_lists):
+    """
+    Expands lists of run_pipeline arguments into every combination, e.g.
+    sweep_grid(dim_method=['tsne', 'tsne_pca'], classifier_method=['rf', 'nb']) gives 4 configs.
+    """
+    names = list(param_lists)
+    return [dict(zip(names, values)) for values in itertools.product(*param_lists.values())]
+
+def _stage_keys(config):
+    """
+    Returns the cache key of every stage a config depends on. Each key extends its parent's,
+    so configs sharing a prefix of the DAG (reduce -> cluster -> select -> classify/fuse) share work.
+    """
+    pca = config['pca_components'] if config['dim_method'] == 'tsne_pca' else None
+    reduce_key = (config['dim_method'], pca, config['embedding_backend'])
+    if config['variant'] is not None:
+        reduce_key = (config['variant'],) + reduce_key
+    cluster_key = reduce_key + (config['cluster_method'], config['cluster_space'])
+    select_key = cluster_key + (config['feature_selection_k'],)
+    classify_key = select_key + (config['classifier_method'], config['tune'], config['cv'], config['search_strategy'],
+                                 config['max_fits'], config['max_seconds'])
+    fuse_key = None
+    if config['fusion_models'] is not None:
+        fuse_key = select_key + (config['fusion_voting'], config['cv']) + tuple(
+            (name, repr(model)) for name, model in config['fusion_models'])
+    return reduce_key, cluster_key, select_key, classify_key, fuse_key
+
+def _profiled_call(func, *args):
+    """Runs func(*args) and returns (result, its profiling spans), keeping the spans away from other sinks."""
+    with profiling(InMemorySink(), isolated=True) as collector:
+        result = func(*args)
+    return result, collector.spans
+
+def _profiled_task(key, func, *args):
+    """_profiled_call that also returns the task key, for results arriving out of order."""
+    result, spans = _profiled_call(func, *args)
+    return key, result, spans
+
+def _pooled_task(key, func, *args):
+    """_profiled_task in a sweep pool worker, with the stage's own parallelism limited to one process."""
+    global _STAGE_N_JOBS
+    previous, _STAGE_N_JOBS = _STAGE_N_JOBS, 1
+    try:
+        return _profiled_task(key, func, *args)
+    finally:
+        _STAGE_N_JOBS = previous
+
+def _iter_stage(tasks, n_jobs):
+    """
+    Runs func(*args) for every {key: (func, args)} in tasks across a process pool and yields
+    (key, result, spans) as each task finishes. The spans (also from worker processes) are
+    passed on to the registered profiling sinks.
+    """
+    if len(tasks) == 1:
+        # In-process, so the stage's own parallelism (CV folds, fusion members) gets every core
+        outputs = (_profiled_task(key, func, *args) for key, (func, args) in tasks.items())
+    else:
+        outputs = Parallel(n_jobs=n_jobs, return_as='generator_unordered')(
+            delayed(_pooled_task)(key, func, *args) for key, (func, args) in tasks.items())
+    for key, result, task_spans in outputs:
+        for record in task_spans:
+            for sink in _PROFILING_SINKS:
+                sink.emit(record)
+        yield key, result, task_spans
+
+def _run_stage(func, tasks, n_jobs, spans=None):
+    """
+    Runs func(*args) for every {key: args} in tasks across a process pool, returning {key: result}.
+    The spans of each task are stored in spans[key].
+    """
+    results = {}
+    for key, result, task_spans in _iter_stage({key: (func, args) for key, args in tasks.items()}, n_jobs):
+        results[key] = result
+        if spans is not None:
+            spans[key] = task_spans
+    return results
+
+def _classify_stage(X_selected, cluster_labels, method, tune, cv, search_strategy, max_fits, max_seconds, params=None):
+    """train_classifier with positional sweep settings."""
+    return train_classifier(X_selected, cluster_labels, method=method, tune=tune, cv=cv,
+                            search_strategy=search_strategy, max_fits=max_fits, max_seconds=max_seconds, params=params)
+
+def run_sweep(X, configs, n_jobs=-1, on_result=None):
+    """
+    Runs many pipeline configurations, computing each distinct stage only once.
+
+    Configurations are dicts of run_pipeline arguments (missing keys use SWEEP_DEFAULTS).
+    They are compiled into a DAG of stages (reduce -> cluster -> select -> classify -> fuse);
+    every unique stage runs once, and independent stages at the same depth run in parallel.
+    Classifiers and fusions share one pool, and each config is finished as soon as its own
+    tasks are, so on_result can checkpoint it before the rest of the sweep is done.
+
+    Parameters:
+    - X: pd.DataFrame, feature matrix, or dict of variant name -> feature matrix (see data_variants),
+         in which case each config names its matrix with 'variant' and all variants share the pool.
+    - configs: list of dicts, pipeline configurations (see sweep_grid for building a grid).
+    - n_jobs: int, number of worker processes (-1 uses all cores).
+    - on_result: callable or None, called as on_result(index, result) when configs[index] is done.
+
+    Returns:
+    - all_results: list of dicts, one per config and in the same order, identical in shape to run_pipeline's
+                   (plus 'variant' for variant configs).
+    """
+    configs = [{**SWEEP_DEFAULTS, **config} for config in configs]
+    if isinstance(X, dict):
+        unknown = {config['variant'] for config in configs} - set(X)
+        if unknown:
+            raise ValueError(f"Configs use variants {sorted(unknown, key=str)} missing from X: {list(X)}.")
+    keys = [_stage_keys(config) for config in configs]
+    print(f"\n=== Running Sweep: {len(configs)} configs, "
+          f"{len({k[0] for k in keys})} reductions, {len({k[1] for k in keys})} clusterings, "
+          f"{len({k[3] for k in keys})} classifiers ===\n")
+
+    reduce_tasks, cluster_tasks, select_tasks, classify_tasks, fuse_tasks = {}, {}, {}, {}, {}
+    features = {}  # reduce key -> the feature matrix it (and every later stage) works on
+    for config, (reduce_key, cluster_key, select_key, classify_key, fuse_key) in zip(configs, keys):
+        features[reduce_key] = X[config['variant']] if isinstance(X, dict) else X
+        reduce_tasks[reduce_key] = (features[reduce_key], config['dim_method'], 2, config['pca_components'],
+                                    config['embedding_backend'])
+        cluster_tasks[cluster_key] = (reduce_key, config['cluster_method'], config['cluster_space'])
+        select_tasks[select_key] = (cluster_key, config['feature_selection_k'])
+        classify_tasks[classify_key] = (select_key, config['classifier_method'], config['tune'], config['cv'],
+                                        config['search_strategy'], config['max_fits'], config['max_seconds'])
+        if fuse_key is not None:
+            fuse_tasks[fuse_key] = (select_key, config['fusion_models'], config['fusion_voting'], config['cv'])
+
+    spans = {stage: {} for stage in ('reduce', 'cluster', 'select', 'classify', 'fuse')}
+    embeddings = _run_stage(dimensionality_reduction, reduce_tasks, n_jobs, spans['reduce'])
+    clusters = _run_stage(cluster_stage, {key: (embeddings[parent], method, features[parent], space)
+                                          for key, (parent, method, space) in cluster_tasks.items()},
+                          n_jobs, spans['cluster'])
+    # Feature selection is a cheap univariate test, so it runs in-process: every clustering that
+    # needs it is scored in one batched pass per feature matrix, and each k is then a slice of its ranking
+    scored = collections.defaultdict(list)  # id of the feature matrix -> clusterings scored on it
+    for parent, k in select_tasks.values():
+        matrix_id = id(features[cluster_tasks[parent][0]])
+        if k and parent not in scored[matrix_id]:
+            scored[matrix_id].append(parent)
+    rankings = {}
+    for parents in scored.values():
+        scores = score_features(features[cluster_tasks[parents[0]][0]], [clusters[parent][0] for parent in parents])
+        rankings.update(zip(parents, rank_features(scores)))
+    selections = _run_stage(select_stage, {key: (features[cluster_tasks[parent][0]], clusters[parent][0], k,
+                                                 None if k == 'stability' else rankings.get(parent))
+                                           for key, (parent, k) in select_tasks.items()}, 1, spans['select'])
+
+    # Final stage, queued in config order: ('classify' | 'fuse', key) -> (func, args)
+    final_tasks = {}
+    waiting = collections.defaultdict(list)  # final task -> indices of the configs that need it
+    for index, (_, _, _, classify_key, fuse_key) in enumerate(keys):
+        parent, *settings = classify_tasks[classify_key]
+        final_tasks[('classify', classify_key)] = (
+            _classify_stage, (selections[parent][0], clusters[select_tasks[parent][0]][0], *settings))
+        waiting[('classify', classify_key)].append(index)
+        if fuse_key is not None:
+            parent, *settings = fuse_tasks[fuse_key]
+            final_tasks[('fuse', fuse_key)] = (
+                model_fusion, (selections[parent][0], clusters[select_tasks[parent][0]][0], *settings))
+            waiting[('fuse', fuse_key)].append(index)
+
+    finished = {'classify': {}, 'fuse': {}}
+    all_results = [None] * len(configs)
+    for (stage, key), result, task_spans in _iter_stage(final_tasks, n_jobs):
+        finished[stage][key] = result
+        spans[stage][key] = task_spans
+        for index in waiting[(stage, key)]:
+            config = configs[index]
+            reduce_key, cluster_key, select_key, classify_key, fuse_key = keys[index]
+            if classify_key not in finished['classify'] or (fuse_key is not None and fuse_key not in finished['fuse']):
+                continue
+            all_results[index] = assemble_results(
+                clusters[cluster_key][1], finished['classify'][classify_key], finished['fuse'].get(fuse_key),
+                selections[select_key][1], dim_method=config['dim_method'], cluster_method=config['cluster_method'],
+                classifier_method=config['classifier_method'], feature_selection_k=config['feature_selection_k'],
+                tune=config['tune'], cv=config['cv'])
+            if config['variant'] is not None:
+                all_results[index]['variant'] = config['variant']
+            # Shared stages report their full time in every config that uses them
+            all_results[index].update(stage_timings(
+                spans['reduce'][reduce_key] + spans['cluster'][cluster_key] + spans['select'][select_key]
+                + spans['classify'][classify_key] + spans['fuse'].get(fuse_key, [])))
+            if on_result is not None:
+                on_result(index, all_results[index])
+    return all_results
+
+def compare_variants(df, configs, variants=None, missing='drop', n_jobs=-1, compact=False):
+    """
+    Runs the same sweep on several analysis variants in one pass and tabulates them together.
+
+    The variants are built from one load/scaling pass (data_variants), every config is paired
+    with every variant, and all pairs run as a single run_sweep, so stages of different
+    variants share the worker pool.
+
+    Parameters:
+    - df: pd.DataFrame, raw data (read_workbook).
+    - configs: list of dicts, pipeline configurations (without 'variant').
+    - variants: dict of name -> spec, list of DATA_VARIANTS names, or None for all of DATA_VARIANTS.
+    - missing: str, one of IMPUTATION_STRATEGIES.
+    - n_jobs: int, number of worker processes (-1 uses all cores).
+    - compact: bool, run on compact float32 matrices (see compact_matrix).
+
+    Returns:
+    - results_df: pd.DataFrame, one row per (variant, config), with 'variant' as the first column.
+    """
+    X_variants = data_variants(df, variants=variants, missing=missing, compact=compact)
+    variant_configs = [{**config, 'variant': name} for name in X_variants for config in configs]
+    results_df = pd.DataFrame(run_sweep(X_variants, variant_configs, n_jobs=n_jobs))
+    return results_df[['variant'] + [col for col in results_df.columns if col != 'variant']]
+
+def _cluster_key_name(cluster_key):
+    """Readable name of a clustering stage key, e.g. 'tsne_pca/10/tsne/kmeans/embedded'."""
+    return '/'.join(str(part) for part in cluster_key if part is not None)
+
+class IncrementalCohort:
+    """
+    Keeps the scalers, embeddings, clusters and classifiers of a set of sweep configurations
+    up to date as new subjects arrive, without rerunning the full pipeline.
+
+    fit() runs every configuration once. update() then appends new subjects and refreshes only
+    what they affect:
+    - scalers: frozen at fit(). New subjects are scaled with the same median/IQR as the cohort,
+      so existing rows keep their features and the projector sees the scale it was fitted on
+      (an unseen category, e.g. a new code in a categorical column, raises ValueError);
+    - embedding: existing subjects keep their t-SNE coordinates, new ones are placed by an
+      EmbeddingProjector (t-SNE has no transform) instead of re-embedding everyone;
+    - clusters: KMeans restarts from the previous centroids (n_init=1), so it converges in a few
+      iterations and cluster IDs stay comparable; other methods keep the existing labels and
+      assign new subjects by a vote of their nearest neighbours;
+    - classifiers and fusions: refitted only when the content hash of their inputs (selected
+      feature matrix and labels) changed, with the hyperparameters of their last search unless
+      retune=True. Added subjects change every input; an update that adds nobody refits nothing.
+    Each update records the label drift (share of existing subjects whose cluster changed) in
+    history_. The frozen embedding moves away from a fresh run as the cohort grows, so fit()
+    the whole cohort again from time to time.
+
+    Parameters:
+    - configs: list of dicts, run_pipeline arguments as in run_sweep (embedded-space clustering,
+               one data set).
+    - data_set: str, data_set variant (see apply_data_set).
+    - missing: str, one of IMPUTATION_STRATEGIES, applied to each batch of new subjects.
+    - n_jobs: int, worker processes for classifier refits (-1 uses all cores).
+    """
+
+    def __init__(self, configs, data_set='drop_rows', missing='drop', n_jobs=-1):
+        self.configs = [{**SWEEP_DEFAULTS, **config} for config in configs]
+        for config in self.configs:
+            if config['cluster_space'] != 'embedded' or config['variant'] is not None:
+                raise ValueError("IncrementalCohort supports embedded-space clustering of a single data set only.")
+            if config['cluster_method'] == 'hdbscan':
+                raise ValueError("IncrementalCohort needs a fixed number of clusters; 'hdbscan' is not supported.")
+        self.data_set = data_set
+        self.missing = missing
+        self.n_jobs = n_jobs
+        self.keys_ = [_stage_keys(config) for config in self.configs]
+
+    def fit(self, df):
+        """Preprocesses a raw frame (as returned by read_workbook) and runs every configuration on it."""
+        self.frame_ = apply_data_set(df, self.data_set, missing=self.missing)
+        self.scalers_ = fit_scalers(self.frame_, self.data_set)
+        self.X_ = transform_frame(self.frame_, self.data_set, self.scalers_)
+
+        self.clusters_ = {}
+        for config, (_, cluster_key, _, _, _) in zip(self.configs, self.keys_):
+            if cluster_key not in self.clusters_:
+                projector = EmbeddingProjector(method=config['dim_method'], pca_components=config['pca_components'],
+                                               backend=config['embedding_backend'],
+                                               cluster_method=config['cluster_method']).fit(self.X_)
+                self.clusters_[cluster_key] = {
+                    'projector': projector,
+                    'embedding': projector.embedding_,
+                    'labels': projector.labels_,
+                    'silhouette': _cluster_silhouette(projector.embedding_, projector.labels_),
+                }
+        self.fitted_ = {}  # ('classify' | 'fuse', stage key) -> (input hash, result)
+        self.history_ = []
+        self._refresh(retune=True)
+        return self
+
+    def update(self, df_new, retune=False):
+        """
+        Appends new subjects (raw rows with the workbook's columns) and refreshes what they affect.
+        Rows whose ID is already in the cohort are skipped, so a session folder can be re-read whole.
+
+        Parameters:
+        - df_new: pd.DataFrame, raw rows of the new subjects.
+        - retune: bool, rerun the hyperparameter searches of the refitted classifiers.
+
+        Returns:
+        - report: dict with 'added', 'skipped' (already in the cohort), 'dropped' (missing values),
+                  'n_subjects', 'label_drift' and 'centroid_shift' (per clustering, see
+                  _cluster_key_name), 'refitted', 'reused' and 'wall_s'; also appended to history_.
+        """
+        from sklearn.cluster import KMeans
+        start = time.perf_counter()
+        df_new = df_new[self.frame_.columns]
+        skipped = 0
+        if 'ID' in df_new.columns:
+            known = df_new['ID'].isin(self.frame_['ID'])
+            skipped = int(known.sum())
+            df_new = df_new[~known]
+
+        n_old = len(self.frame_)
+        report = {'added': 0, 'skipped': skipped, 'dropped': 0, 'n_subjects': n_old,
+                  'label_drift': {_cluster_key_name(key): 0.0 for key in self.clusters_},
+                  'centroid_shift': {_cluster_key_name(key): 0.0 for key in self.clusters_},
+                  'refitted': 0, 'reused': len(self.fitted_)}
+        if not df_new.empty:
+            # The cohort's rows are complete, so only the new ones are dropped or imputed (the cohort are the donors)
+            frame, _ = impute_missing(pd.concat([self.frame_, df_new], ignore_index=True), strategy=self.missing)
+            report.update(added=len(frame) - n_old, dropped=len(df_new) - (len(frame) - n_old), n_subjects=len(frame))
+
+        if report['added']:
+            X_new = transform_frame(frame.iloc[n_old:].reset_index(drop=True), self.data_set, self.scalers_)
+            self.frame_ = frame
+            self.X_ = pd.concat([self.X_, X_new], ignore_index=True)
+
+            for cluster_key, state in self.clusters_.items():
+                name = _cluster_key_name(cluster_key)
+                projector = state['projector']
+                embedding = np.vstack([state['embedding'], projector.transform(X_new)])
+                if projector.kmeans_ is not None:
+                    # Warm start from the previous centroids: cluster IDs keep their meaning
+                    previous = projector.kmeans_.cluster_centers_
+                    projector.kmeans_ = KMeans(n_clusters=projector.n_clusters, init=previous, n_init=1,
+                                               random_state=42).fit(embedding)
+                    labels = projector.kmeans_.labels_
+                    report['centroid_shift'][name] = float(
+                        np.linalg.norm(projector.kmeans_.cluster_centers_ - previous, axis=1).max())
+                else:
+                    labels = np.concatenate([state['labels'], projector.predict(X_new)])
+                report['label_drift'][name] = float(np.mean(labels[:n_old] != state['labels']))
+                state.update(embedding=embedding, labels=labels, silhouette=_cluster_silhouette(embedding, labels))
+
+            report['refitted'], report['reused'] = self._refresh(retune=retune)
+
+        report['wall_s'] = time.perf_counter() - start
+        self.history_.append(report)
+        drift = ', '.join(f"{name} {value:.1%}" for name, value in report['label_drift'].items())
+        print(f"Update: {report['added']} subjects added ({report['skipped']} already in the cohort, "
+              f"{report['dropped']} dropped), {report['n_subjects']} in total; label drift {drift}; "
+              f"{report['refitted']} models refitted, {report['reused']} reused in {report['wall_s']:.2f}s.")
+        return report
+
+    def _refresh(self, retune):
+        """
+        Reselects features and refits the classifiers and fusions whose inputs changed,
+        then rebuilds results_. Returns (number refitted, number reused).
+        """
+        selections = {}
+        for config, (_, cluster_key, select_key, _, _) in zip(self.configs, self.keys_):
+            if select_key not in selections:
+                selections[select_key] = select_stage(self.X_, self.clusters_[cluster_key]['labels'],
+                                                      config['feature_selection_k'])
+
+        tasks, digests = {}, {}
+        for config, (_, cluster_key, select_key, classify_key, fuse_key) in zip(self.configs, self.keys_):
+            X_selected, labels = selections[select_key][0], self.clusters_[cluster_key]['labels']
+            task_keys = [('classify', classify_key)] + ([('fuse', fuse_key)] if fuse_key is not None else [])
+            for task_key in task_keys:
+                if task_key in digests:
+                    continue
+                digests[task_key] = joblib.hash((sweep_data_hash(X_selected), np.asarray(labels), task_key))
+                previous = self.fitted_.get(task_key)
+                if previous is not None and previous[0] == digests[task_key]:
+                    continue
+                if task_key[0] == 'fuse':
+                    tasks[task_key] = (model_fusion, (X_selected, labels, config['fusion_models'],
+                                                      config['fusion_voting'], config['cv']))
+                    continue
+                # Refits reuse the last search's choice; a first fit (or retune) searches as configured
+                search = retune or previous is None
+                params = None if search else previous[1]['best_params']
+                tasks[task_key] = (_classify_stage, (X_selected, labels, config['classifier_method'],
+                                                     config['tune'] and search, config['cv'], config['search_strategy'],
+                                                     config['max_fits'], config['max_seconds'], params))
+
+        for task_key, result, _ in _iter_stage(tasks, self.n_jobs):
+            self.fitted_[task_key] = (digests[task_key], result)
+
+        self.results_ = []
+        for config, (_, cluster_key, select_key, classify_key, fuse_key) in zip(self.configs, self.keys_):
+            fusion = self.fitted_[('fuse', fuse_key)][1] if fuse_key is not None else None
+            self.results_.append(assemble_results(
+                self.clusters_[cluster_key]['silhouette'], self.fitted_[('classify', classify_key)][1], fusion,
+                selections[select_key][1], dim_method=config['dim_method'], cluster_method=config['cluster_method'],
+                classifier_method=config['classifier_method'], feature_selection_k=config['feature_selection_k'],
+                tune=config['tune'], cv=config['cv']))
+        return len(tasks), len(digests) - len(tasks)
+
+    def results_df(self):
+        """The current results of every configuration, one row each (as run_sweep's table)."""
+        return pd.DataFrame(self.results_)
+
+    def save(self, path):
+        """Serializes the cohort to path with joblib, replacing the file atomically."""
+        tmp_path = f"{path}.tmp"
+        joblib.dump(self, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Loads a cohort saved with save()."""
+        cohort = joblib.load(path)
+        if not isinstance(cohort, cls):
+            raise TypeError(f"{path} does not contain a {cls.__name__}.")
+        return cohort
+
+def sweep_data_hash(X):
+    """
+    Content hash of a feature matrix (or dict of variant matrices) for sweep_config_id. Frames
+    with the same columns and values hash alike however pandas lays them out in memory (a
+    freshly preprocessed frame and the same frame read back from the cache differ there).
+    """
+    if isinstance(X, dict):
+        return joblib.hash({name: sweep_data_hash(matrix) for name, matrix in X.items()})
+    return joblib.hash((list(X.columns), np.ascontiguousarray(X.to_numpy())))
+
+def sweep_config_id(config, data_hash):
+    """Identity of a sweep config on a given data set (sweep_data_hash of X): same settings, same id."""
+    _, _, _, classify_key, fuse_key = _stage_keys({**SWEEP_DEFAULTS, **config})
+    return joblib.hash((data_hash, classify_key, fuse_key))
+
+def _json_default(value):
+    """json.dumps fallback for numpy/pandas values in results."""
+    if isinstance(value, (np.ndarray, pd.Index)):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return repr(value)
+
+class SweepStore:
+    """
+    Resumable on-disk store of sweep results.
+
+    Each finished config is one row of a SQLite table (config, metrics and selected features as
+    JSON) plus a joblib artifact with its trained models. The artifact is written before the
+    row, so an interrupted sweep never leaves a row without its models.
+
+    Parameters:
+    - directory: str, store location (created if missing): results.sqlite and models/.
+    """
+
+    MODEL_KEYS = ('trained_model', 'fusion_trained_model')
+    ARRAY_KEYS = ('cv_scores', 'fold_predictions')
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, 'models'), exist_ok=True)
+        self.db_path = os.path.join(directory, 'results.sqlite')
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS runs (config_id TEXT PRIMARY KEY, position INTEGER, "
+                       "config TEXT, result TEXT, model_path TEXT, finished_at REAL)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.db_path)
+        try:
+            with db:  # commits, or rolls back on error
+                yield db
+        finally:
+            db.close()
+
+    def completed_ids(self):
+        """Ids (sweep_config_id) of the configs already stored."""
+        with self._connect() as db:
+            return {row[0] for row in db.execute("SELECT config_id FROM runs")}
+
+    def save(self, config_id, position, config, result):
+        """Stores one finished config: position is its index in the sweep's config list."""
+        model_path = os.path.join(self.directory, 'models', f"{config_id}.joblib")
+        tmp_path = f"{model_path}.tmp"
+        joblib.dump({key: result[key] for key in self.MODEL_KEYS if key in result}, tmp_path)
+        os.replace(tmp_path, model_path)
+        metrics = {key: value for key, value in result.items() if key not in self.MODEL_KEYS}
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?)",
+                       (config_id, position, json.dumps(config, default=_json_default),
+                        json.dumps(metrics, default=_json_default), model_path, time.time()))
+
+    def load_results(self, with_models=True, config_ids=None):
+        """
+        Stored results shaped like run_sweep's (models loaded from their artifacts).
+
+        Parameters:
+        - with_models: bool, load the trained models.
+        - config_ids: list of str or None, the sweep_config_ids of one sweep: only their rows are
+                      returned, in this order (ids not stored yet are skipped). None returns every
+                      stored row, oldest first.
+        """
+        with self._connect() as db:
+            if config_ids is None:
+                rows = db.execute("SELECT config_id, result, model_path FROM runs ORDER BY finished_at").fetchall()
+            else:
+                config_ids = list(config_ids)
+                stored = {row[0]: row for row in db.execute(
+                    "SELECT config_id, result, model_path FROM runs WHERE config_id IN (SELECT value FROM json_each(?))",
+                    (json.dumps(config_ids),))}
+                rows = [stored[config_id] for config_id in config_ids if config_id in stored]
+        results = []
+        for _, result_json, model_path in rows:
+            result = json.loads(result_json)
+            for key in self.ARRAY_KEYS:
+                if result.get(key) is not None:
+                    result[key] = np.asarray(result[key])
+            if with_models:
+                result.update(joblib.load(model_path))
+            results.append(result)
+        return results
+
+    def results_df(self, with_models=True, config_ids=None):
+        """results_df of the stored configs (see load_results), without retraining anything."""
+        return pd.DataFrame(self.load_results(with_models=with_models, config_ids=config_ids))
+
+def save_model_bundle(path, preprocessor, run_result, model_key='trained_model'):
+    """
+    Saves everything needed to score new subjects: the fitted preprocessor, the selected
+    features and the trained classifier from one pipeline run.
+
+    Parameters:
+    - path: str, output file (joblib).
+    - preprocessor: PreprocessingTransformer, fitted on the cohort the model was trained on.
+    - run_result: dict, one entry of all_results / row of results_df.
+    - model_key: str, 'trained_model' or 'fusion_trained_model'.
+    """
+    selected_features = run_result['selected_features']
+    if isinstance(selected_features, str):  # 'None' when feature selection was skipped
+        selected_features = preprocessor.get_feature_names_out()
+    feature_names = list(preprocessor.get_feature_names_out())
+    joblib.dump({
+        'preprocessor': preprocessor,
+        'selected_features': list(selected_features),
+        'feature_index': np.array([feature_names.index(col) for col in selected_features]),
+        'model': run_result[model_key],
+    }, path)
+
+def load_model_bundle(path):
+    """Loads a bundle written by save_model_bundle."""
+    return joblib.load(path)
+
+def predict_records(bundle, records):
+    """
+    Predicts cluster membership for one subject (dict) or many (list of dicts) of raw workbook values.
+
+    Returns:
+    - dict with 'labels', 'classes' and 'probabilities' (None if the model has no predict_proba).
+    """
+    features = bundle['preprocessor'].transform_records(records)[:, bundle['feature_index']]
+    X_new = pd.DataFrame(features, columns=bundle['selected_features'])
+    model = bundle['model']
+    if not hasattr(model, 'predict_proba'):
+        return {'labels': model.predict(X_new).tolist(), 'classes': model.classes_.tolist(), 'probabilities': None}
+    # One pass: predict() is the argmax of predict_proba() for every probabilistic model in the pipeline
+    probabilities = model.predict_proba(X_new)
+    return {
+        'labels': model.classes_[probabilities.argmax(axis=1)].tolist(),
+        'classes': model.classes_.tolist(),
+        'probabilities': probabilities.tolist(),
+    }
+
+class MicroBatcher:
+    """
+    Groups concurrent prediction requests into one model call.
+
+    Requests wait at most max_wait_ms for others to arrive (or until max_batch_size subjects
+    are queued), then the whole batch is scored at once. Latency from arrival to result is
+    recorded per request for p50/p99 reporting.
+    """
+
+    def __init__(self, bundle, max_batch_size=64, max_wait_ms=2.0, latency_window=10000):
+        self.bundle = bundle
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.latencies_ms = collections.deque(maxlen=latency_window)
+        self.batch_sizes = collections.deque(maxlen=latency_window)
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, records):
+        """Blocks until the records (list of dicts) are scored and returns predict_records' dict."""
+        pending = {'records': records, 'start': time.perf_counter(), 'done': threading.Event()}
+        self._queue.put(pending)
+        pending['done'].wait()
+        if 'error' in pending:
+            raise pending['error']
+        return pending['result']
+
+    @staticmethod
+    def _count(pending):
+        """Returns the number of subjects in a queued request, or fails that request and returns None."""
+        try:
+            return len(pending['records'])
+        except Exception as error:
+            pending['error'] = error
+            pending['done'].set()
+            return None
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            n_subjects = self._count(first)
+            if n_subjects is None:
+                continue
+            batch = [first]
+            deadline = time.perf_counter() + self.max_wait_ms / 1000
+            while n_subjects < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    pending = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                n_records = self._count(pending)
+                if n_records is not None:
+                    batch.append(pending)
+                    n_subjects += n_records
+            try:
+                self._score(batch)
+            except Exception as error:
+                # Never let one batch take the worker down: every later request would hang
+                for pending in batch:
+                    if not pending['done'].is_set():
+                        pending['error'] = error
+                        pending['done'].set()
+
+    def _score(self, batch):
+        try:
+            result = predict_records(self.bundle, [record for pending in batch for record in pending['records']])
+        except Exception as error:
+            # Fall back to scoring requests separately so one bad record doesn't fail the batch
+            if len(batch) > 1:
+                for pending in batch:
+                    self._score([pending])
+                return
+            batch[0]['error'] = error
+            batch[0]['done'].set()
+            return
+
+        offset = 0
+        self.batch_sizes.append(len(batch))
+        for pending in batch:
+            n = len(pending['records'])
+            pending['result'] = {
+                'labels': result['labels'][offset:offset + n],
+                'classes': result['classes'],
+                'probabilities': None if result['probabilities'] is None else result['probabilities'][offset:offset + n],
+            }
+            offset += n
+            self.latencies_ms.append((time.perf_counter() - pending['start']) * 1000)
+            pending['done'].set()
+
+    def stats(self):
+        """Returns request count, p50/p99 latency in milliseconds and mean requests per batch."""
+        latencies = np.array(self.latencies_ms)
+        if latencies.size == 0:
+            return {'requests': 0, 'p50_ms': None, 'p99_ms': None, 'mean_batch_size': None}
+        return {
+            'requests': int(latencies.size),
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p99_ms': float(np.percentile(latencies, 99)),
+            'mean_batch_size': float(np.mean(self.batch_sizes)),
+        }
+
+def _make_inference_handler(batcher):
+    """Builds the HTTP request handler bound to a MicroBatcher."""
+
+    class InferenceHandler(http.server.BaseHTTPRequestHandler):
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self._send_json(200, batcher.stats())
+            elif self.path == '/health':
+                self._send_json(200, {'status': 'ok'})
+            else:
+                self._send_json(404, {'error': f"Unknown path {self.path}. Use POST /predict, GET /stats or GET /health."})
+
+        def do_POST(self):
+            if self.path != '/predict':
+                self._send_json(404, {'error': f"Unknown path {self.path}. Use POST /predict."})
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                # Accept a single subject, a list of subjects, or {"subjects": [...]}
+                records = payload.get('subjects', payload) if isinstance(payload, dict) else payload
+                records = [records] if isinstance(records, dict) else records
+                if not isinstance(records, list) or not records or not all(isinstance(r, dict) for r in records):
+                    raise ValueError("Expected a subject record, a non-empty list of them, or {\"subjects\": [...]}.")
+                self._send_json(200, batcher.submit(records))
+            except (ValueError, KeyError, TypeError) as error:
+                self._send_json(400, {'error': f"{type(error).__name__}: {error}"})
+            except Exception as error:
+                # Anything else is a server fault; answer it instead of dropping the connection
+                self._send_json(500, {'error': f"{type(error).__name__}: {error}"})
+
+        def address_string(self):
+            # Unix socket clients have no (host, port) address
+            return self.client_address[0] if self.client_address else 'unix-socket'
+
+        def log_message(self, format, *args):
+            pass  # Latency is tracked by the batcher; per-request access logs would dominate it
+
+    return InferenceHandler
+
+class _InferenceHTTPServer(http.server.ThreadingHTTPServer):
+    request_queue_size = 128  # socketserver's default backlog of 5 resets concurrent clients
+
+class _InferenceUnixServer(socketserver.ThreadingUnixStreamServer):
+    request_queue_size = 128
+    daemon_threads = True
+
+def serve_model_bundle(bundle_path, host='127.0.0.1', port=8765, socket_path=None, max_batch_size=64, max_wait_ms=2.0):
+    """
+    Serves a model bundle over HTTP on localhost (or a Unix socket) until interrupted.
+
+    Endpoints:
+    - POST /predict: JSON subject record(s) with raw workbook columns -> labels, classes, probabilities.
+    - GET /stats: request count, p50/p99 latency (ms) and mean batch size.
+    - GET /health: liveness check.
+
+    Parameters:
+    - bundle_path: str, file written by save_model_bundle. Loaded once at startup.
+    - host, port: address to bind when socket_path is None.
+    - socket_path: str or None, serve on this Unix socket instead of TCP.
+    - max_batch_size: int, maximum subjects per model call.
+    - max_wait_ms: float, how long a request may wait for others to batch with.
+    """
+    batcher = MicroBatcher(load_model_bundle(bundle_path), max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    handler = _make_inference_handler(batcher)
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = _InferenceUnixServer(socket_path, handler)
+        print(f"Inference server listening on unix socket {socket_path}")
+    else:
+        server = _InferenceHTTPServer((host, port), handler)
+        print(f"Inference server listening on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Inference server stopped. Latency: {batcher.stats()}")
+
+# Goniometer column suffixes in workbook order: (D)orsi/(P)lantar, (A)ctive/(P)assive, knee (E)xtended/(F)lexed, (R)ight/(L)eft
+GONIOMETER_MEASURES = [f"{motion}{mode}{knee}{side}" for knee in 'EF' for side in 'RL' for motion in 'DP' for mode in 'AP']
+WEIGHT_BEARING_MEASURES = ['DFR', 'DFL', 'PFR', 'PFL']
+BENCHMARK_STAGES = ['load', 'impute_missing', 'rom_differences', 'dimensionality_reduction', 'clustering', 'feature_selection',
+                    'train_classifier', 'train_classifier_tuned', 'model_fusion']
+
+def make_synthetic_cohort(n_subjects, missing_visit_rate=0.07, random_state=42):
+    """
+    Generates a raw cohort with the workbook's schema: ID, the 10 demographic columns,
+    Pre/Post goniometer angles for both visits, weight-bearing lunge columns, and
+    MISSING_SENTINEL for every day-2 value of subjects who did not return.
+
+    Parameters:
+    - n_subjects: int, number of rows (at least 18: rows 8 and 17 always lack a second visit).
+    - missing_visit_rate: float, fraction of subjects without a second visit.
+    - random_state: int, seed.
+
+    Returns:
+    - df: pd.DataFrame, same columns and dtypes as read_workbook's output.
+    """
+    rng = np.random.default_rng(random_state)
+    data = {
+        'ID': np.arange(1, n_subjects + 1, dtype=np.float64),
+        'Age': rng.integers(20, 80, n_subjects).astype(np.float64),
+        'Gender': rng.integers(0, 2, n_subjects).astype(np.float64),
+        'MassD1': rng.normal(78, 14, n_subjects).round(2),
+    }
+    data['MassD2'] = (data['MassD1'] + rng.normal(0, 0.8, n_subjects)).round(2)
+    data['Height'] = rng.normal(1.72, 0.09, n_subjects).round(2)
+    data['ShoeSize'] = (rng.integers(12, 28, n_subjects) / 2).astype(np.float64)
+    data['Tegner'] = rng.integers(2, 10, n_subjects).astype(np.float64)
+    for col in ['LegD', 'ArmD', 'Play#']:
+        data[col] = rng.integers(0, 2, n_subjects).astype(np.float64)
+
+    # Each subject has a baseline per measure; later timepoints add a small stretch effect plus noise
+    baseline = rng.normal(28, 7, (n_subjects, len(GONIOMETER_MEASURES)))
+    for visit in '12':
+        for timepoint, shift in (('Pre', 0.0), ('Post', 1.5)):
+            angles = (baseline + shift + rng.normal(0, 1.5, baseline.shape)) * 3
+            for j, measure in enumerate(GONIOMETER_MEASURES):
+                data[f"{timepoint}{visit}{measure}"] = np.round(angles[:, j]) / 3  # 1/3 degree resolution
+    for visit in '12':
+        for measure in WEIGHT_BEARING_MEASURES:
+            data[f"WB{visit}{measure}"] = rng.integers(0, 16, n_subjects).astype(np.float64)
+
+    df = pd.DataFrame(data)
+    no_return = rng.random(n_subjects) < missing_visit_rate
+    no_return[[8, 17]] = True  # Mirror the workbook, where rows 8 and 17 lack a second visit
+    df.iloc[no_return, column_schema(tuple(df.columns)).select(visit='2')] = MISSING_SENTINEL
+    return df
+
+def _clear_stage_caches():
+    """Empties the in-process caches of the pipeline stages (embeddings, feature statistics, KNN imputation indexes)."""
+    _EMBEDDING_CACHE.clear()
+    _FEATURE_STATS_CACHE.clear()
+    _NEIGHBOR_INDEX_CACHE.clear()
+
+def _measure_stage(func, *args, **kwargs):
+    """
+    Runs func twice from cold in-process caches, hiding its prints: untraced for wall and CPU time,
+    then under tracemalloc for peak memory (tracing slows allocation-heavy stages several times
+    over, so it must not be timed).
+
+    Returns:
+    - (result of the timed run, wall seconds, CPU seconds, peak traced MB).
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        _clear_stage_caches()
+        result, wall, cpu = _timed_call(func, *args, **kwargs)
+        _clear_stage_caches()
+        _, _, _, peak_mb = _traced_call(func, *args, **kwargs)
+    return result, wall, cpu, peak_mb
+
+def benchmark_pipeline(sizes=(30, 100, 1000, 10000, 100000), classifier_method='rf', fusion_models=None,
+                       feature_selection_k=10, cv=5, stage_budget_s=120.0, report_path=None, random_state=42,
+                       compact=False):
+    """
+    Times and profiles every run_pipeline stage on synthetic cohorts of increasing size.
+
+    Sizes run smallest first. Once a stage takes longer than stage_budget_s it is marked
+    'skipped' for all larger sizes (its successors still run on the last cheaper inputs),
+    so the report shows which stage blows up first without waiting hours for it.
+
+    Parameters:
+    - sizes: iterable of int, cohort sizes (subjects).
+    - classifier_method: str, classifier used for the train_classifier stages.
+    - fusion_models: list of tuples or None, fusion members (defaults to RF + NB + logistic).
+    - feature_selection_k: int, k for feature_selection.
+    - cv: int, cross-validation folds.
+    - stage_budget_s: float, wall-time budget after which a stage stops being scaled up.
+    - report_path: str or None, write the JSON report here.
+    - random_state: int, seed for the synthetic cohorts.
+    - compact: bool, run the stages on the compact float32 matrix (see compact_matrix).
+
+    Returns:
+    - report: dict with 'environment', 'results' (one row per stage and size: wall_s, cpu_s,
+              peak_mb, status) and 'scaling' (log-log slope of wall time vs. size per stage).
+    """
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.decomposition import PCA
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.naive_bayes import GaussianNB
+    if fusion_models is None:
+        fusion_models = [
+            ('rf', RandomForestClassifier(n_estimators=100, random_state=42)),
+            ('nb', GaussianNB()),
+            ('lr', LogisticRegression(max_iter=1000, random_state=42)),
+        ]
+    over_budget = set()
+    rows = []
+    for n_subjects in sorted(sizes):
+        raw = make_synthetic_cohort(n_subjects, random_state=random_state)
+        X = X_embedded = labels = X_selected = None
+        stages = {
+            'load': lambda: preprocess_frame(raw, data_set='drop_rows', compact=compact),
+            'impute_missing': lambda: impute_missing(raw, strategy='knn')[0],
+            'rom_differences': lambda: compute_rom_differences(raw),
+            # Caches off (embeddings, folds): the benchmark measures the computation, not cache hits
+            'dimensionality_reduction': lambda: dimensionality_reduction(X, method='tsne_pca', cache=False),
+            'clustering': lambda: clustering(X_embedded, method='kmeans'),
+            'feature_selection': lambda: feature_selection(X, labels, k=feature_selection_k)[0],
+            'train_classifier': lambda: train_classifier(X_selected, labels, method=classifier_method, tune=False, cv=cv,
+                                                         cache_dir=None),
+            'train_classifier_tuned': lambda: train_classifier(X_selected, labels, method=classifier_method, tune=True, cv=cv,
+                                                               cache_dir=None),
+            'model_fusion': lambda: model_fusion(X_selected, labels, fusion_models, cv=cv, cache_dir=None),
+        }
+        for stage in BENCHMARK_STAGES:
+            row = {'stage': stage, 'n_subjects': n_subjects, 'wall_s': None, 'cpu_s': None, 'peak_mb': None}
+            if stage in over_budget:
+                row['status'] = 'skipped'
+            else:
+                try:
+                    result, row['wall_s'], row['cpu_s'], row['peak_mb'] = _measure_stage(stages[stage])
+                    row['status'] = 'ok'
+                except Exception as error:
+                    row['status'] = f"error: {type(error).__name__}: {error}"
+                    result = None
+                if row['wall_s'] is not None and row['wall_s'] > stage_budget_s:
+                    over_budget.add(stage)
+                if stage == 'load':
+                    X = result
+                elif stage == 'dimensionality_reduction':
+                    X_embedded = result
+                elif stage == 'clustering':
+                    labels = result
+                elif stage == 'feature_selection':
+                    X_selected = result
+            # Cheap stand-ins for skipped/failed stages so later stages can still be measured at this size
+            if stage == 'dimensionality_reduction' and X_embedded is None and X is not None:
+                X_embedded = PCA(n_components=2, random_state=42).fit_transform(X)
+            elif stage == 'clustering' and labels is None and X_embedded is not None:
+                labels = MiniBatchKMeans(n_clusters=3, random_state=42, n_init=3).fit_predict(X_embedded)
+            elif stage == 'feature_selection' and X_selected is None and X is not None:
+                X_selected = X.iloc[:, :feature_selection_k]
+            rows.append(row)
+            print(f"Benchmark: {stage} @ N={n_subjects}: {row['status']}"
+                  + (f", {row['wall_s']:.3f}s wall, {row['peak_mb']:.1f} MB peak" if row['wall_s'] is not None else ''))
+
+    scaling = {}
+    for stage in BENCHMARK_STAGES:
+        points = [(r['n_subjects'], r['wall_s']) for r in rows if r['stage'] == stage and r['wall_s']]
+        if len(points) >= 2:
+            n, wall = np.log(np.array(points)).T
+            scaling[stage] = float(np.polyfit(n, wall, 1)[0])
+
+    report = {
+        'environment': {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+                        'cpu_count': os.cpu_count(), 'platform': platform.platform()},
+        'config': {'classifier_method': classifier_method, 'feature_selection_k': feature_selection_k, 'cv': cv,
+                   'stage_budget_s': stage_budget_s, 'compact': compact},
+        'results': rows,
+        'scaling': scaling,
+    }
+    if report_path is not None:
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+def check_benchmark_regressions(report, baseline=None, tolerance=0.25, max_seconds=None, min_wall_s=0.05):
+    """
+    Compares a benchmark report against a baseline report and/or absolute per-stage limits.
+
+    Parameters:
+    - report: dict, output of benchmark_pipeline.
+    - baseline: dict or None, an earlier report to compare stage times with.
+    - tolerance: float, allowed relative slowdown vs. the baseline (0.25 = 25%).
+    - max_seconds: dict or None, {stage: seconds} hard limits applied at every size.
+    - min_wall_s: float, ignore baseline comparisons below this time (timer noise).
+
+    Returns:
+    - regressions: list of str, one message per failing stage/size (empty when all pass).
+    """
+    regressions = []
+    previous = {}
+    if baseline is not None:
+        previous = {(r['stage'], r['n_subjects']): r['wall_s'] for r in baseline['results'] if r['wall_s'] is not None}
+    for row in report['results']:
+        key, wall = (row['stage'], row['n_subjects']), row['wall_s']
+        if wall is None:
+            continue
+        if key in previous and max(wall, previous[key]) >= min_wall_s and wall > previous[key] * (1 + tolerance):
+            regressions.append(f"{key[0]} @ N={key[1]}: {wall:.3f}s vs baseline {previous[key]:.3f}s")
+        if max_seconds and key[0] in max_seconds and wall > max_seconds[key[0]]:
+            regressions.append(f"{key[0]} @ N={key[1]}: {wall:.3f}s exceeds limit {max_seconds[key[0]]:.3f}s")
+    return regressions
 
 def plot_performance_bar(results_df):
     """
@@ -793,6 +3757,8 @@ def plot_performance_bar(results_df):
     Parameters:
     - results_df: pd.DataFrame, contains pipeline results.
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     plt.figure(figsize=(12, 6))
 
     # Create a unique identifier for each run
@@ -834,6 +3800,8 @@ def plot_silhouette_scores(results_df):
     Parameters:
     - results_df: pd.DataFrame, contains pipeline results.
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     plt.figure(figsize=(12, 6))
 
     # Create a unique identifier for each run
@@ -863,6 +3831,8 @@ def plot_performance_vs_silhouette(results_df):
     Parameters:
     - results_df: pd.DataFrame, contains pipeline results.
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     plt.figure(figsize=(10, 6))
 
     sns.scatterplot(
@@ -890,6 +3860,8 @@ def plot_fusion_performance(results_df):
     Parameters:
     - results_df: pd.DataFrame, contains pipeline results.
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     plt.figure(figsize=(10, 6))
 
     # Identify fusion models
@@ -937,6 +3909,8 @@ def plot_feature_importance(model, feature_names, top_n=10):
     - feature_names: list, names of the features.
     - top_n: int, number of top features to display.
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     if hasattr(model, 'feature_importances_'):
         importances = model.feature_importances_
     elif hasattr(model, 'coef_'):
@@ -975,17 +3949,6 @@ def plot_feature_importance(model, feature_names, top_n=10):
     plt.ylabel('Feature')
     plt.show()
 
-print("=== Run # Table ===")
-print("Run 1: t-SNE Only + Agglomerative Clustering + Random Forest + Feature Selection")
-print("Run 2: PCA + t-SNE + KMeans + Logistic Regression + Feature Selection")
-print("Run 3: PCA + t-SNE + KMeans + Naive Bayes + Feature Selection")
-print("Run 4: PCA + t-SNE + Agglomerative Clustering + Logistic Regression + Feature Selection")
-print("Run 5: Fusion: PCA + t-SNE + KMeans + Voting Classifier (RF, NB, Logistic) + Feature Selection")
-print("Run 6: t-SNE Only + KMeans + Random Forest + Feature Selection")
-print("Run 7:  t-SNE Only + Agglomerative Clustering + Logistic Regression + Feature Selection")
-print("Run 8: t-SNE Only + KMeans + Naive Bayes + Feature Selection")
-print("Run 9: t-SNE + PCA + KMeans + SVM + Feature Selection")
-print("Run 10: t-SNE + PCA + KMeans + GBDT + Feature Selection")
 
 '''
 silhouette score is a metric used to evaluate the quality of a clustering algorithm's results. It provides a measure of how similar
@@ -997,17 +3960,416 @@ each data point is to its assigned cluster (cohesion) compared to other clusters
 '''
 
 
+def _mount_google_drive():
+    """Mounts Google Drive in Colab, where DEFAULT_WORKBOOK_PATH lives."""
+    from google.colab import drive
+    drive.mount('/content/drive')
+
+# Fusion members by the names used in sweep config files, as in the thesis fusion run
+def _estimator(path, **params):
+    """Builds the estimator class at a dotted path, importing its module on first use."""
+    module, name = path.rsplit('.', 1)
+    return getattr(importlib.import_module(module), name)(**params)
+
+FUSION_MEMBERS = {
+    'rf': functools.partial(_estimator, 'sklearn.ensemble.RandomForestClassifier', n_estimators=100, random_state=42),
+    'nb': functools.partial(_estimator, 'sklearn.naive_bayes.GaussianNB'),
+    'lr': functools.partial(_estimator, 'sklearn.linear_model.LogisticRegression', solver='lbfgs', max_iter=1000,
+                            random_state=42),
+    'svm': functools.partial(_estimator, 'sklearn.svm.SVC', probability=True, random_state=42),
+    'gbdt': functools.partial(_estimator, 'sklearn.ensemble.GradientBoostingClassifier', random_state=42),
+}
+
+def default_sweep_configs():
+    """
+    The ten pipeline configurations compared in the thesis (Cell9), as run_sweep configs.
+    """
+    sweep_configs = []
+
+    # 1. t-SNE Only + Agglomerative Clustering + Random Forest + Feature Selection
+    sweep_configs.append(dict(
+        dim_method='tsne',
+        cluster_method='agg',
+        classifier_method='rf',
+        feature_selection_k=10,    # Select top 10 features
+        tune=True,                 # Enable hyperparameter tuning
+        cv=5                        # 10-fold cross-validation
+    ))
+
+    # 2. PCA + t-SNE + KMeans + Logistic Regression + Feature Selection
+    sweep_configs.append(dict(
+        dim_method='tsne_pca',
+        cluster_method='kmeans',
+        classifier_method='logistic',
+        pca_components=10,         # Adjust based on dataset size
+        feature_selection_k=10,    # Select top 10 features
+        tune=True,                  # Enable hyperparameter tuning
+        cv=5                        # 10-fold cross-validation
+    ))
+
+    # 3. PCA + t-SNE + KMeans + Naive Bayes + Feature Selection
+    sweep_configs.append(dict(
+        dim_method='tsne_pca',
+        cluster_method='kmeans',
+        classifier_method='nb',
+        pca_components=10,
+        feature_selection_k=10,    # Select top 10 features
+        tune=False,                 # Hyperparameter tuning not applicable for Naive Bayes
+        cv=5                        # 10-fold cross-validation
+    ))
+
+    # 4. PCA + t-SNE + Agglomerative Clustering + Logistic Regression + Feature Selection
+    sweep_configs.append(dict(
+        dim_method='tsne_pca',
+        cluster_method='agg',
+        classifier_method='logistic',
+        pca_components=10,
+        feature_selection_k=10,    # Select top 10 features
+        tune=True,                  # Enable hyperparameter tuning
+        cv=5                        # 10-fold cross-validation
+    ))
+
+    # 5. Fusion: PCA + t-SNE + KMeans + Voting Classifier (RF, NB, Logistic) + Feature Selection
+    fusion_models = [(name, FUSION_MEMBERS[name]()) for name in ('rf', 'nb', 'lr')]
+    sweep_configs.append(dict(
+        dim_method='tsne_pca',
+        cluster_method='kmeans',
+        classifier_method='rf',  # Base classifier for pseudo-labels
+        fusion_models=fusion_models,
+        pca_components=10,
+        feature_selection_k=10,    # Select top 10 features
+        tune=True,                  # Enable hyperparameter tuning for base classifier
+        cv=5                        # 10-fold cross-validation
+    ))
+
+    # 6. t-SNE Only + KMeans + Random Forest + Feature Selection
+    sweep_configs.append(dict(
+        dim_method='tsne',
+        cluster_method='kmeans',
+        classifier_method='rf',
+        feature_selection_k=10,    # Select top 10 features
+        tune=True,                  # Enable hyperparameter tuning
+        cv=5                        # 10-fold cross-validation
+    ))
+
+    # 7. t-SNE Only + Agglomerative Clustering + Logistic Regression + Feature Selection
+    sweep_configs.append(dict(
+        dim_method='tsne',
+        cluster_method='agg',
+        classifier_method='logistic',
+        feature_selection_k=10,    # Select top 10 features
+        tune=True,                  # Enable hyperparameter tuning
+        cv=5                        # 10-fold cross-validation
+    ))
+
+    # 8. t-SNE Only + KMeans + Naive Bayes + Feature Selection
+    sweep_configs.append(dict(
+        dim_method='tsne',
+        cluster_method='kmeans',
+        classifier_method='nb',
+        feature_selection_k=10,    # Select top 10 features
+        tune=False,                 # Hyperparameter tuning not applicable for Naive Bayes
+        cv=5                        # 10-fold cross-validation
+    ))
+
+    # 9. t-SNE + PCA + KMeans + SVM + Feature Selection
+    sweep_configs.append(dict(
+        dim_method='tsne_pca',  # Choose your preferred dimensionality reduction method
+        cluster_method='kmeans', # Choose your preferred clustering method
+        classifier_method='svm',
+        pca_components=10,
+        feature_selection_k=10,
+        tune=True,
+        cv=5
+    ))
+
+    # 10. t-SNE + PCA + KMeans + GBDT + Feature Selection
+    sweep_configs.append(dict(
+        dim_method='tsne_pca',
+        cluster_method='kmeans',
+        classifier_method='gbdt',
+        pca_components=10,
+        feature_selection_k=10,
+        tune=True,
+        cv=5
+    ))
+    return sweep_configs
+
+def load_sweep_configs(path):
+    """
+    Reads sweep configurations from a JSON or YAML file (YAML needs PyYAML).
+
+    The file holds either a list of run_pipeline argument dicts, or a mapping with 'configs'
+    (such a list) and/or 'grid' (keyword lists for sweep_grid). fusion_models are given by
+    member name (see FUSION_MEMBERS), e.g. fusion_models: [rf, nb, lr].
+
+    Parameters:
+    - path: str, .json, .yaml or .yml file.
+
+    Returns:
+    - configs: list of dicts, ready for run_sweep.
+    """
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+    if isinstance(spec, dict):
+        configs = list(spec.get('configs', []))
+        if 'grid' in spec:
+            configs += sweep_grid(**spec['grid'])
+    else:
+        configs = list(spec)
+
+    for config in configs:
+        if config.get('fusion_models'):
+            unknown = set(config['fusion_models']) - set(FUSION_MEMBERS)
+            if unknown:
+                raise ValueError(f"Unknown fusion members {sorted(unknown)}. Choose from {list(FUSION_MEMBERS)}.")
+            config['fusion_models'] = [(name, FUSION_MEMBERS[name]()) for name in config['fusion_models']]
+    return configs
+
+def sweep_main(argv=None):
+    """
+    Resumable sweep: runs the configs not yet in the results store and checkpoints each one
+    (metrics, selected features, trained models) as soon as it finishes, so a crash only loses
+    the configs still running. Rerunning skips what is stored; the returned results_df is
+    loaded from the store, without retraining.
+
+    Parameters:
+    - argv: list of str or None, command-line arguments after 'sweep'.
+
+    Returns:
+    - results_df: pd.DataFrame, one row per stored configuration.
+    """
+    parser = argparse.ArgumentParser(prog='pickleball_pipeline.py sweep',
+                                     description="Run sweep configurations into a resumable results store.")
+    parser.add_argument('--configs', help="JSON/YAML sweep configs (default: the thesis configurations)")
+    parser.add_argument('--workbook', default=DEFAULT_WORKBOOK_PATH, help="thesis workbook (.xlsx)")
+    parser.add_argument('--data-set', default='drop_rows', help="data set variant, see apply_data_set")
+    parser.add_argument('--missing', default='drop', choices=IMPUTATION_STRATEGIES,
+                        help="how subjects with missing measurements are handled, see impute_missing")
+    parser.add_argument('--variants', nargs='+', choices=list(DATA_VARIANTS),
+                        help="run every config on each of these analysis variants instead of --data-set")
+    parser.add_argument('--store', default='sweep_results', help="results store directory")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="worker processes for the sweep")
+    parser.add_argument('--compact', action='store_true', help="float32 feature matrix (half the memory)")
+    args = parser.parse_args(argv)
+
+    if args.workbook.startswith('/content/drive/'):
+        _mount_google_drive()
+    configs = load_sweep_configs(args.configs) if args.configs else default_sweep_configs()
+    if args.variants:
+        X = data_variants(read_workbook(args.workbook), variants=args.variants, missing=args.missing,
+                          compact=args.compact)
+        configs = [{**config, 'variant': name} for name in args.variants for config in configs]
+    else:
+        X = load_and_preprocess_data(args.workbook, data_set=args.data_set, return_original=False, missing=args.missing,
+                                     compact=args.compact)
+
+    store = SweepStore(args.store)
+    data_hash = sweep_data_hash(X)
+    config_ids = [sweep_config_id(config, data_hash) for config in configs]
+    completed = store.completed_ids()
+    pending = [index for index, config_id in enumerate(config_ids) if config_id not in completed]
+    print(f"Sweep: {len(configs) - len(pending)} of {len(configs)} configs already in {args.store}, "
+          f"running {len(pending)}.")
+
+    def checkpoint(index, result):
+        position = pending[index]
+        store.save(config_ids[position], position, configs[position], result)
+        print(f"Sweep: config {position + 1} saved to {args.store}.")
+
+    if pending:
+        run_sweep(X, [configs[index] for index in pending], n_jobs=args.n_jobs, on_result=checkpoint)
+
+    results_df = store.results_df(config_ids=config_ids)
+    print("=== Pipeline Results ===")
+    summary_columns = ['dim_method', 'cluster_method', 'classifier_method', 'cv_mean', 'f1', 'fusion_f1']
+    print(results_df.reindex(columns=(['variant'] if args.variants else []) + summary_columns))
+    return results_df
+
+def update_main(argv=None):
+    """
+    Incremental update: adds the subjects in a folder of session files to a saved
+    IncrementalCohort (fitted on the workbook on the first run), refits only what changed
+    and saves the cohort again. Subjects already in the cohort are skipped.
 
-# Execute all plots with the corrected functions
-plot_performance_bar(results_df)
-plot_silhouette_scores(results_df)
-plot_performance_vs_silhouette(results_df)
-plot_fusion_performance(results_df)
+    Parameters:
+    - argv: list of str or None, command-line arguments after 'update'.
+
+    Returns:
+    - report: dict, IncrementalCohort.update's report (None when no sessions were given).
+    """
+    parser = argparse.ArgumentParser(prog='pickleball_pipeline.py update',
+                                     description="Add new subjects to a saved cohort without rerunning the pipeline.")
+    parser.add_argument('--state', default='cohort_state.joblib', help="saved cohort (created on the first run)")
+    parser.add_argument('--sessions', help="folder of per-session CSV/Excel files with new subjects")
+    parser.add_argument('--configs', help="JSON/YAML sweep configs for the first run (default: the thesis configurations)")
+    parser.add_argument('--workbook', default=DEFAULT_WORKBOOK_PATH, help="thesis workbook (.xlsx) for the first run")
+    parser.add_argument('--data-set', default='drop_rows', help="data set variant, see apply_data_set")
+    parser.add_argument('--missing', default='drop', choices=IMPUTATION_STRATEGIES,
+                        help="how subjects with missing measurements are handled, see impute_missing")
+    parser.add_argument('--retune', action='store_true', help="rerun the hyperparameter searches of refitted classifiers")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="worker processes for the refits")
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.state):
+        cohort = IncrementalCohort.load(args.state)
+        cohort.n_jobs = args.n_jobs
+        print(f"Update: Loaded a cohort of {len(cohort.frame_)} subjects from {args.state}.")
+    else:
+        if args.workbook.startswith('/content/drive/'):
+            _mount_google_drive()
+        configs = load_sweep_configs(args.configs) if args.configs else default_sweep_configs()
+        cohort = IncrementalCohort(configs, data_set=args.data_set, missing=args.missing, n_jobs=args.n_jobs)
+        cohort.fit(read_workbook(args.workbook))
+
+    report = None
+    if args.sessions:
+        paths = list_session_files(args.sessions)
+        if not paths:
+            raise ValueError(f"No session files found in {args.sessions}.")
+        report = cohort.update(pd.concat(iter_session_chunks(paths), ignore_index=True), retune=args.retune)
+    cohort.save(args.state)
+    print(f"Update: Cohort of {len(cohort.frame_)} subjects saved to {args.state}.")
+    return report
+
+def main(argv=None):
+    """
+    Runs the thesis analysis end to end: loads and exports the cohort, fits and saves the
+    preprocessor, estimates k, runs the configuration sweep, reports and plots the results,
+    and saves the best model bundle. Importing the module does none of this.
+    'sweep' as the first argument runs the resumable sweep instead (see sweep_main), and
+    'update' adds new subjects to a saved cohort (see update_main).
 
-# Identify and plot feature importance for the best run
-best_run_index = results_df['cv_mean'].idxmax()
-best_run = all_results[best_run_index]
-selected_features_best_run = best_run['selected_features']
-trained_model_best_run = best_run['trained_model']
+    Parameters:
+    - argv: list of str or None, command-line arguments (None reads sys.argv).
 
-plot_feature_importance(trained_model_best_run, selected_features_best_run, top_n=10)
\ No newline at end of file
+    Returns:
+    - results_df: pd.DataFrame, one row per sweep configuration.
+    """
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ['sweep']:
+        return sweep_main(argv[1:])
+    if argv[:1] == ['update']:
+        return update_main(argv[1:])
+
+    parser = argparse.ArgumentParser(description="Pickleball ROM clustering and classification pipeline.")
+    parser.add_argument('--workbook', default=DEFAULT_WORKBOOK_PATH, help="thesis workbook (.xlsx)")
+    parser.add_argument('--data-set', default='drop_rows', help="data set variant, see apply_data_set")
+    parser.add_argument('--missing', default='drop', choices=IMPUTATION_STRATEGIES,
+                        help="how subjects with missing measurements are handled, see impute_missing")
+    parser.add_argument('--output-dir', default='.', help="where the CSV export, preprocessor and model bundle go")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="worker processes for the sweep")
+    parser.add_argument('--compact', action='store_true', help="float32 feature matrix (half the memory)")
+    parser.add_argument('--no-plots', action='store_true', help="skip the figures (headless runs)")
+    # Known arguments only: notebook kernels pass their own on the command line
+    args, _ = parser.parse_known_args(argv)
+
+    try:
+        from IPython.display import display
+    except ImportError:
+        display = print
+
+    if args.workbook.startswith('/content/drive/'):
+        _mount_google_drive()
+    file_path = args.workbook
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # Use this to look at pre processed scaled data that contain two days
+    X = load_and_preprocess_data(file_path, data_set=args.data_set, return_original=False, missing=args.missing,
+                                 compact=args.compact)
+    #X = X[[col for col in X.columns if not col.startswith('Diff')]]
+    #X = X[[col for col in X.columns if not col.startswith(('Pre', 'Post'))]]
+
+    # Use this to obtain original data set that also drops missing values
+    #X = load_and_preprocess_data(file_path, data_set='drop_rows', return_original=True)
+    #X, missing_report = impute_missing(X, strategy=args.missing)
+
+    # Use this to look at either day 1 or day 2 alone
+    # (or compare every variant in one run: compare_variants(read_workbook(file_path), sweep_configs))
+    #X = load_and_preprocess_data(file_path, data_set='drop_cols_1', return_original=False)
+    #X = X[[col for col in X.columns if not col.startswith('Diff')]]
+
+    #X = load_and_preprocess_data(file_path, data_set='drop_cols_2', return_original=False)
+    #X = X[[col for col in X.columns if not col.startswith('Diff')]]
+
+    # Make sure to uncomment this last one to check before running
+    X.to_csv(os.path.join(args.output_dir, 'exported_data.csv'), index=False)
+
+    # Fit the preprocessing once and save it so new subjects can be scored without reloading the cohort
+    preprocessor = PreprocessingTransformer(data_set=args.data_set, missing=args.missing).fit(read_workbook(file_path))
+    preprocessor.save(os.path.join(args.output_dir, 'preprocessor.joblib'))
+
+    optimal_k = find_optimal_k(X, plot=not args.no_plots)
+
+    # Cell9: Running Multiple Pipeline Configurations with Feature Selection and Trained Models
+    sweep_configs = default_sweep_configs()
+    all_results = run_sweep(X, sweep_configs, n_jobs=args.n_jobs)
+
+    # Convert to DataFrame for comparison
+    results_df = pd.DataFrame(all_results)
+    print("=== Pipeline Results ===")
+    display(results_df)
+
+    # Below is visualization for the above processes
+
+    # If you only need the labels and counts for a specific configuration (e.g., the best one):
+    best_config_index = results_df['cv_mean'].idxmax()  # Assuming 'cv_mean' is the metric for comparison
+    best_trained_model = results_df.loc[best_config_index, 'trained_model']
+
+    # Get X_selected from the best run
+    # Assuming all_results is a list containing the results of each run
+    best_run = all_results[best_config_index]
+
+    # Instead of reloading and preprocessing the data, reuse X (new subjects go through preprocessor.transform)
+    X_selected = X
+    # Ensure X_selected uses only the features the best model was trained on
+    if isinstance(best_run['selected_features'], list):  # Check if feature selection was applied
+        X_selected = X_selected[best_run['selected_features']]  # Use the selected features for prediction
+
+    # Before prediction, make sure X_selected has the same columns as during training
+    training_features = best_trained_model.feature_names_in_  # Get feature names from the trained model
+    if list(X_selected.columns) != list(training_features):  # Already aligned after feature selection: no copy
+        X_selected = X_selected.reindex(columns=training_features, fill_value=0)  # Reindex and fill missing values if any
+
+    best_cluster_labels = best_trained_model.predict(X_selected)
+    best_class_counts = pd.Series(best_cluster_labels).value_counts()
+    print("Class Counts for Best Configuration:\n", best_class_counts)
+
+    print("=== Run # Table ===")
+    print("Run 1: t-SNE Only + Agglomerative Clustering + Random Forest + Feature Selection")
+    print("Run 2: PCA + t-SNE + KMeans + Logistic Regression + Feature Selection")
+    print("Run 3: PCA + t-SNE + KMeans + Naive Bayes + Feature Selection")
+    print("Run 4: PCA + t-SNE + Agglomerative Clustering + Logistic Regression + Feature Selection")
+    print("Run 5: Fusion: PCA + t-SNE + KMeans + Voting Classifier (RF, NB, Logistic) + Feature Selection")
+    print("Run 6: t-SNE Only + KMeans + Random Forest + Feature Selection")
+    print("Run 7:  t-SNE Only + Agglomerative Clustering + Logistic Regression + Feature Selection")
+    print("Run 8: t-SNE Only + KMeans + Naive Bayes + Feature Selection")
+    print("Run 9: t-SNE + PCA + KMeans + SVM + Feature Selection")
+    print("Run 10: t-SNE + PCA + KMeans + GBDT + Feature Selection")
+
+    if not args.no_plots:
+        # Execute all plots with the corrected functions
+        plot_performance_bar(results_df)
+        plot_silhouette_scores(results_df)
+        plot_performance_vs_silhouette(results_df)
+        plot_fusion_performance(results_df)
+
+    # Identify and plot feature importance for the best run
+    best_run_index = results_df['cv_mean'].idxmax()
+    best_run = all_results[best_run_index]
+    selected_features_best_run = best_run['selected_features']
+    trained_model_best_run = best_run['trained_model']
+
+    if not args.no_plots:
+        plot_feature_importance(trained_model_best_run, selected_features_best_run, top_n=10)
+
+    # Save the best configuration for the inference server (serve_model_bundle('best_model_bundle.joblib'))
+    save_model_bundle(os.path.join(args.output_dir, 'best_model_bundle.joblib'), preprocessor, best_run)
+    return results_df
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pickleball_pipeline as pp  # noqa: E402
+
+WORKBOOK_PATH = os.path.join(ROOT, 'Thesis_De_Identified.xlsx')
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """Runs every test in its own directory, so the relative CACHE_DIR starts empty and stays out of the tree."""
+    monkeypatch.chdir(tmp_path)
+    pp._clear_stage_caches()
+
+
+@pytest.fixture(scope='session')
+def raw():
+    """The thesis workbook, parsed once per test session."""
+    return pp.read_workbook(WORKBOOK_PATH, cache_dir=None)
@@ -0,0 +1,44 @@
+import os
+import tracemalloc
+
+import numpy as np
+
+import pickleball_pipeline as pp
+
+
+def test_measure_stage_times_an_untraced_run():
+    tracing = []
+
+    def stage():
+        tracing.append(tracemalloc.is_tracing())
+        return [0] * 100000
+
+    result, wall, cpu, peak_mb = pp._measure_stage(stage)
+    assert tracing == [False, True]
+    assert len(result) == 100000
+    assert wall >= 0 and cpu >= 0
+    assert peak_mb > 0.5
+
+
+def test_embedding_cache_honours_cache_dir(tmp_path):
+    X = np.random.default_rng(0).normal(size=(40, 12))
+    first, info = pp.embed(X, cache_dir=str(tmp_path / 'cache'))
+    assert not info['cached']
+    files = os.listdir(tmp_path / 'cache' / 'embeddings')
+    assert len(files) == 1 and files[0].endswith('.npy')
+
+    pp._clear_stage_caches()
+    second, info = pp.embed(X, cache_dir=str(tmp_path / 'cache'))
+    assert info['cached']
+    np.testing.assert_array_equal(first, second)
+
+    pp._clear_stage_caches()
+    _, info = pp.embed(X, cache_dir=None)
+    assert not info['cached']
+
+
+def test_benchmark_measures_cold_stages(tmp_path):
+    report = pp.benchmark_pipeline(sizes=(30,), classifier_method='nb', cv=3)
+    assert {row['status'] for row in report['results']} == {'ok'}
+    assert not os.path.exists(os.path.join(pp.CACHE_DIR, 'embeddings'))
+    assert not pp._EMBEDDING_CACHE
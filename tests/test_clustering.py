@@ -0,0 +1,66 @@
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import pickleball_pipeline as pp
+
+
+def test_clustering_only_traces_memory_on_request(monkeypatch):
+    tracing = []
+
+    def backend(X, n_clusters, random_state):
+        tracing.append(tracemalloc.is_tracing())
+        return np.zeros(len(X), dtype=int)
+
+    monkeypatch.setitem(pp.CLUSTERING_BACKENDS, 'probe', backend)
+    X = np.zeros((10, 2))
+    _, info = pp.clustering(X, method='probe', return_info=True)
+    assert info['peak_mb'] is None
+    _, info = pp.clustering(X, method='probe', return_info=True, trace_memory=True)
+    assert info['peak_mb'] is not None
+    assert tracing == [False, True]
+
+
+@pytest.mark.parametrize('n_subjects', [4, 5])
+def test_consensus_subsamples_never_exceed_the_cohort(n_subjects):
+    # round(0.8 * n) < n_clusters + 1 here, so subsamples take the minimum size, up to the whole cohort
+    X = np.random.RandomState(0).normal(size=(n_subjects, 2))
+    result = pp.consensus_clustering(X, n_clusters=3, n_resamples=8, n_jobs=1)
+    assert len(result['labels']) == n_subjects
+    assert np.all(np.isfinite(result['stability']))
+
+
+@pytest.mark.parametrize('n_subjects', [2, 3])
+def test_consensus_needs_more_subjects_than_clusters(n_subjects):
+    X = np.zeros((n_subjects, 2))
+    with pytest.raises(ValueError, match='more subjects than clusters'):
+        pp.consensus_clustering(X, n_clusters=3, n_resamples=4, n_jobs=1)
+
+
+def test_consensus_rejects_bad_subsample_fraction():
+    with pytest.raises(ValueError, match='subsample_fraction'):
+        pp.consensus_clustering(np.zeros((10, 2)), subsample_fraction=1.5, n_jobs=1)
+
+
+def test_consensus_runs_single_process_in_sweep_workers(monkeypatch):
+    calls = []
+    consensus = pp.consensus_clustering
+
+    def recording(X, **kwargs):
+        calls.append(kwargs['n_jobs'])
+        return consensus(X, **{**kwargs, 'n_resamples': 8})
+
+    monkeypatch.setattr(pp, 'consensus_clustering', recording)
+    X = np.random.RandomState(0).normal(size=(40, 2))
+    pp.clustering(X, method='consensus_kmeans')
+    assert calls == [-1]
+
+    # Two clusterings go through the sweep pool (sequential with n_jobs=1, same code path as the workers)
+    features = pd.DataFrame(np.random.RandomState(1).normal(size=(40, 6)), columns=[f"f{i}" for i in range(6)])
+    configs = [{'dim_method': 'tsne', 'cluster_method': method, 'classifier_method': 'nb', 'cv': 3}
+               for method in ('consensus_kmeans', 'consensus_agg')]
+    pp.run_sweep(features, configs, n_jobs=1)
+    assert calls[1:] == [1, 1]
+    assert pp._STAGE_N_JOBS == -1
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import pickleball_pipeline as pp
+
+
+@pytest.fixture(scope='module')
+def matrices(raw):
+    return pp.preprocess_frame(raw), pp.preprocess_frame(raw, compact=True)
+
+
+def test_compact_matrix_is_one_float32_buffer(matrices):
+    X, Xc = matrices
+    values = np.asarray(Xc)
+    assert values.dtype == pp.COMPACT_DTYPE and values.flags['C_CONTIGUOUS']
+    assert np.shares_memory(values, np.asarray(Xc))  # No copy on the way out
+    assert list(Xc.columns) == list(X.columns)
+    assert Xc.memory_usage(index=False).sum() * 2 == X.memory_usage(index=False).sum()
+    pd.testing.assert_frame_equal(Xc.astype('float64'), X, check_exact=False, atol=1e-5)
+
+
+def test_compact_variants_match_float64(raw):
+    variants = pp.data_variants(raw)
+    compact = pp.data_variants(raw, compact=True)
+    for name, X in variants.items():
+        assert (compact[name].dtypes == pp.COMPACT_DTYPE).all()
+        pd.testing.assert_frame_equal(compact[name].astype('float64'), X, check_exact=False, atol=1e-5)
+
+
+def test_feature_scores_keep_float32_input(matrices):
+    X, Xc = matrices
+    labels = np.arange(len(X)) % 3
+    assert pp._feature_values(Xc).dtype == pp.COMPACT_DTYPE
+    np.testing.assert_allclose(pp.score_features(Xc, labels), pp.score_features(X, labels), rtol=1e-4)
+    X_selected, selected = pp.feature_selection(Xc, labels, k=10)
+    assert list(selected) == list(pp.feature_selection(X, labels, k=10)[1])
+    assert (X_selected.dtypes == pp.COMPACT_DTYPE).all()
+
+
+def test_stages_run_on_compact_input(matrices):
+    X, Xc = matrices
+    embedding = pp.dimensionality_reduction(Xc, method='tsne_pca', n_components=2, cache=False)
+    assert embedding.shape == (len(X), 2) and np.isfinite(embedding).all()
+    labels = pp.clustering(embedding, method='kmeans', n_clusters=3)
+    assert len(labels) == len(X) and len(set(labels)) == 3
+    scores = pp.search_k(Xc, k_range=range(2, 5), n_jobs=1)
+    assert len(scores['k_values']) == 3
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import pickleball_pipeline as pp
+
+
+@pytest.fixture(scope='module')
+def variants(raw):
+    return pp.data_variants(raw)
+
+
+@pytest.mark.parametrize('name', list(pp.DATA_VARIANTS))
+def test_variant_equals_single_variant_loading(raw, variants, name):
+    spec = pp.DATA_VARIANTS[name]
+    X = pp.preprocess_frame(raw, data_set=spec['data_set'])
+    schema = pp.column_schema(tuple(X.columns))
+    excluded = schema.select(role=spec.get('exclude_roles', []))
+    expected = X.drop(columns=X.columns[excluded])
+    expected = expected.drop(columns=spec.get('exclude_columns', []))
+    pd.testing.assert_frame_equal(variants[name], expected, check_exact=False, rtol=1e-12, atol=1e-12)
+
+
+def test_day_only_variants_keep_thirty_subjects(variants):
+    assert len(variants['both_days']) == 29
+    assert len(variants['day1_only']) == 30
+    assert len(variants['day2_only']) == 30
+
+
+def test_contiguous_variant_is_a_view(variants):
+    assert np.shares_memory(np.asarray(variants['both_days']), np.asarray(variants['no_diff']))
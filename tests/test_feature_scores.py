@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from scipy.stats import kruskal
+from sklearn.feature_selection import SelectKBest, f_classif
+
+import pickleball_pipeline as pp
+from conftest import WORKBOOK_PATH
+
+
+@pytest.fixture
+def data():
+    X = pp.load_and_preprocess_data(WORKBOOK_PATH, cache_dir=None)
+    rng = np.random.default_rng(0)
+    return X, [rng.integers(0, 3, len(X)) for _ in range(4)]
+
+
+def test_anova_matches_f_classif(data):
+    X, label_sets = data
+    for labels in label_sets:
+        np.testing.assert_allclose(pp.score_features(X, labels), f_classif(X, labels)[0], rtol=1e-8)
+
+
+def test_kruskal_matches_scipy(data):
+    X, (labels, *_) = data
+    values = X.to_numpy()
+    expected = [kruskal(*(values[labels == g, j] for g in np.unique(labels))).statistic
+                for j in range(values.shape[1])]
+    np.testing.assert_allclose(pp.score_features(X, labels, method='kruskal'), expected, rtol=1e-8)
+
+
+@pytest.mark.parametrize('method', pp.FEATURE_SCORES)
+def test_batched_scores_match_one_at_a_time(data, method):
+    X, label_sets = data
+    batched = pp.score_features(X, label_sets, method=method)
+    assert batched.shape == (len(label_sets), X.shape[1])
+    for scores, labels in zip(batched, label_sets):
+        np.testing.assert_allclose(scores, pp.score_features(X, labels, method=method), rtol=1e-10)
+
+
+def test_statistics_cached_by_content(data):
+    X, (labels, *_) = data
+    pp._FEATURE_STATS_CACHE.clear()
+    pp.score_features(X, labels)
+    pp.score_features(X.copy(), labels)
+    assert len(pp._FEATURE_STATS_CACHE) == 1
+    pp.score_features(X + 1, labels)
+    assert len(pp._FEATURE_STATS_CACHE) == 2
+
+
+def test_feature_selection_matches_select_k_best(data):
+    X, (labels, *_) = data
+    X_selected, selected = pp.feature_selection(X, labels, k=10)
+    expected = X.columns[SelectKBest(f_classif, k=10).fit(X, labels).get_support()]
+    assert list(selected) == list(expected)
+    assert list(X_selected.columns) == list(expected)
+    np.testing.assert_array_equal(X_selected.to_numpy(), X[expected].to_numpy())
+
+
+def test_rank_features_puts_nan_last():
+    ranking = pp.rank_features([[0.5, np.nan, 2.0, 1.0], [np.nan, 3.0, 1.0, 2.0]])
+    np.testing.assert_array_equal(ranking, [[2, 3, 0, 1], [1, 3, 2, 0]])
+
+
+def test_unknown_score(data):
+    X, (labels, *_) = data
+    with pytest.raises(ValueError, match='Unknown feature score'):
+        pp.score_features(X, labels, method='chi2')
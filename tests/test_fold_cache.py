@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+import pytest
+from sklearn.naive_bayes import GaussianNB
+
+import pickleball_pipeline as pp
+from conftest import WORKBOOK_PATH
+
+GRID = {'var_smoothing': [1e-9, 1e-6, 1e-3]}
+
+
+class CountingNB(GaussianNB):
+    fits = 0
+
+    def fit(self, X, y, sample_weight=None):
+        type(self).fits += 1
+        return super().fit(X, y, sample_weight=sample_weight)
+
+
+@pytest.fixture
+def data():
+    X = pp.load_and_preprocess_data(WORKBOOK_PATH, cache_dir=None)
+    return X, np.arange(len(X)) % 3
+
+
+def _search(X, y, cache_dir):
+    CountingNB.fits = 0
+    search = pp.search_hyperparameters(CountingNB(), GRID, X, y, strategy='grid', cv=3, n_jobs=1,
+                                       cache_dir=str(cache_dir))
+    return search, CountingNB.fits
+
+
+def test_cache_key_ignores_memory_layout(data, tmp_path):
+    X, y = data
+    first, fits = _search(X, y, tmp_path)
+    assert fits == 3 * 3 + 1  # every candidate on every fold, plus the refit of the best one
+    # A copy (or a frame read back from the feather cache) has another block layout but the same content
+    second, fits = _search(X.copy(), list(y), tmp_path)
+    assert fits == 0
+    assert second['best_params'] == first['best_params']
+    np.testing.assert_array_equal(second['fold_scores']['f1_weighted'], first['fold_scores']['f1_weighted'])
+
+
+def test_cache_key_changes_with_the_data(data, tmp_path):
+    X, y = data
+    _search(X, y, tmp_path)
+    _, fits = _search(X, (y + 1) % 3, tmp_path)
+    assert fits == 3 * 3 + 1
+    X_changed = X.copy()
+    X_changed.iloc[0, 0] += 1
+    _, fits = _search(X_changed, y, tmp_path)
+    assert fits == 3 * 3 + 1
+
+
+def test_eviction_keeps_the_cache_within_its_budget(data, tmp_path):
+    X, y = data
+    _search(X, y, tmp_path)
+    pp.evict_fold_cache(str(tmp_path), max_bytes=0)
+    assert not any(files for _, _, files in os.walk(tmp_path / 'folds'))
+    _, fits = _search(X, y, tmp_path)
+    assert fits == 3 * 3 + 1
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from sklearn.naive_bayes import GaussianNB
+from sklearn.tree import DecisionTreeClassifier
+
+import pickleball_pipeline as pp
+from conftest import WORKBOOK_PATH
+
+
+class CountingNB(GaussianNB):
+    fits = 0
+
+    def fit(self, X, y, sample_weight=None):
+        type(self).fits += 1
+        return super().fit(X, y, sample_weight=sample_weight)
+
+
+@pytest.fixture
+def data():
+    X = pp.load_and_preprocess_data(WORKBOOK_PATH, cache_dir=None)
+    return X, np.arange(len(X)) % 3
+
+
+def _members():
+    return [('nb', CountingNB()), ('tree', DecisionTreeClassifier(max_depth=3, random_state=0))]
+
+
+@pytest.mark.parametrize('voting', pp.FUSION_MODES)
+def test_fusion_modes_give_out_of_fold_predictions(data, voting):
+    X, y = data
+    CountingNB.fits = 0
+    result = pp.model_fusion(X, y, _members(), voting=voting, cv=3, n_jobs=1, cache_dir=None)
+    ensemble = result['trained_model']
+    assert CountingNB.fits == 3 + 1  # once per fold, once on all data
+    assert result['fold_predictions'].shape == (len(y),)
+    assert set(result['fold_predictions']) <= set(y)
+    assert list(ensemble.named_estimators_) == ['nb', 'tree']
+    assert ensemble.predict(X).shape == (len(y),)
+    if voting == 'hard':
+        assert not hasattr(ensemble, 'predict_proba')
+    else:
+        proba = ensemble.predict_proba(X)
+        assert proba.shape == (len(y), 3)
+        np.testing.assert_allclose(proba.sum(axis=1), 1)
+
+
+def test_soft_voting_averages_member_probabilities(data):
+    X, y = data
+    ensemble = pp.FusionEnsemble(_members(), voting='soft', cv=3, n_jobs=1, cache_dir=None).fit(X, y)
+    expected = np.mean([member.predict_proba(X) for member in ensemble.estimators_], axis=0)
+    np.testing.assert_allclose(ensemble.predict_proba(X), expected)
+
+
+def test_fusion_reuses_cached_member_fits(data, tmp_path):
+    X, y = data
+    first = pp.FusionEnsemble(_members(), voting='soft', cv=3, n_jobs=1, cache_dir=str(tmp_path)).fit(X, y)
+    CountingNB.fits = 0
+    # Same content, different block layout: every member fit comes from the cache
+    second = pp.FusionEnsemble(_members(), voting='soft', cv=3, n_jobs=1, cache_dir=str(tmp_path)).fit(X.copy(), y)
+    assert CountingNB.fits == 0
+    np.testing.assert_array_equal(second.oof_predictions_, first.oof_predictions_)
+
+
+def test_unknown_voting_mode(data):
+    X, y = data
+    with pytest.raises(ValueError, match='Unknown voting mode'):
+        pp.FusionEnsemble(_members(), voting='median', cv=3, n_jobs=1, cache_dir=None).fit(X, y)
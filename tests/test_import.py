@@ -0,0 +1,16 @@
+import os
+import subprocess
+import sys
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_MODULES = ('sklearn.cluster', 'sklearn.decomposition', 'sklearn.ensemble', 'sklearn.manifold', 'sklearn.mixture',
+                'sklearn.neural_network', 'sklearn.svm', 'matplotlib', 'seaborn', 'xgboost', 'umap', 'optuna')
+
+
+def test_import_is_lazy_and_side_effect_free(tmp_path):
+    code = ("import sys; sys.path.insert(0, sys.argv[1]); import pickleball_pipeline; "
+            f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', code, REPO], cwd=tmp_path, capture_output=True, text=True,
+                            check=True)
+    assert result.stdout.strip() == ''
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import pickleball_pipeline as pp
+
+CONFIGS = [
+    {'dim_method': 'tsne', 'classifier_method': 'nb', 'cv': 3},
+    {'dim_method': 'tsne', 'classifier_method': 'rf', 'feature_selection_k': 10, 'cv': 3},
+]
+
+
+@pytest.fixture
+def cohort(raw):
+    # The last five subjects arrive later; ID 9 (no second visit) stays in the base frame and is dropped
+    return pp.IncrementalCohort(CONFIGS, n_jobs=1).fit(raw.iloc[:-5])
+
+
+def test_update_keeps_scalers_and_existing_features(raw, cohort):
+    X_before = cohort.X_.copy()
+    centers = {name: scaler.center_.copy() for name, scaler in cohort.scalers_.items()
+               if hasattr(scaler, 'center_')}
+    report = cohort.update(raw.iloc[-5:])
+
+    assert report['added'] == 5 and report['n_subjects'] == len(X_before) + 5
+    pd.testing.assert_frame_equal(cohort.X_.iloc[:len(X_before)], X_before)
+    for name, center in centers.items():
+        np.testing.assert_array_equal(cohort.scalers_[name].center_, center)
+    # New subjects are scaled exactly as a standalone transform with the frozen scalers would
+    expected = pp.transform_frame(pp.apply_data_set(raw.iloc[-5:], 'drop_rows').reset_index(drop=True),
+                                  'drop_rows', cohort.scalers_)
+    np.testing.assert_array_equal(cohort.X_.iloc[len(X_before):].to_numpy(), expected.to_numpy())
+
+
+def test_unchanged_inputs_are_not_refitted(raw, cohort):
+    models = {key: result for key, (_, result) in cohort.fitted_.items()}
+    # Only subjects already in the cohort, plus one dropped for missing values: nobody is added
+    report = cohort.update(pd.concat([raw.iloc[:3], raw[raw['ID'] == 18]]))
+    assert report['added'] == 0 and report['refitted'] == 0 and report['reused'] == len(models)
+
+    report = cohort.update(raw.iloc[-5:])
+    assert report['refitted'] == len(models)
+    # Refreshing again sees the same content hashes, even though the frames were rebuilt
+    assert cohort._refresh(retune=False) == (0, len(models))
+    assert all(cohort.fitted_[key][1] is not models[key] for key in models)
+
+
+def test_update_cli_rejects_unknown_flags(capsys):
+    with pytest.raises(SystemExit):
+        pp.update_main(['--session', 'new/', '--n_jobs', '2'])
+    assert 'unrecognized arguments' in capsys.readouterr().err
@@ -0,0 +1,49 @@
+import sys
+
+import numpy as np
+import pytest
+from sklearn.cluster import KMeans
+from sklearn.datasets import make_blobs
+from sklearn.metrics import calinski_harabasz_score, silhouette_score
+
+import pickleball_pipeline as pp
+
+
+@pytest.fixture(scope='module')
+def blobs():
+    X, _ = make_blobs(n_samples=120, centers=4, cluster_std=0.6, random_state=0)
+    return X
+
+
+def test_scores_match_a_sequential_search(blobs):
+    result = pp.search_k(blobs, criterion='silhouette', n_jobs=2)
+    assert result['k_values'] == list(range(2, 11))
+    for k, silhouette, calinski, inertia in zip(result['k_values'], result['scores']['silhouette'],
+                                                result['scores']['calinski_harabasz'], result['scores']['inertia']):
+        kmeans = KMeans(n_clusters=k, random_state=42).fit(blobs)
+        assert silhouette == pytest.approx(silhouette_score(blobs, kmeans.labels_))
+        assert calinski == pytest.approx(calinski_harabasz_score(blobs, kmeans.labels_))
+        assert inertia == pytest.approx(kmeans.inertia_)
+
+
+@pytest.mark.parametrize('criterion', ['silhouette', 'calinski_harabasz', 'gap'])
+def test_finds_the_number_of_blobs(blobs, criterion):
+    assert pp.search_k(blobs, criterion=criterion, n_references=3)['optimal_k'] == 4
+
+
+def test_patience_stops_the_search_early(blobs):
+    full = pp.search_k(blobs, n_jobs=1)
+    early = pp.search_k(blobs, n_jobs=1, patience=2)
+    # One k per batch with n_jobs=1: the search stops two k after the best
+    assert early['k_values'] == [2, 3, 4, 5, 6]
+    assert early['optimal_k'] == full['optimal_k'] == 4
+
+
+def test_invalid_k_range_raises(blobs):
+    with pytest.raises(ValueError, match='No valid k'):
+        pp.search_k(blobs[:5], k_range=[5, 6])
+
+
+def test_find_optimal_k_without_plot_is_headless(blobs):
+    assert pp.find_optimal_k(blobs, plot=False) == 4
+    assert 'matplotlib.pyplot' not in sys.modules or sys.modules['matplotlib.pyplot'].get_fignums() == []
@@ -0,0 +1,35 @@
+import pandas as pd
+import pytest
+
+import pickleball_pipeline as pp
+from conftest import WORKBOOK_PATH
+
+
+@pytest.mark.parametrize('data_set', ['drop_rows', 'drop_cols_1', 'drop_cols_2'])
+@pytest.mark.parametrize('missing', ['drop', 'knn'])
+def test_cached_loading_equals_uncached(tmp_path, data_set, missing, capsys):
+    cache_dir = str(tmp_path / 'cache')
+    uncached = pp.load_and_preprocess_data(WORKBOOK_PATH, data_set=data_set, missing=missing, cache_dir=None)
+    first = pp.load_and_preprocess_data(WORKBOOK_PATH, data_set=data_set, missing=missing, cache_dir=cache_dir)
+    capsys.readouterr()
+    second = pp.load_and_preprocess_data(WORKBOOK_PATH, data_set=data_set, missing=missing, cache_dir=cache_dir)
+    assert 'Cache: Loaded preprocessed data' in capsys.readouterr().out
+    pd.testing.assert_frame_equal(first, uncached)
+    pd.testing.assert_frame_equal(second, uncached)
+
+
+def test_preprocessing_version_invalidates_the_cache(tmp_path, monkeypatch, capsys):
+    cache_dir = str(tmp_path / 'cache')
+    pp.load_and_preprocess_data(WORKBOOK_PATH, cache_dir=cache_dir)
+    monkeypatch.setattr(pp, 'PREPROCESSING_VERSION', pp.PREPROCESSING_VERSION + 1)
+    capsys.readouterr()
+    pp.load_and_preprocess_data(WORKBOOK_PATH, cache_dir=cache_dir)
+    assert 'Cache: Loaded preprocessed data' not in capsys.readouterr().out
+
+
+def test_compact_loading_is_float32_over_one_buffer():
+    X = pp.load_and_preprocess_data(WORKBOOK_PATH, cache_dir=None)
+    Xc = pp.load_and_preprocess_data(WORKBOOK_PATH, cache_dir=None, compact=True)
+    values = Xc.to_numpy()
+    assert values.dtype == pp.COMPACT_DTYPE and values.flags['C_CONTIGUOUS']
+    pd.testing.assert_frame_equal(Xc.astype('float64'), X, check_exact=False, atol=1e-5)
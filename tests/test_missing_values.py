@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+import pickleball_pipeline as pp
+
+
+def test_drop_rows_drops_both_incomplete_subjects(raw):
+    df = pp.apply_data_set(raw, 'drop_rows')
+    assert len(df) == 29
+    assert not df['ID'].isin([9, 18]).any()
+
+
+@pytest.mark.parametrize('data_set, missed, kept', [('drop_cols_1', 9, 18), ('drop_cols_2', 18, 9)])
+def test_subject_missing_only_the_dropped_visit_is_kept(raw, data_set, missed, kept):
+    # Row 8 (ID 9) missed visit 2, row 17 (ID 18) missed visit 1
+    df = pp.apply_data_set(raw, data_set)
+    assert len(df) == 30
+    assert kept in set(df['ID'])
+    assert missed not in set(df['ID'])
+    visit = data_set[-1]
+    assert f'MassD{visit}' not in df.columns
+    assert not (df.to_numpy(dtype=np.float64) == pp.MISSING_SENTINEL).any()
+
+
+@pytest.mark.parametrize('strategy', ['knn', 'iterative', 'column_mean'])
+def test_imputing_strategies_keep_every_subject(raw, strategy):
+    df, report = pp.impute_missing(raw, strategy=strategy)
+    assert len(df) == len(raw)
+    assert report['affected_rows'] == [8, 17]
+    assert not (df.to_numpy(dtype=np.float64) == pp.MISSING_SENTINEL).any()
@@ -0,0 +1,21 @@
+import sys
+
+import numpy as np
+import pytest
+
+import pickleball_pipeline as pp
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="RSS is read from /proc")
+def test_span_records_its_own_memory_change():
+    kept = []
+    with pp.profiling(pp.InMemorySink()) as sink:
+        with pp.span('allocate'):
+            kept.append(np.ones(50_000_000 // 8))
+        with pp.span('idle'):
+            pass
+    allocate, idle = sink.spans
+    assert allocate['rss_delta_mb'] > 40
+    assert abs(idle['rss_delta_mb']) < 5
+    assert idle['process_peak_rss_mb'] >= allocate['rss_delta_mb']
+    assert 'peak_rss_mb' not in allocate
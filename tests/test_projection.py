@@ -0,0 +1,48 @@
+import joblib
+import numpy as np
+import pytest
+
+import pickleball_pipeline as pp
+from conftest import WORKBOOK_PATH
+
+
+@pytest.fixture(scope='module')
+def X():
+    return pp.load_and_preprocess_data(WORKBOOK_PATH, cache_dir=None)
+
+
+@pytest.mark.parametrize('cluster_method', ['kmeans', 'agg'])
+def test_fit_matches_the_pipeline_embedding_and_clusters(X, cluster_method):
+    projector = pp.EmbeddingProjector(cluster_method=cluster_method).fit(X)
+    embedding = pp.dimensionality_reduction(X, method='tsne_pca', n_components=2, pca_components=10)
+    np.testing.assert_array_equal(projector.embedding_, embedding)
+    np.testing.assert_array_equal(projector.labels_, pp.clustering(embedding, method=cluster_method))
+
+
+@pytest.mark.parametrize('cluster_method', ['kmeans', 'agg'])
+def test_training_subjects_map_onto_themselves(X, cluster_method):
+    projector = pp.EmbeddingProjector(cluster_method=cluster_method).fit(X)
+    np.testing.assert_allclose(projector.transform(X), projector.embedding_, atol=1e-6)
+    np.testing.assert_array_equal(projector.predict(X), projector.labels_)
+
+
+@pytest.mark.parametrize('mapping', ['knn', 'mlp'])
+def test_new_subjects_are_placed_without_refitting(X, mapping):
+    projector = pp.EmbeddingProjector(mapping=mapping).fit(X.iloc[:-3])
+    embedding = projector.embedding_.copy()
+    # Columns are matched by name, so their order in the new frame does not matter
+    placed = projector.transform(X.iloc[-3:][X.columns[::-1]])
+    assert placed.shape == (3, 2) and np.isfinite(placed).all()
+    np.testing.assert_allclose(placed, projector.transform(X.iloc[-3:]))
+    assert set(projector.predict(X.iloc[-3:])) <= set(range(projector.n_clusters))
+    np.testing.assert_array_equal(projector.embedding_, embedding)
+
+
+def test_save_and_load(X, tmp_path):
+    projector = pp.EmbeddingProjector().fit(X.iloc[:-3])
+    projector.save(tmp_path / 'projector.joblib')
+    loaded = pp.EmbeddingProjector.load(tmp_path / 'projector.joblib')
+    np.testing.assert_array_equal(loaded.transform(X.iloc[-3:]), projector.transform(X.iloc[-3:]))
+    joblib.dump({'not': 'a projector'}, tmp_path / 'other.joblib')
+    with pytest.raises(TypeError):
+        pp.EmbeddingProjector.load(tmp_path / 'other.joblib')
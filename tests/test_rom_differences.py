@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+import pickleball_pipeline as pp
+
+
+def _loop_reference(df):
+    # The original per-column implementation
+    differences = {}
+    for pre_col in [col for col in df.columns if 'Pre' in col]:
+        post_col = pre_col.replace('Pre', 'Post')
+        if post_col in df.columns:
+            differences[f"Diff_{pre_col.replace('Pre', '').strip('_')}"] = df[post_col] - df[pre_col]
+    return pd.DataFrame(differences)
+
+
+def test_matches_the_loop_implementation(raw):
+    df = raw.set_index(raw.index + 100)  # a non-default index is carried over
+    pd.testing.assert_frame_equal(pp.compute_rom_differences(df), _loop_reference(df).astype(np.float64))
+
+
+def test_pairs_by_name_whatever_the_column_order(raw):
+    shuffled = raw[list(np.random.RandomState(0).permutation(raw.columns))]
+    expected = pp.compute_rom_differences(raw)
+    pd.testing.assert_frame_equal(pp.compute_rom_differences(shuffled)[expected.columns], expected)
+
+
+def test_several_follow_ups_in_one_pass(raw):
+    df = raw.copy()
+    posts = [col for col in raw.columns if col.startswith('Post')]
+    for col in posts:
+        df[col.replace('Post', 'Post24h', 1)] = raw[col] + 1.0
+    diffs = pp.compute_rom_differences(df, timepoints=('Pre', 'Post', 'Post24h'))
+    assert diffs.shape[1] == 2 * len(posts)
+    post, later = diffs.filter(regex='^Diff_'), diffs.filter(regex='^DiffPost24h_')
+    np.testing.assert_allclose(later.to_numpy(), post.to_numpy() + 1.0)
+
+
+def test_frame_without_pairs_gives_an_empty_frame(raw):
+    diffs = pp.compute_rom_differences(raw[['ID', 'Age', 'Pre1DAER']])
+    assert diffs.shape == (len(raw), 0)
+    assert diffs.index.equals(raw.index)
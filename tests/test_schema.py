@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+import pickleball_pipeline as pp
+
+
+@pytest.fixture(scope='module')
+def schema(raw):
+    return pp.column_schema(tuple(raw.columns))
+
+
+def test_workbook_columns_are_classified(raw, schema):
+    assert schema.table['role'].value_counts().to_dict() == {
+        'goniometer': 64, 'demographic': 10, 'weight_bearing': 8, 'id': 1}
+    assert list(raw.columns[schema.continuous]) == ['Age', 'MassD1', 'MassD2', 'Height', 'ShoeSize', 'Tegner']
+    assert list(raw.columns[schema.categorical]) == ['Gender', 'LegD', 'ArmD', 'Play#']
+    assert schema.table.loc['Pre1DAER'].to_dict() == {'role': 'goniometer', 'kind': 'continuous', 'visit': '1',
+                                                      'timepoint': 'Pre', 'measure': 'DA', 'knee': 'E', 'side': 'R'}
+    assert schema.table.loc['WB2PFL', ['role', 'visit', 'measure', 'side']].tolist() == ['weight_bearing', '2', 'P', 'L']
+
+
+@pytest.mark.parametrize('visit, other', [('1', '2'), ('2', '1')])
+def test_drop_visit_drops_measurements_and_body_mass(raw, schema, visit, other):
+    kept = set(raw.columns[schema.drop_visit(visit)])
+    dropped = set(raw.columns) - kept
+    # 32 goniometer + 4 weight-bearing columns of that visit, and its body mass
+    assert len(dropped) == 37
+    assert f'MassD{visit}' in dropped and f'MassD{other}' in kept
+    assert dropped == set(schema.table.index[schema.table['visit'] == visit])
+    assert {'ID', 'Age', 'Gender', f'Pre{other}DAER', f'WB{other}DFR'} <= kept
+
+
+def test_groups_follow_names_not_positions(raw):
+    shuffled = raw[list(np.random.RandomState(0).permutation(raw.columns))]
+    for groups, shuffled_groups in zip(pp.feature_groups(raw), pp.feature_groups(shuffled)):
+        assert sorted(groups) == sorted(shuffled_groups)
+    # The scaled matrix is the same up to column order
+    X = pp.preprocess_frame(raw)
+    X_shuffled = pp.preprocess_frame(shuffled)
+    np.testing.assert_allclose(X_shuffled[X.columns].to_numpy(), X.to_numpy())
+
+
+def test_unknown_columns_are_scaled_as_measurements():
+    schema = pp.ColumnSchema(['ID', 'Age', 'Pre1DAER', 'Notes'])
+    assert schema.table.loc['Notes', 'role'] == 'other'
+    assert list(schema.columns[schema.measurement]) == ['Notes', 'Pre1DAER']
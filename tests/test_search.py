@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from sklearn.cluster import KMeans
+from sklearn.model_selection import GridSearchCV
+from sklearn.svm import SVC
+
+import pickleball_pipeline as pp
+from conftest import WORKBOOK_PATH
+
+SVC_GRID = {'C': [0.1, 1, 10], 'kernel': ['linear', 'rbf'], 'gamma': ['scale', 'auto']}
+
+
+@pytest.fixture(scope='module')
+def data():
+    X = pp.load_and_preprocess_data(WORKBOOK_PATH, cache_dir=None)
+    y = KMeans(n_clusters=3, random_state=42, n_init=10).fit_predict(X)
+    return X, y
+
+
+@pytest.mark.parametrize('scoring', ['f1_weighted', 'accuracy'])
+def test_grid_engine_matches_gridsearchcv(data, scoring):
+    X, y = data
+    reference = GridSearchCV(SVC(random_state=42), SVC_GRID, cv=5, scoring=scoring).fit(X, y)
+    search = pp.search_hyperparameters(SVC(random_state=42), SVC_GRID, X, y, strategy='grid', cv=5,
+                                       scoring=(scoring,), n_jobs=1, cache_dir=None)
+    assert search['best_params'] == reference.best_params_
+    assert search['best_score'] == pytest.approx(reference.best_score_)
+    best = reference.best_index_
+    expected = [reference.cv_results_[f'split{fold}_test_score'][best] for fold in range(5)]
+    np.testing.assert_allclose(search['fold_scores'][scoring], expected)
+    assert search['n_fits'] == 5 * len(reference.cv_results_['params'])
+
+
+def test_fold_cache_replays_the_same_search(data, tmp_path):
+    X, y = data
+    kwargs = dict(strategy='grid', cv=5, n_jobs=1, cache_dir=str(tmp_path / 'cache'))
+    first = pp.search_hyperparameters(SVC(random_state=42), SVC_GRID, X, y, **kwargs)
+    second = pp.search_hyperparameters(SVC(random_state=42), SVC_GRID, X, y, **kwargs)
+    assert first['best_params'] == second['best_params']
+    np.testing.assert_array_equal(first['fold_predictions'], second['fold_predictions'])
+
+
+def test_bayes_counts_every_suggestion(data):
+    optuna = pytest.importorskip('optuna')
+    X, y = data
+    asked = []
+    ask = optuna.study.Study.ask
+
+    def counting_ask(self, *args, **kwargs):
+        asked.append(1)
+        return ask(self, *args, **kwargs)
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(optuna.study.Study, 'ask', counting_ask)
+        search = pp.search_hyperparameters(SVC(random_state=42), SVC_GRID, X, y, strategy='bayes', cv=3,
+                                           n_candidates=6, n_jobs=1, cache_dir=None)
+    # TPE repeats suggestions on a small categorical grid; repeats use up the budget too
+    assert len(asked) == 6
+    assert search['n_candidates'] <= 6
+    assert search['n_fits'] == 3 * search['n_candidates']
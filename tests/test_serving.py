@@ -0,0 +1,122 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.naive_bayes import GaussianNB
+
+import pickleball_pipeline as pp
+
+
+@pytest.mark.parametrize('data_set', ['drop_rows', 'drop_cols_1', 'drop_cols_2'])
+@pytest.mark.parametrize('missing', ['drop', 'knn'])
+def test_transformer_matches_preprocess_frame(raw, data_set, missing):
+    transformer = pp.PreprocessingTransformer(data_set=data_set, missing=missing).fit(raw)
+    expected = pp.preprocess_frame(raw, data_set=data_set, missing=missing)
+    subjects = pp.apply_data_set(raw, data_set, missing=missing)
+    transformed = transformer.transform(subjects)
+    assert list(transformed.columns) == list(expected.columns)
+    np.testing.assert_allclose(transformed.to_numpy(), expected.to_numpy(), rtol=1e-12, atol=1e-12)
+    records = subjects[transformer.input_columns_].to_dict(orient='records')
+    np.testing.assert_allclose(transformer.transform_records(records), expected.to_numpy(), rtol=1e-12, atol=1e-12)
+
+
+@pytest.mark.parametrize('value', [pp.MISSING_SENTINEL, np.nan])
+def test_transformer_rejects_missing_measurements(raw, value):
+    transformer = pp.PreprocessingTransformer().fit(raw)
+    subjects = pp.apply_data_set(raw, 'drop_rows').head(3).copy()
+    column = next(col for col in transformer.input_columns_ if col.startswith('Post'))
+    subjects.iloc[1, subjects.columns.get_loc(column)] = value
+    with pytest.raises(ValueError, match=column):
+        transformer.transform(subjects)
+    with pytest.raises(ValueError, match=column):
+        transformer.transform_records(subjects.to_dict(orient='records'))
+
+
+def test_transformer_rejects_no_return_subject(raw):
+    transformer = pp.PreprocessingTransformer().fit(raw)
+    with pytest.raises(ValueError, match='MassD2'):
+        transformer.transform(raw[raw['ID'] == 9])
+
+
+class _FailingBatcher:
+    def submit(self, records):
+        raise RuntimeError('model exploded')
+
+    def stats(self):
+        return {}
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(batcher):
+        server = pp._InferenceHTTPServer(('127.0.0.1', 0), pp._make_inference_handler(batcher))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}/predict"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _post(url, payload):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(), method='POST',
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, json.loads(error.read())
+
+
+def test_handler_answers_unexpected_errors_with_500(serve):
+    status, body = _post(serve(_FailingBatcher()), {'ID': 1})
+    assert status == 500
+    assert body == {'error': 'RuntimeError: model exploded'}
+
+
+def _bundle_batcher(raw, tmp_path):
+    transformer = pp.PreprocessingTransformer().fit(raw)
+    X = transformer.transform(pp.apply_data_set(raw, 'drop_rows'))
+    model = GaussianNB().fit(X, np.arange(len(X)) % 2)
+    pp.save_model_bundle(tmp_path / 'bundle.joblib', transformer, {'selected_features': 'None', 'trained_model': model})
+    return pp.MicroBatcher(pp.load_model_bundle(tmp_path / 'bundle.joblib'))
+
+
+def test_handler_rejects_missing_measurements_with_400(raw, serve, tmp_path):
+    url = serve(_bundle_batcher(raw, tmp_path))
+
+    complete = {k: float(v) for k, v in raw.iloc[0].items()}
+    status, body = _post(url, complete)
+    assert status == 200 and len(body['labels']) == 1
+
+    no_return = {k: float(v) for k, v in raw[raw['ID'] == 9].iloc[0].items()}
+    status, body = _post(url, [complete, no_return])
+    assert status == 400 and 'MassD2' in body['error']
+
+
+@pytest.mark.parametrize('payload', [None, 5, {'subjects': 5}, [], [1, 2], {'subjects': []}])
+def test_handler_rejects_malformed_bodies_with_400(raw, serve, tmp_path, payload):
+    batcher = _bundle_batcher(raw, tmp_path)
+    url = serve(batcher)
+    status, body = _post(url, payload)
+    assert status == 400 and 'error' in body
+    # The worker is still alive and serves the next request
+    status, body = _post(url, {k: float(v) for k, v in raw.iloc[0].items()})
+    assert status == 200 and len(body['labels']) == 1
+
+
+def test_batcher_survives_bad_submissions(raw, tmp_path):
+    batcher = _bundle_batcher(raw, tmp_path)
+    for records in (None, 5):
+        with pytest.raises(TypeError):
+            batcher.submit(records)
+    assert batcher._worker.is_alive()
+    assert len(batcher.submit([{k: float(v) for k, v in raw.iloc[0].items()}])['labels']) == 1
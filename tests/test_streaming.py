@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import pickleball_pipeline as pp
+from conftest import WORKBOOK_PATH
+
+
+def _write_sessions(raw, directory, n_files):
+    directory.mkdir()
+    for i, part in enumerate(np.array_split(np.arange(len(raw)), n_files)):
+        raw.iloc[part].to_csv(directory / f"session_{i:02d}.csv", index=False)
+    return str(directory)
+
+
+def _assert_matches_loader(directory, data_set, missing, chunksize):
+    streamed = pd.concat(pp.stream_preprocessed_chunks(directory, data_set=data_set, chunksize=chunksize,
+                                                      missing=missing), ignore_index=True)
+    expected = pp.load_and_preprocess_data(WORKBOOK_PATH, data_set=data_set, missing=missing, cache_dir=None)
+    assert list(streamed.columns) == list(expected.columns)
+    np.testing.assert_allclose(streamed.to_numpy(dtype=np.float64), expected.to_numpy(dtype=np.float64),
+                               rtol=1e-12, atol=1e-12)
+
+
+@pytest.mark.parametrize('data_set', ['drop_rows', 'drop_cols_1', 'drop_cols_2'])
+def test_streaming_matches_loader_across_chunks(raw, tmp_path, data_set):
+    # Dropping is per subject, so any file and chunk split gives the in-memory result
+    directory = _write_sessions(raw, tmp_path / 'sessions', n_files=3)
+    _assert_matches_loader(directory, data_set, 'drop', chunksize=4)
+
+
+@pytest.mark.parametrize('missing', ['knn', 'iterative', 'column_mean'])
+def test_streaming_imputes_like_loader_in_one_chunk(raw, tmp_path, missing):
+    # Three small files are packed into one chunk, so imputation sees the whole cohort
+    directory = _write_sessions(raw, tmp_path / 'sessions', n_files=3)
+    _assert_matches_loader(directory, 'drop_rows', missing, chunksize=len(raw))
+
+
+def test_streaming_imputation_refuses_several_chunks(raw, tmp_path):
+    directory = _write_sessions(raw, tmp_path / 'sessions', n_files=1)
+    with pytest.raises(ValueError, match='one chunk'):
+        list(pp.stream_preprocessed_chunks(directory, missing='knn', chunksize=len(raw) - 1))
+
+
+def test_streaming_reports_missing_values_once(raw, tmp_path, capsys):
+    directory = _write_sessions(raw, tmp_path / 'sessions', n_files=3)
+    chunks = list(pp.stream_preprocessed_chunks(directory, chunksize=4))
+    lines = [line for line in capsys.readouterr().out.splitlines() if line.startswith('Missing values')]
+    # Same totals as impute_missing on the whole workbook
+    assert lines == ['Missing values: 74 cells in 2 subjects (drop, dropped).']
+    assert sum(len(chunk) for chunk in chunks) == len(raw) - 2
+
+
+def test_session_chunks_pack_small_files(raw, tmp_path):
+    directory = _write_sessions(raw, tmp_path / 'sessions', n_files=5)
+    chunks = list(pp.iter_session_chunks(pp.list_session_files(directory), chunksize=8))
+    assert [len(chunk) for chunk in chunks] == [8, 8, 8, 7]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), raw.reset_index(drop=True), check_dtype=False)
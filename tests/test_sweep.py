@@ -0,0 +1,47 @@
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.naive_bayes import GaussianNB
+
+import pickleball_pipeline as pp
+from conftest import WORKBOOK_PATH
+
+FUSION = [('nb', GaussianNB()), ('rf', RandomForestClassifier(n_estimators=20, random_state=42))]
+CONFIGS = [
+    {'classifier_method': 'nb'},
+    {'classifier_method': 'rf', 'feature_selection_k': 10},
+    {'classifier_method': 'nb', 'feature_selection_k': 10, 'fusion_models': FUSION, 'fusion_voting': 'soft'},
+    {'classifier_method': 'rf', 'dim_method': 'tsne', 'cluster_method': 'agg', 'cv': 3},
+]
+
+
+def _comparable(result):
+    return {key: value for key, value in result.items()
+            if not key.endswith('_wall_s') and key not in ('trained_model', 'fusion_trained_model')}
+
+
+def _assert_same_results(swept, expected):
+    swept, expected = _comparable(swept), _comparable(expected)
+    assert swept.keys() == expected.keys()
+    for key, value in expected.items():
+        if key == 'selected_features' and not isinstance(value, str):  # pd.Index, or 'None' without selection
+            swept[key], value = list(swept[key]), list(value)
+        np.testing.assert_equal(swept[key], value, err_msg=key)
+
+def test_run_sweep_matches_run_pipeline():
+    X = pp.load_and_preprocess_data(WORKBOOK_PATH, cache_dir=None)
+    swept = pp.run_sweep(X, CONFIGS, n_jobs=1)
+    assert len(swept) == len(CONFIGS)
+    for config, result in zip(CONFIGS, swept):
+        pp._clear_stage_caches()
+        _assert_same_results(result, pp.run_pipeline(X, WORKBOOK_PATH, **config))
+
+
+def test_run_sweep_variants_match_run_pipeline_per_variant(raw):
+    variants = pp.data_variants(raw, variants=['day1_only', 'day2_only'])
+    configs = [{'classifier_method': 'nb', 'variant': name} for name in variants]
+    swept = pp.run_sweep(variants, configs, n_jobs=1)
+    for config, result in zip(configs, swept):
+        assert result['variant'] == config['variant']
+        pp._clear_stage_caches()
+        expected = pp.run_pipeline(variants[config['variant']], WORKBOOK_PATH, classifier_method='nb')
+        _assert_same_results({k: v for k, v in result.items() if k != 'variant'}, expected)
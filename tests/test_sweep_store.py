@@ -0,0 +1,76 @@
+import json
+
+import numpy as np
+import pytest
+
+import pickleball_pipeline as pp
+from conftest import WORKBOOK_PATH
+
+CONFIG_A = {'dim_method': 'tsne', 'cluster_method': 'kmeans', 'classifier_method': 'nb', 'feature_selection_k': 10}
+CONFIG_B = {'dim_method': 'tsne', 'cluster_method': 'agg', 'classifier_method': 'nb', 'feature_selection_k': 10}
+
+
+def _fake_result(value):
+    return {'cv_mean': value, 'cv_scores': np.array([value]), 'trained_model': None}
+
+
+def test_load_results_is_scoped_to_the_given_ids(tmp_path):
+    store = pp.SweepStore(str(tmp_path / 'store'))
+    ids = [pp.sweep_config_id(config, 'data') for config in (CONFIG_A, CONFIG_B)]
+    other = pp.sweep_config_id(CONFIG_A, 'other data')
+    store.save(ids[0], 0, CONFIG_A, _fake_result(0.1))
+    store.save(other, 0, CONFIG_A, _fake_result(0.2))
+    store.save(ids[1], 1, CONFIG_B, _fake_result(0.3))
+
+    assert [r['cv_mean'] for r in store.load_results(config_ids=ids)] == [0.1, 0.3]
+    assert [r['cv_mean'] for r in store.load_results(config_ids=ids[::-1])] == [0.3, 0.1]
+    assert [r['cv_mean'] for r in store.load_results(config_ids=[ids[1], 'missing'])] == [0.3]
+    assert len(store.load_results()) == 3
+
+
+def _sweep(tmp_path, configs, *extra):
+    path = tmp_path / 'configs.json'
+    path.write_text(json.dumps(configs))
+    return pp.sweep_main(['--configs', str(path), '--workbook', WORKBOOK_PATH, '--store', str(tmp_path / 'store'),
+                          '--n-jobs', '1', *extra])
+
+
+def test_sweep_resumes_and_reports_only_its_configs(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    first = _sweep(tmp_path, [CONFIG_A])
+    assert len(first) == 1
+    capsys.readouterr()
+
+    second = _sweep(tmp_path, [CONFIG_A, CONFIG_B])
+    assert '1 of 2 configs already' in capsys.readouterr().out
+    assert list(second['cluster_method']) == ['kmeans', 'agg']
+    assert second['cv_mean'].iloc[0] == first['cv_mean'].iloc[0]
+
+    reordered = _sweep(tmp_path, [CONFIG_B])
+    assert '1 of 1 configs already' in capsys.readouterr().out
+    assert list(reordered['cluster_method']) == ['agg']
+
+    other_data = _sweep(tmp_path, [CONFIG_B], '--data-set', 'drop_cols_1')
+    assert '0 of 1 configs already' in capsys.readouterr().out
+    assert len(other_data) == 1
+
+
+@pytest.mark.parametrize('name', sorted(pp.FUSION_MEMBERS))
+def test_every_fusion_member_builds_and_fits(name):
+    rng = np.random.RandomState(0)
+    X, y = rng.normal(size=(30, 4)), np.arange(30) % 3
+    model = pp.FUSION_MEMBERS[name]().fit(X, y)
+    assert model.predict_proba(X).shape == (30, 3)
+
+
+def test_logistic_classifier_trains():
+    X = pp.load_and_preprocess_data(WORKBOOK_PATH, cache_dir=None)
+    y = np.arange(len(X)) % 3
+    result = pp.train_classifier(X, y, method='logistic', cv=3)
+    assert len(result['cv_scores']) == 3
+
+
+def test_sweep_rejects_unknown_flags(capsys):
+    with pytest.raises(SystemExit):
+        pp.sweep_main(['--n_jobs', '4'])
+    assert 'unrecognized arguments: --n_jobs 4' in capsys.readouterr().err